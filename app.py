@@ -1,14 +1,23 @@
-from flask import Flask, request, render_template, send_file, abort
+from flask import Flask, request, render_template, send_file, abort, Response, stream_with_context, jsonify
 import os
 import sys
 import json
+from itertools import chain
+import pandas as pd
 from carprice.util.util import read_yaml_file, write_yaml_file, get_carlist
 from carprice.logger import logging
-from carprice.config.configuration import ConfigurationManager
-from carprice.constant import CONFIG_DIR, generate_timestamp
-from carprice.pipeline.pipeline import TrainingPipeline
-from carprice.entity.carprice_predictor import CarPricePredictor, CarPriceInputData
-from carprice.logger import get_log_dataframe
+from carprice.constant import CONFIG_DIR, CONFIG_FILE_PATH, TRAINING_PIPELINE_CONFIG_KEY, TRAINING_PIPELINE_NAME_KEY, \
+    TRAINING_PIPELINE_ARTIFACT_DIR_KEY, STAGE_METRICS_DIR_NAME, EXPERIMENT_DIR_NAME, EXPERIMENT_FILE_NAME, \
+    EXPERIMENT_DB_FILE_NAME, generate_timestamp
+from carprice.util.model_registry import ModelRegistry, predict_model_records
+from carprice.util.batch_predictor import BatchPredictor, to_ndjson, to_csv
+from carprice.util.drift_monitor import DriftMonitor
+from carprice.util.job_runner import JobRunner, TRAINING_JOB, TRAINING_DAG_JOB
+from carprice.util.stage_profiler import read_stage_metrics
+from carprice.util.request_metrics import RequestMetrics, PREDICT_PHASE_DURATION, MODEL_CACHE_HITS, MODEL_CACHE_MISSES
+from carprice.util.log_viewer import LogViewer, DEFAULT_PAGE_SIZE
+from carprice.util.experiment_store import ExperimentStore, DEFAULT_PAGE_SIZE as EXPERIMENT_PAGE_SIZE
+from carprice.util.directory_index import DirectoryIndex, DEFAULT_PAGE_SIZE as DIRECTORY_PAGE_SIZE
 
 # Constants for Directories and File Paths
 ROOT_DIRECTORY = os.getcwd()
@@ -16,9 +25,19 @@ LOGS_FOLDER_NAME = "logs"
 PIPELINE_FOLDER_NAME = "carprice"
 SAVED_MODELS_FOLDER_NAME = "saved_models"
 MODEL_CONFIG_FILE_PATH = os.path.join(ROOT_DIRECTORY, CONFIG_DIR, "model.yaml")
+SCHEMA_FILE_PATH = os.path.join(ROOT_DIRECTORY, CONFIG_DIR, "schema.yaml")
 LOGS_DIR = os.path.join(ROOT_DIRECTORY, LOGS_FOLDER_NAME)
 PIPELINE_DIR = os.path.join(ROOT_DIRECTORY, PIPELINE_FOLDER_NAME)
 SAVED_MODELS_DIR = os.path.join(ROOT_DIRECTORY, SAVED_MODELS_FOLDER_NAME)
+DRIFT_MONITOR_DIR = os.path.join(ROOT_DIRECTORY, "monitoring")
+REQUEST_METRICS_DIR = os.path.join(ROOT_DIRECTORY, "monitoring", "metrics")
+JOBS_DIR = os.path.join(ROOT_DIRECTORY, "jobs")
+TRAINING_PIPELINE_CONFIG = read_yaml_file(file_path=CONFIG_FILE_PATH)[TRAINING_PIPELINE_CONFIG_KEY]
+ARTIFACT_DIR = os.path.join(ROOT_DIRECTORY, TRAINING_PIPELINE_CONFIG[TRAINING_PIPELINE_NAME_KEY],
+                            TRAINING_PIPELINE_CONFIG[TRAINING_PIPELINE_ARTIFACT_DIR_KEY])
+STAGE_METRICS_DIR = os.path.join(ARTIFACT_DIR, STAGE_METRICS_DIR_NAME)
+EXPERIMENT_DB_FILE_PATH = os.path.join(ARTIFACT_DIR, EXPERIMENT_DIR_NAME, EXPERIMENT_DB_FILE_NAME)
+EXPERIMENT_FILE_PATH = os.path.join(ARTIFACT_DIR, EXPERIMENT_DIR_NAME, EXPERIMENT_FILE_NAME)
 
 # Keys for Context Data
 CAR_DATA_KEY = "car_data"
@@ -27,6 +46,74 @@ PREDICTED_PRICE_KEY = "predicted_price"
 # Initialize Flask App
 app = Flask(__name__)
 
+# Loaded once per worker and hot-swapped when a new model is exported
+model_registry = ModelRegistry(model_dir=SAVED_MODELS_DIR)
+batch_predictor = BatchPredictor(model_registry=model_registry, schema_file_path=SCHEMA_FILE_PATH)
+drift_monitor = DriftMonitor(model_registry=model_registry, state_dir=DRIFT_MONITOR_DIR,
+                             columns=["car_name", "vehicle_age", "km_driven", "seller_type", "fuel_type",
+                                      "transmission_type", "mileage", "engine", "max_power", "seats"])
+# Per-worker request metrics, added up across the gunicorn workers on /metrics
+request_metrics = RequestMetrics(state_dir=REQUEST_METRICS_DIR)
+request_metrics.init_app(app)
+request_metrics.add_counter_source(MODEL_CACHE_HITS, lambda: model_registry.cache_hits)
+request_metrics.add_counter_source(MODEL_CACHE_MISSES, lambda: model_registry.cache_misses)
+# Line-offset indexes of the log files, so a page of a large log is read with one seek
+log_viewer = LogViewer(log_dir=LOGS_DIR)
+# Training runs in job subprocesses, never inside a web worker
+job_runner = JobRunner(job_dir=JOBS_DIR, working_dir=ROOT_DIRECTORY)
+# Listings of the browsable directories, read again only when a directory changes
+directory_index = DirectoryIndex()
+# Experiment history, with the runs of the older experiment.csv merged in once
+experiment_store = ExperimentStore(db_file_path=EXPERIMENT_DB_FILE_PATH)
+experiment_store.import_csv(EXPERIMENT_FILE_PATH)
+
+
+def get_experiment_page() -> dict:
+    """
+    One page of the experiment history, as selected by the `page`, `page_size`,
+    `sort_by`, `order` and `status` query arguments.
+    """
+    return experiment_store.list_experiments(page=request.args.get("page", default=1, type=int),
+                                             page_size=request.args.get("page_size", default=EXPERIMENT_PAGE_SIZE,
+                                                                        type=int),
+                                             sort_by=request.args.get("sort_by", default="start_time"),
+                                             descending=request.args.get("order", default="desc") != "asc",
+                                             status=request.args.get("status"))
+
+
+def render_experiment_page(experiment_page: dict) -> str:
+    experiment_df = pd.DataFrame.from_records(experiment_page["records"])
+    if not experiment_df.empty:
+        metrics_df = pd.json_normalize(experiment_df.pop("metrics").tolist())
+        experiment_df = pd.concat([experiment_df, metrics_df], axis=1)
+    return experiment_df.to_html(classes='table table-striped col-12', index=False, na_rep="")
+
+
+def serve_file(absolute_path: str) -> Response:
+    """
+    Streams a file from disk in blocks, answering Range requests and
+    If-None-Match / If-Modified-Since revalidations (ETag and Last-Modified
+    are derived from the file's mtime and size).
+    """
+    return send_file(absolute_path, conditional=True, etag=True, max_age=0)
+
+
+def get_directory_result(absolute_path: str, name_filter=None) -> dict:
+    """
+    One page of a directory listing, selected by the `page` and `page_size` query arguments.
+    """
+    directory_page = directory_index.get_page(absolute_path, page=request.args.get("page", default=1, type=int),
+                                              page_size=request.args.get("page_size", default=DIRECTORY_PAGE_SIZE,
+                                                                         type=int),
+                                              name_filter=name_filter)
+    entries = directory_page.pop("entries")
+    return {
+        "files": {os.path.join(absolute_path, file_name): file_name for file_name, _ in entries},
+        "parent_folder": os.path.dirname(absolute_path),
+        "parent_label": absolute_path,
+        "page": directory_page
+    }
+
 
 @app.route('/artifacts', defaults={'requested_path': 'carprice'})
 @app.route('/artifacts/<path:requested_path>')
@@ -41,26 +128,13 @@ def render_artifacts_directory(requested_path):
     if not os.path.exists(absolute_path):
         return abort(404)
 
-    # Serve file if it's a file
+    # Serve file if it's a file; html reports are shown inline
     if os.path.isfile(absolute_path):
-        if ".html" in absolute_path:
-            with open(absolute_path, "r", encoding="utf-8") as file:
-                content = ''.join(file.readlines())
-                return content
-        return send_file(absolute_path)
+        return serve_file(absolute_path)
 
     # Show directory contents
-    files = {
-        os.path.join(absolute_path, file_name): file_name
-        for file_name in os.listdir(absolute_path)
-        if "artifact" in os.path.join(absolute_path, file_name)
-    }
-
-    result = {
-        "files": files,
-        "parent_folder": os.path.dirname(absolute_path),
-        "parent_label": absolute_path
-    }
+    name_filter = None if "artifact" in absolute_path else (lambda file_name: "artifact" in file_name)
+    result = get_directory_result(absolute_path, name_filter=name_filter)
     return render_template('artifacts.html', result=result)
 
 
@@ -79,35 +153,118 @@ def home():
 @app.route('/experiment-history', methods=['GET', 'POST'])
 def view_experiment_history():
     """
-    Display the history of experiments.
+    Display the history of experiments, with the time, memory and rows of every stage of recent runs.
     """
-    experiment_df = TrainingPipeline.get_experiments_status()
+    try:
+        experiment_page = get_experiment_page()
+    except Exception as e:
+        logging.exception(e)
+        return abort(400)
+    experiment_html = render_experiment_page(experiment_page)
+    stage_metrics_df = read_stage_metrics(STAGE_METRICS_DIR, limit=request.args.get("runs", default=5, type=int))
+    if not stage_metrics_df.empty:
+        # runs profiled before the worker fields existed leave them empty
+        stage_metrics_df = stage_metrics_df.reindex(columns=["run", "span", "status", "started_at", "wall_seconds",
+                                                             "cpu_seconds", "peak_rss_mb", "worker_cpu_seconds",
+                                                             "worker_peak_rss_mb", "rows", "rows_per_second"])
+        experiment_html += "<h4>Stage metrics</h4>" + stage_metrics_df.to_html(
+            classes='table table-striped col-12', index=False, na_rep="")
+    experiment_page.pop("records")
     context = {
-        "experiment": experiment_df.to_html(classes='table table-striped col-12')
+        "experiment": experiment_html,
+        "page": experiment_page
     }
     return render_template('experiment_history.html', context=context)
 
 
+@app.route('/api/experiments', methods=['GET'])
+def list_experiments():
+    """
+    One page of the experiment history as JSON, with the paging and sorting arguments of /experiment-history.
+    """
+    try:
+        return jsonify(get_experiment_page())
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/experiments/<experiment_id>', methods=['GET'])
+def experiment_details(experiment_id):
+    """
+    One experiment with its metrics.
+    """
+    try:
+        experiment = experiment_store.get_experiment(experiment_id)
+        if experiment is None:
+            return jsonify({"error": f"Experiment {experiment_id} not found."}), 404
+        return jsonify(experiment)
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/train-model', methods=['GET', 'POST'])
 def train_model():
     """
-    Trigger the training pipeline.
+    Trigger the training pipeline; `?executor=dag` runs it as a DAG with independent stages in parallel.
     """
-    message = ""
-    pipeline = TrainingPipeline(config=ConfigurationManager(current_time_stamp=generate_timestamp()))
-    if not TrainingPipeline.experiment.running_status:
-        message = "Training started."
-        pipeline.start()
+    job_type = TRAINING_DAG_JOB if request.args.get("executor") == "dag" else TRAINING_JOB
+    job = job_runner.submit(job_type=job_type, params={"time_stamp": generate_timestamp()})
+    if job["is_new"]:
+        message = f"Training started as job {job['id']}."
     else:
-        message = "Training is already in progress."
+        message = f"Training is already in progress as job {job['id']}."
 
     context = {
-        "experiment": pipeline.get_experiments_status().to_html(classes='table table-striped col-12'),
+        "experiment": render_experiment_page(experiment_store.list_experiments(page_size=5)),
         "message": message
     }
     return render_template('train_model.html', context=context)
 
 
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+    List the most recent training jobs.
+    """
+    try:
+        return jsonify(job_runner.list_jobs(limit=request.args.get("limit", default=50, type=int)))
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Status, progress and stage events of a training job.
+    """
+    try:
+        job = job_runner.get_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Job {job_id} not found."}), 404
+        return jsonify(job)
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    Cancel a queued or running training job.
+    """
+    try:
+        job = job_runner.cancel(job_id)
+        if job is None:
+            return jsonify({"error": f"Job {job_id} not found."}), 404
+        return jsonify(job)
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/predict-price', methods=['GET', 'POST'])
 def predict_price():
     """
@@ -120,41 +277,107 @@ def predict_price():
     car_list = get_carlist()
 
     if request.method == "POST":
-        car_name = request.form.get("car_name")
-        vehicle_age = int(request.form.get("vehicle_age"))
-        km_driven = int(request.form.get("km_driven"))
-        seller_type = request.form.get("seller_type")
-        fuel_type = request.form.get("fuel_type")
-        transmission_type = request.form.get("transmission")
-        mileage = float(request.form.get("mileage"))
-        engine = int(request.form.get("engine"))
-        max_power = float(request.form.get("max_power"))
-        seats = int(request.form.get("seats"))
-
-        car_data = CarPriceInputData(
-            car_name=car_name,
-            vehicle_age=vehicle_age,
-            km_driven=km_driven,
-            seller_type=seller_type,
-            fuel_type=fuel_type,
-            transmission_type=transmission_type,
-            mileage=mileage,
-            engine=engine,
-            max_power=max_power,
-            seats=seats
-        )
-        car_data_df = car_data.to_dataframe()
-        predictor = CarPricePredictor(model_dir=SAVED_MODELS_DIR)
-        predicted_price = predictor.predict(X=car_data_df)
+        with request_metrics.time(PREDICT_PHASE_DURATION, phase="parse"):
+            car_name = request.form.get("car_name")
+            vehicle_age = int(request.form.get("vehicle_age"))
+            km_driven = int(request.form.get("km_driven"))
+            seller_type = request.form.get("seller_type")
+            fuel_type = request.form.get("fuel_type")
+            transmission_type = request.form.get("transmission")
+            mileage = float(request.form.get("mileage"))
+            engine = int(request.form.get("engine"))
+            max_power = float(request.form.get("max_power"))
+            seats = int(request.form.get("seats"))
+
+            # plain record dict, scored through the model's compiled feature plan without a DataFrame
+            car_data = {
+                "car_name": car_name,
+                "vehicle_age": vehicle_age,
+                "km_driven": km_driven,
+                "seller_type": seller_type,
+                "fuel_type": fuel_type,
+                "transmission_type": transmission_type,
+                "mileage": mileage,
+                "engine": engine,
+                "max_power": max_power,
+                "seats": seats
+            }
+        model = model_registry.get_model()
+        if model is None:
+            raise Exception(f"No model found in [{model_registry.model_dir}]")
+        if hasattr(model, "transform_records"):
+            with request_metrics.time(PREDICT_PHASE_DURATION, phase="preprocessing"):
+                features = model.transform_records([car_data])
+            with request_metrics.time(PREDICT_PHASE_DURATION, phase="inference"):
+                predicted_price = model.trained_model_object.predict(features)
+        else:
+            with request_metrics.time(PREDICT_PHASE_DURATION, phase="inference"):
+                predicted_price = predict_model_records(model, [car_data])
+        drift_monitor.record(car_data)
         context = {
-            CAR_DATA_KEY: car_data.to_dataframe().to_dict(orient="records")[0],
+            CAR_DATA_KEY: car_data,
             PREDICTED_PRICE_KEY: round(predicted_price[0], 2)
         }
-        return render_template('predict_price.html', context=context, car_list=car_list)
+        with request_metrics.time(PREDICT_PHASE_DURATION, phase="render"):
+            return render_template('predict_price.html', context=context, car_list=car_list)
 
     return render_template('predict_price.html', context=context, car_list=car_list)
 
 
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_price_batch():
+    """
+    Predict prices for a batch of cars sent as a JSON array, NDJSON lines or
+    an uploaded CSV file. Results are streamed back as NDJSON or, with
+    `?format=csv`, as CSV.
+    """
+    try:
+        if "file" in request.files:
+            chunks = batch_predictor.iter_csv_chunks(request.files["file"].stream)
+        elif request.mimetype == "application/x-ndjson":
+            lines = (line.decode("utf-8") for line in request.stream)
+            chunks = batch_predictor.iter_ndjson_chunks(lines)
+        else:
+            records = request.get_json(force=True)
+            if not isinstance(records, list):
+                return jsonify({"error": "Expected a JSON array of car records."}), 400
+            chunks = batch_predictor.iter_record_chunks(records)
+
+        result_chunks = batch_predictor.predict_chunks(chunks)
+        # score the first chunk eagerly so validation errors become a 400 instead of a broken stream
+        first_chunk = next(result_chunks, None)
+        result_chunks = chain([] if first_chunk is None else [first_chunk], result_chunks)
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 400
+
+    if request.args.get("format") == "csv":
+        return Response(stream_with_context(to_csv(result_chunks)), mimetype="text/csv")
+    return Response(stream_with_context(to_ndjson(result_chunks)), mimetype="application/x-ndjson")
+
+
+@app.route('/api/monitor/drift', methods=['GET'])
+def monitor_drift():
+    """
+    Drift scores of the prediction inputs received so far against the
+    training data profile of the serving model.
+    """
+    try:
+        return jsonify(drift_monitor.get_drift_report())
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Request latency, in-flight requests and model cache counters of all
+    workers in the Prometheus text format.
+    """
+    return Response(request_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route('/models', defaults={'requested_path': 'saved_models'})
 @app.route('/models/<path:requested_path>')
 def saved_models_directory(requested_path):
@@ -170,16 +393,10 @@ def saved_models_directory(requested_path):
 
     # Serve file if it's a file
     if os.path.isfile(absolute_path):
-        return send_file(absolute_path)
+        return serve_file(absolute_path)
 
     # Show directory contents
-    files = {os.path.join(absolute_path, file): file for file in os.listdir(absolute_path)}
-
-    result = {
-        "files": files,
-        "parent_folder": os.path.dirname(absolute_path),
-        "parent_label": absolute_path
-    }
+    result = get_directory_result(absolute_path)
     return render_template('saved_models.html', result=result)
 
 
@@ -216,22 +433,47 @@ def render_logs_directory(requested_path):
     if not os.path.exists(absolute_path):
         return abort(404)
 
-    # Serve file if it's a file
+    # Serve one page of the file if it's a file, the last page by default
     if os.path.isfile(absolute_path):
-        log_df = get_log_dataframe(absolute_path)
-        context = {"log": log_df.to_html(classes="table-striped", index=False)}
+        try:
+            log_page = log_viewer.get_page(absolute_path, page=request.args.get("page", type=int),
+                                           page_size=request.args.get("page_size", default=DEFAULT_PAGE_SIZE, type=int),
+                                           level=request.args.get("level"), component=request.args.get("component"),
+                                           before=request.args.get("before", type=int))
+        except Exception as e:
+            # files outside the logs directory are not served
+            logging.exception(e)
+            return abort(404)
+        log_df = pd.DataFrame.from_records(log_page.pop("records"))
+        context = {"log": log_df.to_html(classes="table-striped", index=False), "page": log_page}
         return render_template('logs.html', context=context)
 
     # Show directory contents
-    files = {os.path.join(absolute_path, file): file for file in os.listdir(absolute_path)}
-
-    result = {
-        "files": files,
-        "parent_folder": os.path.dirname(absolute_path),
-        "parent_label": absolute_path
-    }
+    result = get_directory_result(absolute_path)
     return render_template('logs_files.html', result=result)
 
 
+@app.route('/api/logs/<path:requested_path>', methods=['GET'])
+def log_records(requested_path):
+    """
+    One page of parsed log records as JSON, with the same paging and filter
+    arguments as /logs. With `?tail=1` returns the records written after line
+    `after_line` instead, to follow a log live.
+    """
+    try:
+        absolute_path = os.path.join(requested_path)
+        if not os.path.isfile(absolute_path):
+            return jsonify({"error": f"Log file {requested_path} not found."}), 404
+        if request.args.get("tail"):
+            return jsonify(log_viewer.tail(absolute_path, after_line=request.args.get("after_line", type=int)))
+        return jsonify(log_viewer.get_page(absolute_path, page=request.args.get("page", type=int),
+                                           page_size=request.args.get("page_size", default=DEFAULT_PAGE_SIZE, type=int),
+                                           level=request.args.get("level"), component=request.args.get("component"),
+                                           before=request.args.get("before", type=int)))
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 400
+
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
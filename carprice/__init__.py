@@ -45,41 +45,55 @@ def read_yaml_file(file_path: str) -> dict:
         raise CarException(e, sys) from e
 
 
-def save_numpy_array(file_path: str, array: np.ndarray):
+def save_numpy_array(file_path: str, array: np.ndarray, dtype=None):
     """
-    Saves a NumPy array to a binary file.
+    Saves a NumPy array to a `.npy` file as a C-contiguous block, so it can
+    be memory-mapped when loaded.
     
     Args:
         file_path (str): Path to the file where the array will be saved.
         array (np.ndarray): NumPy array to save.
+        dtype: Optional dtype to store the array as, e.g. `np.float32`.
     """
     try:
         # Create parent directories if they don't exist
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         
-        with open(file_path, 'wb') as file_obj:
-            np.save(file_obj, array)
+        np.save(file_path, np.ascontiguousarray(array, dtype=dtype))
     except Exception as e:
         raise CarException(e, sys) from e
 
 
-def load_numpy_array(file_path: str) -> np.ndarray:
+def load_numpy_array(file_path: str, mmap_mode: str = None) -> np.ndarray:
     """
-    Loads a NumPy array from a binary file.
+    Loads a NumPy array from a `.npy` file.
     
     Args:
         file_path (str): Path to the file containing the NumPy array.
+        mmap_mode (str): Memory-map the file instead of reading it, e.g. `'r'`.
     
     Returns:
-        np.ndarray: Loaded NumPy array.
+        np.ndarray: Loaded (or memory-mapped) NumPy array.
     """
     try:
-        with open(file_path, 'rb') as file_obj:
-            return np.load(file_obj)
+        return np.load(file_path, mmap_mode=mmap_mode)
     except Exception as e:
         raise CarException(e, sys) from e
 
 
+def get_target_array_file_path(feature_file_path: str) -> str:
+    """
+    Returns the path of the target array stored next to a feature array.
+    
+    Args:
+        feature_file_path (str): Path to the `.npy` feature array.
+    
+    Returns:
+        str: Path to the matching `_target.npy` array.
+    """
+    return os.path.splitext(feature_file_path)[0] + TARGET_ARRAY_FILE_SUFFIX
+
+
 def save_object(file_path: str, obj):
     """
     Saves a Python object to a file using `dill`.
@@ -115,12 +129,80 @@ def load_object(file_path: str):
         raise CarException(e, sys) from e
 
 
+def read_dataframe(file_path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Reads a Parquet or CSV dataset, loading only the requested columns.
+    
+    Args:
+        file_path (str): Path to a `.parquet` or `.csv` file, or a directory of partitioned `.parquet` files.
+        columns (list): Columns to read, all columns if None.
+    
+    Returns:
+        pd.DataFrame: Dataset as a Pandas DataFrame.
+    """
+    try:
+        if file_path.endswith(PARQUET_FILE_EXTENSION) or os.path.isdir(file_path):
+            return pd.read_parquet(file_path, columns=columns)
+        return pd.read_csv(file_path, usecols=columns)
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def iter_dataframe_chunks(file_path: str, chunk_size: int, columns: list = None):
+    """
+    Reads a Parquet or CSV dataset in chunks without loading it fully.
+    
+    Args:
+        file_path (str): Path to a `.parquet` or `.csv` file, or a directory of partitioned `.parquet` files.
+        chunk_size (int): Number of rows per chunk.
+        columns (list): Columns to read, all columns if None.
+    
+    Yields:
+        pd.DataFrame: Consecutive chunks of at most `chunk_size` rows.
+    """
+    try:
+        if os.path.isdir(file_path):
+            import pyarrow.dataset as ds
+            for batch in ds.dataset(file_path, format="parquet").to_batches(batch_size=chunk_size, columns=columns):
+                yield batch.to_pandas()
+        elif file_path.endswith(PARQUET_FILE_EXTENSION):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(file_path, chunksize=chunk_size, usecols=columns)
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def write_dataframe(dataframe: pd.DataFrame, file_path: str):
+    """
+    Writes a dataset as Parquet or CSV depending on the file extension.
+    Categorical columns are stored as Parquet dictionaries and come back as
+    `category` dtype when read.
+    
+    Args:
+        dataframe (pd.DataFrame): Dataset to write.
+        file_path (str): Path to a `.parquet` or `.csv` file.
+    """
+    try:
+        # Create parent directories if they don't exist
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        
+        if file_path.endswith(PARQUET_FILE_EXTENSION):
+            dataframe.to_parquet(file_path, index=False)
+        else:
+            dataframe.to_csv(file_path, index=False)
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
 def load_data(file_path: str, schema_file_path: str) -> pd.DataFrame:
     """
     Loads and validates a dataset based on a schema.
     
     Args:
-        file_path (str): Path to the dataset file.
+        file_path (str): Path to the dataset file (Parquet or CSV).
         schema_file_path (str): Path to the schema file.
     
     Returns:
@@ -132,20 +214,27 @@ def load_data(file_path: str, schema_file_path: str) -> pd.DataFrame:
         schema = dataset_schema[DATASET_SCHEMA_COLUMNS_KEY]
 
         # Load the dataset
-        dataframe = pd.read_csv(file_path)
+        dataframe = read_dataframe(file_path)
 
         # Validate columns against the schema
         error_message = ""
         for column in dataframe.columns:
-            if column in schema:
-                dataframe[column] = dataframe[column].astype(schema[column])
-            else:
+            if column not in schema:
                 error_message += f"\nColumn: [{column}] is not in the schema."
 
         if error_message:
             raise ValueError(error_message)
 
-        return dataframe
+        # Run every schema check over the whole frame and report all failures at once
+        from carprice.util.schema_validator import SchemaValidator
+        schema_validator = SchemaValidator(schema=dataset_schema,
+                                           exclude_columns=[column for column in schema if column not in dataframe.columns])
+        validation_result = schema_validator.validate(dataframe)
+        if validation_result.n_failed_rows > 0:
+            raise ValueError(schema_validator.get_error_message(validation_result))
+
+        # Cast all columns in one call, Parquet input already carries these dtypes
+        return schema_validator.cast(dataframe)
 
     except Exception as e:
         raise CarException(e, sys) from e
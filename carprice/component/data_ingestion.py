@@ -7,14 +7,51 @@ import numpy as np
 from six.moves import urllib
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from carprice.util.s3_operation import download_from_s3
+from carprice.util.s3_operation import download_from_s3, get_s3_object_etag
+from carprice.util.stage_cache import StageCache
+from carprice.constant import DATA_INGESTION_ARTIFACT_DIR, DATASET_SCHEMA_COLUMNS_KEY, SCHEMA_FILE_PATH, \
+    INGESTED_FILE_EXTENSION, DATA_INGESTION_QUARANTINE_DIR_NAME, PARQUET_FILE_EXTENSION, SCHEMA_KEY_COLUMNS_KEY, \
+    TARGET_COLUMN_KEY
+from carprice.util.util import read_yaml_file, write_dataframe
+from datetime import date
+import hashlib
+from carprice.util.schema_validator import SchemaValidator
+from carprice.util.job_runner import track_stage
+from carprice.util.stage_profiler import profile_span, record_rows
+
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+# incremental mode: a listing is a test row when its key hash falls in the first TEST_SIZE of the buckets
+HASH_SPLIT_BUCKETS = 10000
+DATASET_KEYS_DIR_NAME = "keys"
+DATASET_PART_PREFIX = "part-"
+# parts are written under this prefix, which dataset readers skip, and renamed once their keys are saved
+UNPUBLISHED_PART_PREFIX = "_"
 
 class DataIngestion:
 
-    def __init__(self,data_ingestion_config:DataIngestionConfig):
+    def __init__(self,data_ingestion_config:DataIngestionConfig, stage_cache:StageCache=None,
+                 schema_file_path:str=SCHEMA_FILE_PATH, file_extension:str=INGESTED_FILE_EXTENSION,
+                 download_cache_dir:str=None, dataset_dir:str=None, partition_name:str=None,
+                 key_columns:list=None):
+        """
+        download_cache_dir: S3 download cache shared by all runs, see ConfigurationManager.get_download_cache_dir;
+        the object is downloaded straight into the raw data directory when it is None
+        dataset_dir: persistent dataset shared by all runs; when set, ingestion runs incrementally and
+        appends only the listings not seen before as a new partition
+        partition_name: partition the new listings are appended to, defaults to today's date
+        key_columns: columns identifying a listing, defaults to the schema's key_columns
+        """
         try:
             logging.info(f"{'>>'*20}Data Ingestion log started.{'<<'*20} ")
             self.data_ingestion_config = data_ingestion_config
+            self.stage_cache = stage_cache
+            self.schema_file_path = schema_file_path
+            self.file_extension = file_extension
+            self.download_cache_dir = download_cache_dir
+            self.dataset_dir = dataset_dir
+            self.partition_name = partition_name or date.today().isoformat()
+            self.key_columns = key_columns
 
         except Exception as e:
             raise CarException(e,sys)
@@ -36,7 +73,8 @@ class DataIngestion:
             
             download_from_s3(bucket_name=bucket_name, 
                              object_name= object_name, 
-                             filename=raw_data_dir)
+                             filename=raw_data_dir,
+                             cache_dir=self.download_cache_dir)
         
             logging.info(f"File :[{raw_data_dir}] has been downloaded successfully.")
             return raw_data_dir
@@ -44,39 +82,69 @@ class DataIngestion:
         except Exception as e:
             raise CarException(e,sys) from e
     
-    def split_data_as_train_test(self) -> DataIngestionArtifact:
+    def read_raw_data(self):
+        """
+        Reads the downloaded file, quarantining the rows failing the schema checks.
+        Returns the valid rows and the raw file name.
+        """
         try:
             raw_data_dir = self.data_ingestion_config.raw_data_dir
 
-            file_name = os.listdir(raw_data_dir)[0]
+            file_name = self.data_ingestion_config.local_file_name
 
             data_file_path = os.path.join(raw_data_dir,file_name)
 
+            # skip the index, brand and model columns; only categorical columns are typed while parsing so a
+            # malformed number ends up in the quarantine file instead of failing the whole read
+            schema = read_yaml_file(file_path=self.schema_file_path)
+            dataset_schema = schema[DATASET_SCHEMA_COLUMNS_KEY]
             logging.info(f"Reading csv file: [{data_file_path}]")
-            data_frame = pd.read_csv(data_file_path, index_col=[0])
-            data_frame.drop(["brand","model"], axis=1, inplace=True)
-            
+            data_frame = pd.read_csv(data_file_path, usecols=lambda column: column in dataset_schema,
+                                     dtype={column: dtype for column, dtype in dataset_schema.items()
+                                            if dtype == "category"})
+            record_rows(len(data_frame))
+
+            ingested_file_name = os.path.splitext(file_name)[0] + self.file_extension
+
+            schema_validator = SchemaValidator(schema=schema)
+            validation_result = schema_validator.validate(data_frame)
+            data_frame, quarantined_df = schema_validator.split(data_frame, validation_result)
+            if len(quarantined_df) > 0:
+                quarantine_file_path = os.path.join(os.path.dirname(self.data_ingestion_config.ingested_train_dir),
+                                                    DATA_INGESTION_QUARANTINE_DIR_NAME, ingested_file_name)
+                logging.info(f"{schema_validator.get_error_message(validation_result)}, "
+                             f"quarantining them to: [{quarantine_file_path}]")
+                write_dataframe(dataframe=quarantined_df, file_path=quarantine_file_path)
+            return data_frame, file_name
+        except Exception as e:
+            raise CarException(e,sys) from e
+
+    def split_data_as_train_test(self) -> DataIngestionArtifact:
+        try:
+            data_frame, file_name = self.read_raw_data()
+            ingested_file_name = os.path.splitext(file_name)[0] + self.file_extension
+
             logging.info(f"Splitting data into train and test")
             train_set = None
             test_set = None
 
-            train_set, test_set = train_test_split(data_frame, test_size=0.2, random_state=42)
+            train_set, test_set = train_test_split(data_frame, test_size=TEST_SIZE, random_state=RANDOM_STATE)
 
             train_file_path = os.path.join(self.data_ingestion_config.ingested_train_dir,
-                                            file_name)
+                                            ingested_file_name)
 
             test_file_path = os.path.join(self.data_ingestion_config.ingested_test_dir,
-                                        file_name)
+                                        ingested_file_name)
             
             if train_set is not None:
                 os.makedirs(self.data_ingestion_config.ingested_train_dir,exist_ok=True)
                 logging.info(f"Exporting training datset to file: [{train_file_path}]")
-                train_set.to_csv(train_file_path,index=False)
+                write_dataframe(dataframe=train_set, file_path=train_file_path)
 
             if test_set is not None:
                 os.makedirs(self.data_ingestion_config.ingested_test_dir, exist_ok= True)
                 logging.info(f"Exporting test dataset to file: [{test_file_path}]")
-                test_set.to_csv(test_file_path,index=False)
+                write_dataframe(dataframe=test_set, file_path=test_file_path)
             
             data_ingestion_artifact = DataIngestionArtifact(train_file_path=train_file_path,
                                 test_file_path=test_file_path,
@@ -89,10 +157,160 @@ class DataIngestion:
         except Exception as e:
             raise CarException(e,sys) from e
 
+    def get_key_columns(self) -> list:
+        """
+        Columns identifying a listing: the given ones, else the schema's key_columns, else every
+        schema column but the target, so that a listing whose price changed is not a new listing.
+        """
+        try:
+            if self.key_columns:
+                return list(self.key_columns)
+            schema = read_yaml_file(file_path=self.schema_file_path)
+            if schema.get(SCHEMA_KEY_COLUMNS_KEY):
+                return list(schema[SCHEMA_KEY_COLUMNS_KEY])
+            return [column for column in schema[DATASET_SCHEMA_COLUMNS_KEY] if column != schema[TARGET_COLUMN_KEY]]
+        except Exception as e:
+            raise CarException(e,sys) from e
+
+    def get_listing_keys(self, data_frame:pd.DataFrame):
+        """
+        Stable 64 bit hash of every listing, the same across runs and processes.
+        """
+        try:
+            key_columns = self.get_key_columns()
+            # categories are hashed by value, not by their position in this batch's dictionary
+            key_df = data_frame[key_columns].astype({column: str for column in key_columns
+                                                     if isinstance(data_frame[column].dtype, pd.CategoricalDtype)})
+            return pd.util.hash_pandas_object(key_df, index=False).to_numpy()
+        except Exception as e:
+            raise CarException(e,sys) from e
+
+    def get_seen_listing_keys(self):
+        keys_dir = os.path.join(self.dataset_dir, DATASET_KEYS_DIR_NAME)
+        key_arrays = [np.load(os.path.join(dir_path, name))
+                      for dir_path, _, file_names in os.walk(keys_dir) for name in file_names if name.endswith(".npy")]
+        return np.concatenate(key_arrays) if key_arrays else np.empty(0, dtype=np.uint64)
+
+    def recover_dataset(self, split_dirs: list) -> None:
+        """
+        Finishes or rolls back the parts of an interrupted run. A part belongs
+        to the dataset once its keys file is saved: unpublished parts with keys
+        are published, parts without keys are removed.
+        """
+        try:
+            keys_dir = os.path.join(self.dataset_dir, DATASET_KEYS_DIR_NAME)
+            for split_dir in split_dirs:
+                for dir_path, _, file_names in os.walk(split_dir):
+                    for file_name in file_names:
+                        part_name = os.path.splitext(file_name)[0]
+                        is_unpublished = part_name.startswith(UNPUBLISHED_PART_PREFIX + DATASET_PART_PREFIX)
+                        if not (is_unpublished or part_name.startswith(DATASET_PART_PREFIX)):
+                            continue
+                        part_name = part_name[len(UNPUBLISHED_PART_PREFIX):] if is_unpublished else part_name
+                        file_path = os.path.join(dir_path, file_name)
+                        partition_name = os.path.relpath(dir_path, split_dir)
+                        if not os.path.exists(os.path.join(keys_dir, partition_name, part_name + ".npy")):
+                            logging.info(f"Removing part of an interrupted ingest: [{file_path}]")
+                            os.remove(file_path)
+                        elif is_unpublished:
+                            logging.info(f"Publishing part of an interrupted ingest: [{file_path}]")
+                            os.replace(file_path, os.path.join(dir_path, file_name[len(UNPUBLISHED_PART_PREFIX):]))
+        except Exception as e:
+            raise CarException(e,sys) from e
+
+    def append_new_listings(self) -> DataIngestionArtifact:
+        """
+        Incremental ingestion: appends the listings not seen by earlier runs to
+        `dataset_dir` as a new partition, assigning each one to train or test by
+        the hash of its key so that the split never changes as data grows.
+        """
+        try:
+            train_dir = os.path.join(self.dataset_dir, os.path.basename(self.data_ingestion_config.ingested_train_dir))
+            test_dir = os.path.join(self.dataset_dir, os.path.basename(self.data_ingestion_config.ingested_test_dir))
+            self.recover_dataset([train_dir, test_dir])
+
+            data_frame, _ = self.read_raw_data()
+            listing_keys = self.get_listing_keys(data_frame)
+            is_new = ~pd.Series(listing_keys).duplicated().to_numpy()
+            is_new &= ~np.isin(listing_keys, self.get_seen_listing_keys())
+            new_listings = data_frame[is_new]
+            new_keys = listing_keys[is_new]
+            logging.info(f"[{len(new_listings)}] new listings out of [{len(data_frame)}] downloaded rows")
+
+            if len(new_listings) > 0:
+                part_name = f"{DATASET_PART_PREFIX}{hashlib.sha256(new_keys.tobytes()).hexdigest()[:16]}"
+                is_test = new_keys % HASH_SPLIT_BUCKETS < int(TEST_SIZE * HASH_SPLIT_BUCKETS)
+                part_file_paths = []
+                for split_dir, split_set in ((train_dir, new_listings[~is_test]), (test_dir, new_listings[is_test])):
+                    if len(split_set) > 0:
+                        part_file_path = os.path.join(split_dir, self.partition_name, part_name + PARQUET_FILE_EXTENSION)
+                        unpublished_file_path = os.path.join(os.path.dirname(part_file_path),
+                                                             UNPUBLISHED_PART_PREFIX + os.path.basename(part_file_path))
+                        logging.info(f"Appending [{len(split_set)}] listings to: [{part_file_path}]")
+                        write_dataframe(dataframe=split_set, file_path=unpublished_file_path)
+                        part_file_paths.append((unpublished_file_path, part_file_path))
+                # saving the keys commits the parts; an interrupted run is finished or rolled back by recover_dataset
+                keys_file_path = os.path.join(self.dataset_dir, DATASET_KEYS_DIR_NAME, self.partition_name,
+                                              part_name + ".npy")
+                os.makedirs(os.path.dirname(keys_file_path), exist_ok=True)
+                with open(keys_file_path + ".partial", "wb") as keys_file:
+                    np.save(keys_file, new_keys)
+                os.replace(keys_file_path + ".partial", keys_file_path)
+                for unpublished_file_path, part_file_path in part_file_paths:
+                    os.replace(unpublished_file_path, part_file_path)
+
+            data_ingestion_artifact = DataIngestionArtifact(train_file_path=train_dir,
+                                test_file_path=test_dir,
+                                is_ingested=True,
+                                message=f"Incremental data ingestion appended [{len(new_listings)}] new listings."
+                                )
+            logging.info(f"Data Ingestion artifact:[{data_ingestion_artifact}]")
+            return data_ingestion_artifact
+        except Exception as e:
+            raise CarException(e,sys) from e
+
+    def get_cache_key(self) -> str:
+        try:
+            bucket_name = self.data_ingestion_config.bucket_name
+            object_name = self.data_ingestion_config.object_name
+            settings = {
+                "file_extension": self.file_extension,
+                "bucket_name": bucket_name,
+                "object_name": object_name,
+                "etag": get_s3_object_etag(bucket_name=bucket_name, object_key=object_name),
+                "local_file_name": self.data_ingestion_config.local_file_name,
+                "test_size": TEST_SIZE,
+                "random_state": RANDOM_STATE,
+                "dataset_dir": self.dataset_dir,
+                "partition_name": self.partition_name if self.dataset_dir else None,
+                "key_columns": self.get_key_columns() if self.dataset_dir else None,
+            }
+            return self.stage_cache.get_key(stage=DATA_INGESTION_ARTIFACT_DIR,
+                                            code_modules=[__name__, "carprice", "carprice.util.schema_validator"],
+                                            file_paths=[self.schema_file_path], settings=settings)
+        except Exception as e:
+            raise CarException(e,sys) from e
+
+    @track_stage(DATA_INGESTION_ARTIFACT_DIR)
     def initiate_data_ingestion(self)-> DataIngestionArtifact:
         try:
-            raw_data_dir =  self.download_carprice_data()
-            return self.split_data_as_train_test()
+            cache_key = None
+            if self.stage_cache is not None:
+                cache_key = self.get_cache_key()
+                cached_artifact = self.stage_cache.lookup(stage=DATA_INGESTION_ARTIFACT_DIR, key=cache_key)
+                if cached_artifact is not None:
+                    return cached_artifact
+
+            with profile_span("download"):
+                raw_data_dir =  self.download_carprice_data()
+            if self.dataset_dir is not None:
+                data_ingestion_artifact = self.append_new_listings()
+            else:
+                data_ingestion_artifact = self.split_data_as_train_test()
+
+            if cache_key is not None:
+                self.stage_cache.store(stage=DATA_INGESTION_ARTIFACT_DIR, key=cache_key, artifact=data_ingestion_artifact)
+            return data_ingestion_artifact
         except Exception as e:
             raise CarException(e,sys) from e
     
@@ -10,20 +10,29 @@ from carprice.logger import logging
 from carprice.entity.config_entity import DataTransformationConfig
 from carprice.entity.artifact_entity import DataIngestionArtifact,\
     DataValidationArtifact, DataTransformationArtifact
-from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from carprice.constant import *
-from carprice.util.util import read_yaml_file, save_object, save_numpy_array_data, load_data
+from carprice.util.util import read_yaml_file, save_object, save_numpy_array, load_data, \
+    get_target_array_file_path, iter_dataframe_chunks
+from carprice.util.stage_cache import StageCache
+from carprice.util.streaming_stats import KLLSketch
+from carprice.util.job_runner import track_stage
+from carprice.util.stage_profiler import profile_span, record_rows
+# imported here too so preprocessing objects pickled before it moved to util still load
+from carprice.util.outlier_capper import OutlierCapper, CONTINUOUS_COLUMN_MIN_UNIQUE
 
 
 class DataTransformation:
 
     def __init__(self, data_transformation_config: DataTransformationConfig,
                  data_ingestion_artifact: DataIngestionArtifact,
-                 data_validation_artifact: DataValidationArtifact
+                 data_validation_artifact: DataValidationArtifact,
+                 stage_cache: StageCache = None,
+                 feature_dtype=np.float32,
+                 chunk_size: int = None
                  ):
         try:
             logging.info(
@@ -31,6 +40,9 @@ class DataTransformation:
             self.data_transformation_config = data_transformation_config
             self.data_ingestion_artifact = data_ingestion_artifact
             self.data_validation_artifact = data_validation_artifact
+            self.stage_cache = stage_cache
+            self.feature_dtype = feature_dtype
+            self.chunk_size = chunk_size
 
         except Exception as e:
             raise CarException(e, sys) from e
@@ -41,12 +53,17 @@ class DataTransformation:
 
             dataset_schema = read_yaml_file(file_path=schema_file_path)
 
-            numerical_columns = dataset_schema[NUMERICAL_COLUMN_KEY]
-            categorical_columns = dataset_schema[CATEGORICAL_COLUMN_KEY]
+            numerical_columns = dataset_schema[NUMERICAL_COLUMNS_KEY]
+            categorical_columns = dataset_schema[CATEGORICAL_COLUMNS_KEY]
             onehot_columns = dataset_schema[ONEHOT_COLUMNS_KEY]
             binary_columns = dataset_schema[BINARY_COLUMNS_KEY]
             
-            numeric_transformer = StandardScaler()
+            numeric_transformer = Pipeline(
+                [
+                    ("OutlierCapper", OutlierCapper()),
+                    ("StandardScaler", StandardScaler())
+                ]
+            )
             oh_transformer = OneHotEncoder()
             binary_transformer = BinaryEncoder()
 
@@ -54,7 +71,7 @@ class DataTransformation:
                 [
                     ("OneHotEncoder", oh_transformer, onehot_columns),
                     ("BinaryEncoder", binary_transformer, binary_columns),
-                    ("StandardScaler", numeric_transformer, numerical_columns)
+                    ("NumericalPipeline", numeric_transformer, numerical_columns)
                 ]
             )
 
@@ -66,22 +83,171 @@ class DataTransformation:
         except Exception as e:
             raise CarException(e, sys) from e
     
-    def _outlier_capping(self, col, df):
-        try: 
-            percentile25 = df[col].quantile(0.25)
-            percentile75 = df[col].quantile(0.75)
-            iqr = percentile75 - percentile25
-            upper_limit = percentile75 + 1.5 * iqr
-            lower_limit = percentile25 - 1.5 * iqr
-            df.loc[(df[col]>upper_limit), col]= upper_limit
-            df.loc[(df[col]<lower_limit), col]= lower_limit 
-            return df
-        
+    def get_transformed_file_paths(self):
+        try:
+            train_file_name = os.path.splitext(
+                os.path.basename(self.data_ingestion_artifact.train_file_path))[0] + TRANSFORMED_ARRAY_FILE_EXTENSION
+            test_file_name = os.path.splitext(
+                os.path.basename(self.data_ingestion_artifact.test_file_path))[0] + TRANSFORMED_ARRAY_FILE_EXTENSION
+
+            transformed_train_file_path = os.path.join(
+                self.data_transformation_config.transformed_train_dir, train_file_name)
+            transformed_test_file_path = os.path.join(
+                self.data_transformation_config.transformed_test_dir, test_file_name)
+            return transformed_train_file_path, transformed_test_file_path
         except Exception as e:
             raise CarException(e, sys) from e
 
+    def _iter_chunks(self, file_path, dtypes):
+        for chunk in iter_dataframe_chunks(file_path=file_path, chunk_size=self.chunk_size, columns=list(dtypes)):
+            yield chunk.astype(dtypes)
+
+    def _get_vocabulary_frame(self, vocabularies, input_dtypes):
+        """
+        One row per category of the longest vocabulary, used to fit the
+        encoders without holding the training data in memory.
+        """
+        n_rows = max([len(vocabulary) for vocabulary in vocabularies.values()] + [1])
+        frame = {}
+        for col in input_dtypes:
+            if col in vocabularies:
+                vocabulary = sorted(vocabularies[col])
+                frame[col] = [vocabulary[row % len(vocabulary)] for row in range(n_rows)]
+            else:
+                frame[col] = np.zeros(n_rows)
+        return pd.DataFrame(frame).astype(input_dtypes)
+
+    def initiate_chunked_data_transformation(self) -> DataTransformationArtifact:
+        """
+        Out-of-core variant of initiate_data_transformation for datasets that
+        do not fit in memory. Train data is streamed three times:
+        1. KLL quantile sketches, distinct counts and category vocabularies
+        2. running mean/variance (StandardScaler.partial_fit) of the capped columns
+        3. capping and encoding chunk by chunk into memory-mapped .npy files
+        The OutlierCapper and StandardScaler of the saved preprocessing object
+        get the limits and moments collected here.
+        """
+        try:
+            train_file_path = self.data_ingestion_artifact.train_file_path
+            test_file_path = self.data_ingestion_artifact.test_file_path
+            schema = read_yaml_file(file_path=self.data_validation_artifact.schema_file_path)
+
+            dtypes = schema[DATASET_SCHEMA_COLUMNS_KEY]
+            target_column_name = schema[TARGET_COLUMN_KEY]
+            numerical_columns = schema[NUMERICAL_COLUMNS_KEY]
+            categorical_columns = schema[CATEGORICAL_COLUMNS_KEY]
+            input_dtypes = {col: dtype for col, dtype in dtypes.items() if col != target_column_name}
+
+            logging.info(f"Collecting quantile sketches and vocabularies in chunks of [{self.chunk_size}] rows")
+            sketches = {col: KLLSketch() for col in numerical_columns}
+            distinct_values = {col: set() for col in numerical_columns}
+            vocabularies = {col: set() for col in categorical_columns}
+            n_train_rows = 0
+            for chunk in self._iter_chunks(train_file_path, dtypes):
+                n_train_rows += len(chunk)
+                for col in numerical_columns:
+                    sketches[col].update(chunk[col].to_numpy())
+                    if len(distinct_values[col]) < CONTINUOUS_COLUMN_MIN_UNIQUE:
+                        distinct_values[col].update(chunk[col].unique())
+                for col in categorical_columns:
+                    vocabularies[col].update(chunk[col].dropna().unique())
+
+            percentile25, percentile75 = np.array([sketches[col].quantile([0.25, 0.75])
+                                                   for col in numerical_columns]).T
+            n_unique = [len(distinct_values[col]) for col in numerical_columns]
+            capper = OutlierCapper().set_limits_from_quantiles(percentile25, percentile75, n_unique)
+            logging.info(f"Outlier capping limits: {list(zip(capper.lower_limits_, capper.upper_limits_))}")
+
+            logging.info(f"Computing running mean and variance of capped numerical columns")
+            scaler = StandardScaler()
+            for chunk in self._iter_chunks(train_file_path, dtypes):
+                scaler.partial_fit(capper.transform(chunk[numerical_columns]))
+
+            logging.info(f"Fitting encoders on category vocabularies")
+            preprocessing_obj = self.get_data_transformer_object()
+            vocabulary_frame = self._get_vocabulary_frame(vocabularies, input_dtypes)
+            preprocessing_obj.fit(vocabulary_frame)
+            numerical_pipeline = preprocessing_obj.named_transformers_["NumericalPipeline"]
+            numerical_pipeline.steps = [("OutlierCapper", capper), ("StandardScaler", scaler)]
+            n_features = preprocessing_obj.transform(vocabulary_frame.head(1)).shape[1]
+
+            transformed_train_file_path, transformed_test_file_path = self.get_transformed_file_paths()
+            n_test_rows = sum(len(chunk) for chunk in iter_dataframe_chunks(
+                file_path=test_file_path, chunk_size=self.chunk_size, columns=[target_column_name]))
+            record_rows(n_train_rows + n_test_rows)
+
+            for file_path, transformed_file_path, n_rows in (
+                    (train_file_path, transformed_train_file_path, n_train_rows),
+                    (test_file_path, transformed_test_file_path, n_test_rows)):
+                logging.info(f"Streaming [{n_rows}] transformed rows of [{file_path}] to [{transformed_file_path}]")
+                os.makedirs(os.path.dirname(transformed_file_path), exist_ok=True)
+                features = np.lib.format.open_memmap(transformed_file_path, mode="w+",
+                                                     dtype=self.feature_dtype or np.float64,
+                                                     shape=(n_rows, n_features))
+                target = np.lib.format.open_memmap(get_target_array_file_path(transformed_file_path), mode="w+",
+                                                   dtype=np.dtype(dtypes[target_column_name]), shape=(n_rows,))
+                start = 0
+                for chunk in self._iter_chunks(file_path, dtypes):
+                    stop = start + len(chunk)
+                    features[start:stop] = preprocessing_obj.transform(chunk.drop(columns=[target_column_name]))
+                    target[start:stop] = chunk[target_column_name].to_numpy()
+                    start = stop
+                features.flush()
+                target.flush()
+                del features, target
+
+            preprocessing_obj_file_path = self.data_transformation_config.preprocessed_object_file_path
+            logging.info(f"Saving preprocessing object.")
+            save_object(file_path=preprocessing_obj_file_path, obj=preprocessing_obj)
+
+            data_transformation_artifact = DataTransformationArtifact(is_transformed=True,
+                                                                      message="Data transformation successfull.",
+                                                                      transformed_train_file_path=transformed_train_file_path,
+                                                                      transformed_test_file_path=transformed_test_file_path,
+                                                                      preprocessed_object_file_path=preprocessing_obj_file_path
+                                                                      )
+            logging.info(
+                f"Data transformationa artifact: {data_transformation_artifact}")
+            return data_transformation_artifact
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_cache_key(self) -> str:
+        try:
+            file_paths = [self.data_ingestion_artifact.train_file_path,
+                          self.data_ingestion_artifact.test_file_path,
+                          self.data_validation_artifact.schema_file_path]
+            settings = {
+                "preprocessed_object_file_name": os.path.basename(
+                    self.data_transformation_config.preprocessed_object_file_path),
+                "array_layout": "features_target_npy",
+                "feature_dtype": np.dtype(self.feature_dtype).name if self.feature_dtype else None,
+                "chunk_size": self.chunk_size,
+                "outlier_capping": "fitted_on_train",
+            }
+            code_modules = [__name__, "carprice", "carprice.util.outlier_capper", "carprice.util.streaming_stats"]
+            return self.stage_cache.get_key(stage=DATA_TRANSFORMATION_ARTIFACT_DIR, code_modules=code_modules,
+                                            file_paths=file_paths, settings=settings)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    @track_stage(DATA_TRANSFORMATION_ARTIFACT_DIR)
     def initiate_data_transformation(self) -> DataTransformationArtifact:
         try:
+            cache_key = None
+            if self.stage_cache is not None:
+                cache_key = self.get_cache_key()
+                cached_artifact = self.stage_cache.lookup(stage=DATA_TRANSFORMATION_ARTIFACT_DIR, key=cache_key)
+                if cached_artifact is not None:
+                    return cached_artifact
+
+            if self.chunk_size is not None:
+                data_transformation_artifact = self.initiate_chunked_data_transformation()
+                if cache_key is not None:
+                    self.stage_cache.store(stage=DATA_TRANSFORMATION_ARTIFACT_DIR, key=cache_key,
+                                           artifact=data_transformation_artifact)
+                return data_transformation_artifact
+
             logging.info(f"Obtaining preprocessing object.")
             preprocessing_obj = self.get_data_transformer_object()
 
@@ -98,24 +264,12 @@ class DataTransformation:
 
             test_df = load_data(file_path=test_file_path,
                                 schema_file_path=schema_file_path)
+            record_rows(len(train_df) + len(test_df))
 
             schema = read_yaml_file(file_path=schema_file_path)
 
             target_column_name = schema[TARGET_COLUMN_KEY]
-            numerical_columns = schema[NUMERICAL_COLUMN_KEY]
-            
-            continuous_columns=[feature for feature in numerical_columns if len(train_df[feature].unique())>=25]
 
-            for col in continuous_columns:
-                self._outlier_capping(col=col, df= train_df)
-            
-            logging.info(f"Outlier capped in train df")
-            
-            for col in continuous_columns:
-                self._outlier_capping(col=col, df= test_df)
-            logging.info(f"Outlier capped in test df ")
-
-            
             logging.info(
                 f"Splitting input and target feature from training and testing dataframe.")
             input_feature_train_df = train_df.drop(
@@ -128,36 +282,31 @@ class DataTransformation:
 
             logging.info(
                 f"Applying preprocessing object on training dataframe and testing dataframe")
-            input_feature_train_arr = preprocessing_obj.fit_transform(
-                input_feature_train_df)
-            input_feature_test_arr = preprocessing_obj.transform(
-                input_feature_test_df)
-
-            train_arr = np.c_[input_feature_train_arr,
-                              np.array(target_feature_train_df)]
-
-            test_arr = np.c_[input_feature_test_arr,
-                             np.array(target_feature_test_df)]
-
-            transformed_train_dir = self.data_transformation_config.transformed_train_dir
-            transformed_test_dir = self.data_transformation_config.transformed_test_dir
-
-            train_file_name = os.path.basename(
-                train_file_path).replace(".csv", ".npz")
-            test_file_name = os.path.basename(
-                test_file_path).replace(".csv", ".npz")
-
-            transformed_train_file_path = os.path.join(
-                transformed_train_dir, train_file_name)
-            transformed_test_file_path = os.path.join(
-                transformed_test_dir, test_file_name)
-
+            with profile_span("fit_transform") as span:
+                span.add_rows(len(input_feature_train_df))
+                input_feature_train_arr = preprocessing_obj.fit_transform(
+                    input_feature_train_df)
+            with profile_span("transform") as span:
+                span.add_rows(len(input_feature_test_df))
+                input_feature_test_arr = preprocessing_obj.transform(
+                    input_feature_test_df)
+
+            transformed_train_file_path, transformed_test_file_path = self.get_transformed_file_paths()
+
+            # features and target go to separate contiguous .npy files so the
+            # trainer can memory-map them without copying to split off the target
             logging.info(f"Saving transformed training and testing array.")
 
-            save_numpy_array_data(
-                file_path=transformed_train_file_path, array=train_arr)
-            save_numpy_array_data(
-                file_path=transformed_test_file_path, array=test_arr)
+            save_numpy_array(
+                file_path=transformed_train_file_path, array=input_feature_train_arr, dtype=self.feature_dtype)
+            save_numpy_array(
+                file_path=get_target_array_file_path(transformed_train_file_path),
+                array=np.array(target_feature_train_df))
+            save_numpy_array(
+                file_path=transformed_test_file_path, array=input_feature_test_arr, dtype=self.feature_dtype)
+            save_numpy_array(
+                file_path=get_target_array_file_path(transformed_test_file_path),
+                array=np.array(target_feature_test_df))
 
             preprocessing_obj_file_path = self.data_transformation_config.preprocessed_object_file_path
 
@@ -173,6 +322,9 @@ class DataTransformation:
                                                                       )
             logging.info(
                 f"Data transformationa artifact: {data_transformation_artifact}")
+            if cache_key is not None:
+                self.stage_cache.store(stage=DATA_TRANSFORMATION_ARTIFACT_DIR, key=cache_key,
+                                       artifact=data_transformation_artifact)
             return data_transformation_artifact
         except Exception as e:
             raise CarException(e, sys) from e
@@ -5,32 +5,49 @@ from carprice.entity.artifact_entity import DataIngestionArtifact,DataValidation
 from carprice.constant import *
 import os,sys
 import pandas  as pd
-from evidently.model_profile import Profile
-from evidently.model_profile.sections import DataDriftProfileSection
-from evidently.dashboard import Dashboard
-from evidently.dashboard.tabs import DataDriftTab
 import json
-from carprice.util.util import read_yaml_file
+from carprice.util.util import read_yaml_file, read_dataframe
+from carprice.util.stage_cache import StageCache
+from carprice.util.drift_profile import DataProfile, compare_profiles, render_drift_report_html
+from carprice.util.schema_validator import SchemaValidator
+from carprice.util.job_runner import track_stage
+from carprice.util.stage_profiler import profile_span, record_rows
 
 class DataValidation:
     
 
     def __init__(self, data_validation_config:DataValidationConfig,
-        data_ingestion_artifact:DataIngestionArtifact):
+        data_ingestion_artifact:DataIngestionArtifact, stage_cache:StageCache=None,
+        sample_size:int=None, reference_profile_file_path:str=None):
+        """
+        sample_size: rows sampled from each dataset for drift detection, None to use every row
+        reference_profile_file_path: saved profile of a fixed baseline; when it exists the
+        ingested train and test data are compared against it instead of train against test
+        """
         try:
             logging.info(f"{'>>'*30}Data Valdaition log started.{'<<'*30} \n\n")
             self.data_validation_config = data_validation_config
             self.data_validation_info = read_yaml_file(self.data_validation_config.schema_file_path)
             self.data_ingestion_artifact = data_ingestion_artifact
+            self.schema_validator = SchemaValidator(schema=self.data_validation_info)
+            self.stage_cache = stage_cache
+            self.sample_size = sample_size
+            self.reference_profile_file_path = reference_profile_file_path
+            self._train_and_test_df = None
+            self._data_drift_report = None
         except Exception as e:
             raise CarException(e,sys) from e
 
 
     def get_train_and_test_df(self):
         try:
-            train_df = pd.read_csv(self.data_ingestion_artifact.train_file_path)
-            test_df = pd.read_csv(self.data_ingestion_artifact.test_file_path)
-            return train_df,test_df
+            if self._train_and_test_df is None:
+                columns = list(self.data_validation_info[DATASET_SCHEMA_COLUMNS_KEY].keys())
+                train_df = read_dataframe(self.data_ingestion_artifact.train_file_path, columns=columns)
+                test_df = read_dataframe(self.data_ingestion_artifact.test_file_path, columns=columns)
+                self._train_and_test_df = (train_df, test_df)
+                record_rows(len(train_df) + len(test_df))
+            return self._train_and_test_df
         except Exception as e:
             raise CarException(e,sys) from e
 
@@ -64,12 +81,8 @@ class DataValidation:
     
     def data_validate(self, data):
         try:
-            dataset_schema = self.data_validation_info[DATASET_SCHEMA_COLUMNS_KEY]
-            column_list = list(dataset_schema.keys())
-            if len(column_list)== len(list(data.columns)):
-                pass
-            else: 
-                return "Train data validation failed"
+            validation_result = self.schema_validator.validate(data)
+            return self.schema_validator.get_error_message(validation_result)
         except Exception as e: 
             raise CarException(e, sys) from e
         
@@ -80,27 +93,67 @@ class DataValidation:
         """
         try:
             train, test = self.get_train_and_test_df()
-            error = self.data_validate(train)
-            validation_status = False
-            if error:
-                pass
-            else:
-                validation_status = True
+            validation_status = True
+            for dataset_name, data in (("Train", train), ("Test", test)):
+                error = self.data_validate(data)
+                if error:
+                    logging.info(f"{dataset_name} data validation failed: {error}")
+                    validation_status = False
             
             return validation_status
          
         except Exception as e:
             raise CarException(e,sys) from e
 
-    def get_and_save_data_drift_report(self):
+    def get_profile_columns(self):
+        numerical_columns = list(self.data_validation_info[NUMERICAL_COLUMNS_KEY])
+        target_column = self.data_validation_info[TARGET_COLUMN_KEY]
+        if target_column not in numerical_columns:
+            numerical_columns.append(target_column)
+        return numerical_columns, list(self.data_validation_info[CATEGORICAL_COLUMNS_KEY])
+
+    def sample_df(self, df:pd.DataFrame)->pd.DataFrame:
+        if self.sample_size is None or len(df) <= self.sample_size:
+            return df
+        return df.sample(n=self.sample_size, random_state=DRIFT_SAMPLE_RANDOM_STATE)
+
+    def get_data_drift_report(self)->dict:
+        """
+        Profiles the data once and compares it with the reference profile.
+        The result is kept so the JSON report and the HTML page share it.
+        """
         try:
-            profile = Profile(sections=[DataDriftProfileSection()])
+            if self._data_drift_report is not None:
+                return self._data_drift_report
 
+            numerical_columns, categorical_columns = self.get_profile_columns()
             train_df,test_df = self.get_train_and_test_df()
+            reference_profile_file_path = self.reference_profile_file_path
+            if reference_profile_file_path is not None and os.path.exists(reference_profile_file_path):
+                logging.info(f"Comparing ingested data with the baseline profile: [{reference_profile_file_path}]")
+                reference_profile = DataProfile.load(reference_profile_file_path)
+                current_df = pd.concat([self.sample_df(train_df), self.sample_df(test_df)], ignore_index=True)
+            else:
+                reference_profile = DataProfile.from_dataframe(self.sample_df(train_df), numerical_columns,
+                                                               categorical_columns)
+                if reference_profile_file_path is None:
+                    reference_profile_file_path = os.path.join(
+                        os.path.dirname(self.data_validation_config.report_file_path),
+                        DATA_VALIDATION_REFERENCE_PROFILE_FILE_NAME)
+                reference_profile.save(reference_profile_file_path)
+                logging.info(f"Reference profile saved at: [{reference_profile_file_path}]")
+                current_df = self.sample_df(test_df)
+
+            current_profile = DataProfile.from_dataframe(current_df, numerical_columns, categorical_columns,
+                                                         reference=reference_profile)
+            self._data_drift_report = compare_profiles(reference_profile, current_profile)
+            return self._data_drift_report
+        except Exception as e:
+            raise CarException(e,sys) from e
 
-            profile.calculate(train_df,test_df)
-
-            report = json.loads(profile.json())
+    def get_and_save_data_drift_report(self):
+        try:
+            report = self.get_data_drift_report()
 
             report_file_path = self.data_validation_config.report_file_path
             report_dir = os.path.dirname(report_file_path)
@@ -114,15 +167,14 @@ class DataValidation:
 
     def save_data_drift_report_page(self):
         try:
-            dashboard = Dashboard(tabs=[DataDriftTab()])
-            train_df,test_df = self.get_train_and_test_df()
-            dashboard.calculate(train_df,test_df)
+            report = self.get_data_drift_report()
 
             report_page_file_path = self.data_validation_config.report_page_file_path
             report_page_dir = os.path.dirname(report_page_file_path)
             os.makedirs(report_page_dir,exist_ok=True)
 
-            dashboard.save(report_page_file_path)
+            with open(report_page_file_path,"w",encoding="utf-8") as report_page_file:
+                report_page_file.write(render_drift_report_html(report))
         except Exception as e:
             raise CarException(e,sys) from e
 
@@ -130,15 +182,52 @@ class DataValidation:
         try:
             report = self.get_and_save_data_drift_report()
             self.save_data_drift_report_page()
-            return True
+            is_drift_found = report["data_drift"]["dataset_drift"]
+            logging.info(f"Is data drift found? -> {is_drift_found}")
+            return is_drift_found
+        except Exception as e:
+            raise CarException(e,sys) from e
+
+    def get_cache_key(self, check_drift:bool=True) -> str:
+        try:
+            file_paths = [self.data_ingestion_artifact.train_file_path,
+                          self.data_ingestion_artifact.test_file_path,
+                          self.data_validation_config.schema_file_path]
+            if self.reference_profile_file_path is not None and os.path.exists(self.reference_profile_file_path):
+                file_paths.append(self.reference_profile_file_path)
+            settings = {
+                "sample_size": self.sample_size,
+                "drift_method": "profile_chi2_psi",
+                "check_drift": check_drift,
+                "report_file_name": os.path.basename(self.data_validation_config.report_file_path),
+                "report_page_file_name": os.path.basename(self.data_validation_config.report_page_file_path),
+            }
+            code_modules = [__name__, "carprice", "carprice.util.schema_validator", "carprice.util.drift_profile"]
+            return self.stage_cache.get_key(stage=DATA_VALIDATION_ARTIFACT_DIR, code_modules=code_modules,
+                                            file_paths=file_paths, settings=settings)
         except Exception as e:
             raise CarException(e,sys) from e
 
-    def initiate_data_validation(self)->DataValidationArtifact :
+    @track_stage(DATA_VALIDATION_ARTIFACT_DIR)
+    def initiate_data_validation(self, check_drift:bool=True)->DataValidationArtifact :
+        """
+        check_drift: also write the drift report and page; pass False when they are
+        produced separately with is_data_drift_found
+        """
         try:
             self.is_train_test_file_exists()
-            self.validate_dataset_schema()
-            self.is_data_drift_found()
+            cache_key = None
+            if self.stage_cache is not None:
+                cache_key = self.get_cache_key(check_drift=check_drift)
+                cached_artifact = self.stage_cache.lookup(stage=DATA_VALIDATION_ARTIFACT_DIR, key=cache_key)
+                if cached_artifact is not None:
+                    return cached_artifact
+
+            with profile_span("schema_validation"):
+                self.validate_dataset_schema()
+            if check_drift:
+                with profile_span("drift_report"):
+                    self.is_data_drift_found()
 
             data_validation_artifact = DataValidationArtifact(
                 schema_file_path=self.data_validation_config.schema_file_path,
@@ -148,6 +237,8 @@ class DataValidation:
                 message="Data Validation performed successully."
             )
             logging.info(f"Data validation artifact: {data_validation_artifact}")
+            if cache_key is not None:
+                self.stage_cache.store(stage=DATA_VALIDATION_ARTIFACT_DIR, key=cache_key, artifact=data_validation_artifact)
             return data_validation_artifact
         except Exception as e:
             raise CarException(e,sys) from e
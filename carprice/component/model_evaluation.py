@@ -3,13 +3,18 @@
 from carprice.logger import logging
 from carprice.exception import CarException
 from carprice.entity.config_entity import ModelEvaluationConfig
-from carprice.entity.artifact_entity import DataIngestionArtifact,DataValidationArtifact,ModelTrainerArtifact,ModelEvaluationArtifact
+from carprice.entity.artifact_entity import DataIngestionArtifact,DataValidationArtifact,ModelTrainerArtifact,ModelEvaluationArtifact, \
+    DataTransformationArtifact
 from carprice.constant import *
-import numpy as np
 import os
 import sys
-from carprice.util.util import write_yaml_file, read_yaml_file, load_object,load_data
-from carprice.entity.model_factory import evaluate_regression_model
+import json
+from carprice.util.util import write_yaml_file, read_yaml_file, load_object,load_data, load_numpy_array, \
+    get_target_array_file_path
+from carprice.util.stage_cache import hash_file
+from carprice.util.model_metrics import get_regression_metrics, select_model
+from carprice.util.job_runner import track_stage
+from carprice.util.stage_profiler import profile_span, record_rows
 
 
 class ModelEvaluation:
@@ -17,34 +22,45 @@ class ModelEvaluation:
     def __init__(self, model_evaluation_config: ModelEvaluationConfig,
                  data_ingestion_artifact: DataIngestionArtifact,
                  data_validation_artifact: DataValidationArtifact,
-                 model_trainer_artifact: ModelTrainerArtifact):
+                 model_trainer_artifact: ModelTrainerArtifact,
+                 data_transformation_artifact: DataTransformationArtifact = None):
+        """
+        data_transformation_artifact: transformed train/test arrays the trained model is scored on,
+        the ingested data is preprocessed again when it is not given
+        """
         try:
             logging.info(f"{'>>' * 30}Model Evaluation log started.{'<<' * 30} ")
             self.model_evaluation_config = model_evaluation_config
             self.model_trainer_artifact = model_trainer_artifact
             self.data_ingestion_artifact = data_ingestion_artifact
             self.data_validation_artifact = data_validation_artifact
+            self.data_transformation_artifact = data_transformation_artifact
         except Exception as e:
             raise CarException(e, sys) from e
 
-    def get_best_model(self):
+    def get_best_model_path(self):
         try:
-            model = None
             model_evaluation_file_path = self.model_evaluation_config.model_evaluation_file_path
 
             if not os.path.exists(model_evaluation_file_path):
                 write_yaml_file(file_path=model_evaluation_file_path,
                                 )
-                return model
+                return None
             model_eval_file_content = read_yaml_file(file_path=model_evaluation_file_path)
 
             model_eval_file_content = dict() if model_eval_file_content is None else model_eval_file_content
 
             if BEST_MODEL_KEY not in model_eval_file_content:
-                return model
+                return None
+
+            return model_eval_file_content[BEST_MODEL_KEY][MODEL_PATH_KEY]
+        except Exception as e:
+            raise CarException(e, sys) from e
 
-            model = load_object(file_path=model_eval_file_content[BEST_MODEL_KEY][MODEL_PATH_KEY])
-            return model
+    def get_best_model(self):
+        try:
+            best_model_path = self.get_best_model_path()
+            return None if best_model_path is None else load_object(file_path=best_model_path)
         except Exception as e:
             raise CarException(e, sys) from e
 
@@ -59,7 +75,8 @@ class ModelEvaluation:
             if BEST_MODEL_KEY in model_eval_content:
                 previous_best_model = model_eval_content[BEST_MODEL_KEY]
 
-            logging.info(f"Previous eval result: {model_eval_content}")
+            logging.info(f"Previous best model: {previous_best_model}")
+            logging.debug("Previous eval result: %s", model_eval_content)
             eval_result = {
                 BEST_MODEL_KEY: {
                     MODEL_PATH_KEY: model_evaluation_artifact.evaluated_model_path,
@@ -75,46 +92,95 @@ class ModelEvaluation:
                     model_eval_content[HISTORY_KEY].update(model_history)
 
             model_eval_content.update(eval_result)
-            logging.info(f"Updated eval result:{model_eval_content}")
+            logging.info(f"Updated eval result, best model: {model_eval_content[BEST_MODEL_KEY]}, "
+                         f"history entries: {len(model_eval_content.get(HISTORY_KEY, {}))}")
+            logging.debug("Updated eval result: %s", model_eval_content)
             write_yaml_file(file_path=eval_file_path, data=model_eval_content)
 
         except Exception as e:
             raise CarException(e, sys) from e
 
+    def get_raw_data(self):
+        """
+        Loads the ingested train and test data, split into features and target.
+        """
+        try:
+            schema_file_path = self.data_validation_artifact.schema_file_path
+            target_column_name = read_yaml_file(file_path=schema_file_path)[TARGET_COLUMN_KEY]
+            datasets = []
+            for file_path in (self.data_ingestion_artifact.train_file_path, self.data_ingestion_artifact.test_file_path):
+                dataframe = load_data(file_path=file_path, schema_file_path=schema_file_path)
+                datasets.append((dataframe.drop(columns=[target_column_name]), dataframe[target_column_name].to_numpy()))
+            return datasets
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_incumbent_metrics(self, model_path: str) -> dict:
+        """
+        Scores the current best model on the ingested data. Metrics are
+        cached by model and dataset content, so an incumbent is scored only
+        once per dataset however many candidates it faces.
+        """
+        try:
+            hasher = hash_file(model_path)
+            hash_file(self.data_ingestion_artifact.train_file_path, hasher)
+            hash_file(self.data_ingestion_artifact.test_file_path, hasher)
+            score_cache_dir = os.path.join(os.path.dirname(self.model_evaluation_config.model_evaluation_file_path),
+                                           MODEL_EVALUATION_SCORE_CACHE_DIR_NAME, hasher.hexdigest())
+            metrics_file_path = os.path.join(score_cache_dir, "metrics.json")
+            if os.path.exists(metrics_file_path):
+                logging.info(f"Reusing cached scores of [{model_path}] from: [{score_cache_dir}]")
+                with open(metrics_file_path, "r") as metrics_file:
+                    return json.load(metrics_file)
+
+            logging.info(f"Scoring incumbent model [{model_path}] on the ingested data")
+            model = load_object(file_path=model_path)
+            (x_train, y_train), (x_test, y_test) = self.get_raw_data()
+            metrics = get_regression_metrics(y_train, model.predict(x_train), y_test, model.predict(x_test))
+
+            os.makedirs(score_cache_dir, exist_ok=True)
+            partial_metrics_file_path = f"{metrics_file_path}.partial"
+            with open(partial_metrics_file_path, "w") as metrics_file:
+                json.dump(metrics, metrics_file)
+            os.replace(partial_metrics_file_path, metrics_file_path)
+            return metrics
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_candidate_metrics(self, trained_model_object) -> dict:
+        """
+        Scores the trained model on the arrays DataTransformation already
+        produced, skipping preprocessing altogether.
+        """
+        try:
+            # a warm started model keeps the incumbent's preprocessing, the transformed arrays do not fit it
+            if self.data_transformation_artifact is None or \
+                    getattr(trained_model_object, "preprocessed_object_file_path", None) != \
+                    self.data_transformation_artifact.preprocessed_object_file_path:
+                (x_train, y_train), (x_test, y_test) = self.get_raw_data()
+                return get_regression_metrics(y_train, trained_model_object.predict(x_train),
+                                              y_test, trained_model_object.predict(x_test))
+
+            estimator = trained_model_object.trained_model_object
+            transformed_train_file_path = self.data_transformation_artifact.transformed_train_file_path
+            transformed_test_file_path = self.data_transformation_artifact.transformed_test_file_path
+            x_train = load_numpy_array(file_path=transformed_train_file_path, mmap_mode='r')
+            y_train = load_numpy_array(file_path=get_target_array_file_path(transformed_train_file_path), mmap_mode='r')
+            x_test = load_numpy_array(file_path=transformed_test_file_path, mmap_mode='r')
+            y_test = load_numpy_array(file_path=get_target_array_file_path(transformed_test_file_path), mmap_mode='r')
+            record_rows(len(y_train) + len(y_test))
+            return get_regression_metrics(y_train, estimator.predict(x_train), y_test, estimator.predict(x_test))
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    @track_stage(MODEL_EVALUATION_ARTIFACT_DIR)
     def initiate_model_evaluation(self) -> ModelEvaluationArtifact:
         try:
             trained_model_file_path = self.model_trainer_artifact.trained_model_file_path
-            trained_model_object = load_object(file_path=trained_model_file_path)
 
-            train_file_path = self.data_ingestion_artifact.train_file_path
-            test_file_path = self.data_ingestion_artifact.test_file_path
+            best_model_path = self.get_best_model_path()
 
-            schema_file_path = self.data_validation_artifact.schema_file_path
-
-            train_dataframe = load_data(file_path=train_file_path,
-                                                           schema_file_path=schema_file_path,
-                                                           )
-            test_dataframe = load_data(file_path=test_file_path,
-                                                          schema_file_path=schema_file_path,
-                                                          )
-            schema_content = read_yaml_file(file_path=schema_file_path)
-            target_column_name = schema_content[TARGET_COLUMN_KEY]
-
-            # target_column
-            logging.info(f"Converting target column into numpy array.")
-            train_target_arr = np.array(train_dataframe[target_column_name])
-            test_target_arr = np.array(test_dataframe[target_column_name])
-            logging.info(f"Conversion completed target column into numpy array.")
-
-            # dropping target column from the dataframe
-            logging.info(f"Dropping target column from the dataframe.")
-            train_dataframe.drop(target_column_name, axis=1, inplace=True)
-            test_dataframe.drop(target_column_name, axis=1, inplace=True)
-            logging.info(f"Dropping target column from the dataframe completed.")
-
-            model = self.get_best_model()
-
-            if model is None:
+            if best_model_path is None:
                 logging.info("Not found any existing model. Hence accepting trained model")
                 model_evaluation_artifact = ModelEvaluationArtifact(evaluated_model_path=trained_model_file_path,
                                                                     is_model_accepted=True)
@@ -122,25 +188,18 @@ class ModelEvaluation:
                 logging.info(f"Model accepted. Model eval artifact {model_evaluation_artifact} created")
                 return model_evaluation_artifact
 
-            model_list = [model, trained_model_object]
-
-            metric_info_artifact = evaluate_regression_model(model_list=model_list,
-                                                               X_train=train_dataframe,
-                                                               y_train=train_target_arr,
-                                                               X_test=test_dataframe,
-                                                               y_test=test_target_arr,
-                                                               base_accuracy=self.model_trainer_artifact.model_accuracy,
-                                                               )
-            logging.info(f"Model evaluation completed. model metric artifact: {metric_info_artifact}")
-
-            if metric_info_artifact is None:
-                response = ModelEvaluationArtifact(is_model_accepted=False,
-                                                   evaluated_model_path=trained_model_file_path
-                                                   )
-                logging.info(response)
-                return response
-
-            if metric_info_artifact.index_number == 1:
+            with profile_span("incumbent_scoring"):
+                incumbent_metrics = self.get_incumbent_metrics(best_model_path)
+            trained_model_object = load_object(file_path=trained_model_file_path)
+            with profile_span("candidate_scoring"):
+                candidate_metrics = self.get_candidate_metrics(trained_model_object)
+            logging.info(f"Model evaluation completed. Incumbent: {incumbent_metrics}, trained: {candidate_metrics}")
+
+            # same gate as evaluate_regression_model([incumbent, trained], base_accuracy=trained accuracy):
+            # the trained model must pass the base accuracy and overfit checks and not lose to the incumbent
+            selected_index = select_model([incumbent_metrics, candidate_metrics],
+                                          base_accuracy=self.model_trainer_artifact.model_accuracy)
+            if selected_index == 1:
                 model_evaluation_artifact = ModelEvaluationArtifact(evaluated_model_path=trained_model_file_path,
                                                                     is_model_accepted=True)
                 self.update_evaluation_report(model_evaluation_artifact)
@@ -2,19 +2,27 @@ from carprice.logger import logging
 from carprice.exception import CarException
 from carprice.entity.artifact_entity import ModelPusherArtifact, ModelEvaluationArtifact 
 from carprice.entity.config_entity import ModelPusherConfig
+from carprice.constant import DATA_VALIDATION_REFERENCE_PROFILE_FILE_NAME, MODEL_PUSHER_ARTIFACT_DIR
 import os, sys
 import shutil
+from carprice.util.job_runner import track_stage
 
 
 class ModelPusher:
 
     def __init__(self, model_pusher_config: ModelPusherConfig,
-                 model_evaluation_artifact: ModelEvaluationArtifact
+                 model_evaluation_artifact: ModelEvaluationArtifact,
+                 reference_profile_file_path: str = None
                  ):
+        """
+        reference_profile_file_path: data profile written by DataValidation, exported next to
+        the model so that the serving DriftMonitor compares live traffic with the training data
+        """
         try:
             logging.info(f"{'>>' * 30}Model Pusher log started.{'<<' * 30} ")
             self.model_pusher_config = model_pusher_config
             self.model_evaluation_artifact = model_evaluation_artifact
+            self.reference_profile_file_path = reference_profile_file_path
 
         except Exception as e:
             raise CarException(e, sys) from e
@@ -28,7 +36,15 @@ class ModelPusher:
             logging.info(f"Exporting model file: [{export_model_file_path}]")
             os.makedirs(export_dir, exist_ok=True)
 
-            shutil.copy(src=evaluated_model_file_path, dst=export_model_file_path)
+            if self.reference_profile_file_path is not None and os.path.exists(self.reference_profile_file_path):
+                # exported before the model so it is in place once the model becomes visible
+                shutil.copy(src=self.reference_profile_file_path,
+                            dst=os.path.join(export_dir, DATA_VALIDATION_REFERENCE_PROFILE_FILE_NAME))
+
+            # copy under a temporary name first so a serving ModelRegistry never picks up a half-written model
+            partial_model_file_path = f"{export_model_file_path}.partial"
+            shutil.copy(src=evaluated_model_file_path, dst=partial_model_file_path)
+            os.replace(partial_model_file_path, export_model_file_path)
             #we can call a function to save model to Azure blob storage/ google cloud strorage / s3 bucket
             logging.info(
                 f"Trained model: {evaluated_model_file_path} is copied in export dir:[{export_model_file_path}]")
@@ -41,6 +57,7 @@ class ModelPusher:
         except Exception as e:
             raise CarException(e, sys) from e
 
+    @track_stage(MODEL_PUSHER_ARTIFACT_DIR)
     def initiate_model_pusher(self) -> ModelPusherArtifact:
         try:
             return self.export_model()
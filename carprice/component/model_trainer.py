@@ -2,22 +2,37 @@ import sys
 from carprice.exception import CarException
 from carprice.logger import logging
 from typing import List
-from carprice.entity.artifact_entity import DataTransformationArtifact, ModelTrainerArtifact
+from carprice.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact, \
+    DataTransformationArtifact, ModelTrainerArtifact
 from carprice.entity.config_entity import ModelTrainerConfig
-from carprice.util.util import load_numpy_array_data,save_object,load_object
-from carprice.entity.model_factory import MetricInfoArtifact, ModelFactory,GridSearchedBestModel
+from carprice.util.util import load_numpy_array,save_object,load_object,get_target_array_file_path,load_data, \
+    read_yaml_file
+from carprice.entity.model_factory import MetricInfoArtifact
 from carprice.entity.model_factory import evaluate_regression_model
+from carprice.util.feature_plan import FeaturePlan
+from carprice.util.stage_cache import StageCache
+from carprice.util.warm_start import get_warm_start_config, get_incumbent_model_path, continue_incumbent_model, \
+    WARM_START_ENABLED_KEY, WARM_START_N_ESTIMATORS_KEY, DEFAULT_WARM_START_N_ESTIMATORS
+from carprice.util.search_scheduler import search_models
+from carprice.util.job_runner import track_stage
+from carprice.util.stage_profiler import profile_span, record_rows
+from carprice.constant import MODEL_TRAINER_ARTIFACT_DIR, TARGET_COLUMN_KEY
+import pandas as pd
 
 
 class CarPriceModel:
-    def __init__(self, preprocessing_object, trained_model_object):
+    def __init__(self, preprocessing_object, trained_model_object, preprocessed_object_file_path: str = None):
         """
         TrainedModel constructor
         preprocessing_object: preprocessing_object
         trained_model_object: trained_model_object
+        preprocessed_object_file_path: file of the DataTransformation preprocessing object when preprocessing_object
+        is that one, so the transformed arrays of that run can be scored directly; None otherwise
         """
         self.preprocessing_object = preprocessing_object
         self.trained_model_object = trained_model_object
+        self.preprocessed_object_file_path = preprocessed_object_file_path
+        self.feature_plan = None
 
     def predict(self, X):
         """
@@ -28,6 +43,36 @@ class CarPriceModel:
         transformed_feature = self.preprocessing_object.transform(X)
         return self.trained_model_object.predict(transformed_feature)
 
+    def compile_feature_plan(self) -> bool:
+        """
+        Compiles the preprocessing object into a FeaturePlan used by predict_records.
+        The plan is only kept if it reproduces the preprocessing object exactly.
+        """
+        try:
+            feature_plan = FeaturePlan.compile(self.preprocessing_object)
+            self.feature_plan = feature_plan if feature_plan.verify(self.preprocessing_object) else None
+        except Exception as e:
+            logging.info(f"Preprocessing object could not be compiled, using transform instead: {e}")
+            self.feature_plan = None
+        return self.feature_plan is not None
+
+    def transform_records(self, records):
+        """
+        function accepts a list of raw input dicts and transforms them through the
+        compiled feature plan, falling back to preprocessing_object when no plan is available
+        """
+        feature_plan = getattr(self, "feature_plan", None)
+        if feature_plan is None:
+            return self.preprocessing_object.transform(pd.DataFrame.from_records(records))
+        return feature_plan.transform_records(records)
+
+    def predict_records(self, records):
+        """
+        function accepts a list of raw input dicts and predicts them through the
+        compiled feature plan, falling back to predict when no plan is available
+        """
+        return self.trained_model_object.predict(self.transform_records(records))
+
     def __repr__(self):
         return f"{type(self.trained_model_object).__name__}()"
 
@@ -37,58 +82,178 @@ class CarPriceModel:
 
 class ModelTrainer:
 
-    def __init__(self, model_trainer_config:ModelTrainerConfig, data_transformation_artifact: DataTransformationArtifact):
+    def __init__(self, model_trainer_config:ModelTrainerConfig, data_transformation_artifact: DataTransformationArtifact,
+                 stage_cache: StageCache = None, model_evaluation_file_path: str = None,
+                 data_ingestion_artifact: DataIngestionArtifact = None,
+                 data_validation_artifact: DataValidationArtifact = None):
+        """
+        model_evaluation_file_path: model_evaluation.yaml holding the current best model, the starting
+        point of warm-start retraining when it is enabled in model.yaml
+        data_ingestion_artifact, data_validation_artifact: raw data and schema a warm started model is trained on,
+        through the preprocessing object of the current best model
+        """
         try:
             logging.info(f"{'>>' * 30}Model trainer log started.{'<<' * 30} ")
             self.model_trainer_config = model_trainer_config
             self.data_transformation_artifact = data_transformation_artifact
+            self.data_ingestion_artifact = data_ingestion_artifact
+            self.data_validation_artifact = data_validation_artifact
+            self.stage_cache = stage_cache
+            self.model_evaluation_file_path = model_evaluation_file_path
+            self.warm_start_config = get_warm_start_config(self.model_trainer_config.model_config_file_path)
         except Exception as e:
             raise CarException(e, sys) from e
 
-    def initiate_model_trainer(self)->ModelTrainerArtifact:
+    def get_cache_key(self) -> str:
         try:
-            logging.info(f"Loading transformed training dataset")
-            transformed_train_file_path = self.data_transformation_artifact.transformed_train_file_path
-            train_array = load_numpy_array_data(file_path=transformed_train_file_path)
+            file_paths = [self.data_transformation_artifact.transformed_train_file_path,
+                          get_target_array_file_path(self.data_transformation_artifact.transformed_train_file_path),
+                          self.data_transformation_artifact.transformed_test_file_path,
+                          get_target_array_file_path(self.data_transformation_artifact.transformed_test_file_path),
+                          self.data_transformation_artifact.preprocessed_object_file_path,
+                          self.model_trainer_config.model_config_file_path]
+            settings = {"base_accuracy": self.model_trainer_config.base_accuracy}
+            if self.warm_start_config.get(WARM_START_ENABLED_KEY):
+                settings["incumbent_model_path"] = get_incumbent_model_path(self.model_evaluation_file_path)
+            code_modules = [__name__, "carprice", "carprice.entity.model_factory", "carprice.util.feature_plan",
+                            "carprice.util.search_scheduler", "carprice.util.warm_start"]
+            return self.stage_cache.get_key(stage=MODEL_TRAINER_ARTIFACT_DIR, code_modules=code_modules,
+                                            file_paths=file_paths, settings=settings)
+        except Exception as e:
+            raise CarException(e, sys) from e
 
-            logging.info(f"Loading transformed testing dataset")
-            transformed_test_file_path = self.data_transformation_artifact.transformed_test_file_path
-            test_array = load_numpy_array_data(file_path=transformed_test_file_path)
+    def lookup_cached_artifact(self, cache_key: str = None):
+        """
+        Returns the artifact of an earlier run with the same inputs, None if there is none.
+        cache_key: key from get_cache_key when it was already computed
+        """
+        try:
+            if self.stage_cache is None:
+                return None
+            cache_key = self.get_cache_key() if cache_key is None else cache_key
+            return self.stage_cache.lookup(stage=MODEL_TRAINER_ARTIFACT_DIR, key=cache_key)
+        except Exception as e:
+            raise CarException(e, sys) from e
 
-            logging.info(f"Splitting training and testing input and target feature")
-            x_train,y_train,x_test,y_test = train_array[:,:-1],train_array[:,-1],test_array[:,:-1],test_array[:,-1]
-            
+    def get_raw_data(self):
+        """
+        Loads the ingested train and test data, split into features and target.
+        """
+        try:
+            schema_file_path = self.data_validation_artifact.schema_file_path
+            target_column_name = read_yaml_file(file_path=schema_file_path)[TARGET_COLUMN_KEY]
+            datasets = []
+            for file_path in (self.data_ingestion_artifact.train_file_path, self.data_ingestion_artifact.test_file_path):
+                dataframe = load_data(file_path=file_path, schema_file_path=schema_file_path)
+                datasets.append((dataframe.drop(columns=[target_column_name]), dataframe[target_column_name].to_numpy()))
+            return datasets
+        except Exception as e:
+            raise CarException(e, sys) from e
 
-            logging.info(f"Extracting model config file path")
-            model_config_file_path = self.model_trainer_config.model_config_file_path
+    def get_warm_started_model(self):
+        """
+        Continues training the current best model on the new training data,
+        transformed by the current best model's own preprocessing object.
+        Returns None when warm start is disabled or there is no usable incumbent,
+        else the incumbent preprocessing object, the warm started estimator and
+        the train and test arrays it transformed.
+        """
+        try:
+            if not self.warm_start_config.get(WARM_START_ENABLED_KEY):
+                return None
+            if self.data_ingestion_artifact is None or self.data_validation_artifact is None:
+                logging.info("No raw data given to warm start from, training from scratch")
+                return None
+            incumbent_model_path = get_incumbent_model_path(self.model_evaluation_file_path)
+            if incumbent_model_path is None:
+                logging.info("No incumbent model found, training from scratch")
+                return None
+            logging.info(f"Warm starting from incumbent model: [{incumbent_model_path}]")
+            incumbent_model = load_object(file_path=incumbent_model_path)
+            (x_train, y_train), (x_test, y_test) = self.get_raw_data()
+            n_estimators = self.warm_start_config.get(WARM_START_N_ESTIMATORS_KEY, DEFAULT_WARM_START_N_ESTIMATORS)
+            model = continue_incumbent_model(incumbent_model, x_train, y_train, n_estimators=n_estimators)
+            preprocessing_obj = incumbent_model.preprocessing_object
+            return (preprocessing_obj, model, preprocessing_obj.transform(x_train), y_train,
+                    preprocessing_obj.transform(x_test), y_test)
+        except Exception as e:
+            raise CarException(e, sys) from e
 
-            logging.info(f"Initializing model factory class using above model config file: {model_config_file_path}")
-            model_factory = ModelFactory(model_config_path=model_config_file_path)
-            
+    @track_stage(MODEL_TRAINER_ARTIFACT_DIR)
+    def initiate_model_trainer(self, search_results: list = None, cache_key: str = None)->ModelTrainerArtifact:
+        """
+        search_results: SearchResult of every model.yaml module_N entry when the searches already ran,
+        e.g. side by side as training DAG nodes; the searches run here otherwise
+        cache_key: key from get_cache_key when it was already computed, hashing the arrays is not free
+        """
+        try:
+            if self.stage_cache is None:
+                cache_key = None
+            elif cache_key is None:
+                cache_key = self.get_cache_key()
+            if cache_key is not None:
+                cached_artifact = self.stage_cache.lookup(stage=MODEL_TRAINER_ARTIFACT_DIR, key=cache_key)
+                if cached_artifact is not None:
+                    return cached_artifact
+
+            logging.info(f"Memory-mapping transformed training dataset")
+            transformed_train_file_path = self.data_transformation_artifact.transformed_train_file_path
+            x_train = load_numpy_array(file_path=transformed_train_file_path, mmap_mode='r')
+            y_train = load_numpy_array(file_path=get_target_array_file_path(transformed_train_file_path), mmap_mode='r')
+
+            logging.info(f"Memory-mapping transformed testing dataset")
+            transformed_test_file_path = self.data_transformation_artifact.transformed_test_file_path
+            x_test = load_numpy_array(file_path=transformed_test_file_path, mmap_mode='r')
+            y_test = load_numpy_array(file_path=get_target_array_file_path(transformed_test_file_path), mmap_mode='r')
             
+
             base_accuracy = self.model_trainer_config.base_accuracy
             logging.info(f"Expected accuracy: {base_accuracy}")
 
-            logging.info(f"Initiating operation model selecttion")
-            best_model = model_factory.get_best_model(X=x_train,y=y_train,base_accuracy=base_accuracy)
-            
-            logging.info(f"Best model found on training dataset: {best_model}")
-            
-            logging.info(f"Extracting trained model list.")
-            grid_searched_best_model_list:List[GridSearchedBestModel]=model_factory.grid_searched_best_model_list
-            
-            model_list = [model.best_model for model in grid_searched_best_model_list ]
-            logging.info(f"Evaluation all trained model on training and testing dataset both")
-            metric_info:MetricInfoArtifact = evaluate_regression_model(model_list=model_list,X_train=x_train,y_train=y_train,X_test=x_test,y_test=y_test,base_accuracy=base_accuracy)
+            preprocessing_obj=  load_object(file_path=self.data_transformation_artifact.preprocessed_object_file_path)
+            record_rows(len(y_train))
+
+            metric_info = None
+            preprocessed_object_file_path = self.data_transformation_artifact.preprocessed_object_file_path
+            with profile_span("warm_start"):
+                warm_start = self.get_warm_started_model()
+            if warm_start is not None:
+                warm_preprocessing_obj, warm_started_model, warm_x_train, warm_y_train, warm_x_test, warm_y_test = warm_start
+                logging.info(f"Evaluating warm started model on training and testing dataset both")
+                metric_info = evaluate_regression_model(model_list=[warm_started_model],X_train=warm_x_train,y_train=warm_y_train,X_test=warm_x_test,y_test=warm_y_test,base_accuracy=base_accuracy)
+                if metric_info is None:
+                    logging.info(f"Warm started model is below the expected accuracy, running full model selection")
+                else:
+                    # the warm started trees split on the incumbent's features, so it is exported with its preprocessing
+                    preprocessing_obj = warm_preprocessing_obj
+                    preprocessed_object_file_path = None
+
+            if metric_info is None:
+                logging.info(f"Extracting model config file path")
+                model_config_file_path = self.model_trainer_config.model_config_file_path
+
+                if search_results is None:
+                    logging.info(f"Initiating operation model selecttion using model config file: {model_config_file_path}")
+                    with profile_span("model_selection"):
+                        search_results = search_models(model_config_file_path=model_config_file_path, X=x_train, y=y_train)
+
+                model_list = [search_result.best_model for search_result in search_results]
+                logging.info(f"Evaluation all trained model on training and testing dataset both")
+                with profile_span("model_scoring"):
+                    metric_info:MetricInfoArtifact = evaluate_regression_model(model_list=model_list,X_train=x_train,y_train=y_train,X_test=x_test,y_test=y_test,base_accuracy=base_accuracy)
+                if metric_info is None:
+                    raise Exception(f"None of the searched models reached the expected accuracy: {base_accuracy}")
 
             logging.info(f"Best found model on both training and testing dataset.")
             
-            preprocessing_obj=  load_object(file_path=self.data_transformation_artifact.preprocessed_object_file_path)
             model_object = metric_info.model_object
 
 
             trained_model_file_path=self.model_trainer_config.trained_model_file_path
-            carprice_model = CarPriceModel(preprocessing_object=preprocessing_obj,trained_model_object=model_object)
+            carprice_model = CarPriceModel(preprocessing_object=preprocessing_obj,trained_model_object=model_object,
+                                           preprocessed_object_file_path=preprocessed_object_file_path)
+            logging.info(f"Compiling preprocessing object into feature plan")
+            carprice_model.compile_feature_plan()
             logging.info(f"Saving model at path: {trained_model_file_path}")
             save_object(file_path=trained_model_file_path,obj=carprice_model)
 
@@ -104,6 +269,8 @@ class ModelTrainer:
             )
 
             logging.info(f"Model Trainer Artifact: {model_trainer_artifact}")
+            if cache_key is not None:
+                self.stage_cache.store(stage=MODEL_TRAINER_ARTIFACT_DIR, key=cache_key, artifact=model_trainer_artifact)
             return model_trainer_artifact
         except Exception as e:
             raise CarException(e, sys) from e
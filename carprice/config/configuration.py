@@ -10,6 +10,9 @@ from carprice.entity.config_entity import (
     TrainingPipelineConfig,
 )
 from carprice.util.util import read_yaml_file
+from carprice.util.stage_cache import StageCache
+from carprice.util.experiment_store import ExperimentStore
+from carprice.util.model_registry import ModelRegistry
 from carprice.logger import logging
 from carprice.constant import *
 from carprice.exception import CarException
@@ -249,4 +252,126 @@ class ConfigurationManager:
             logging.info(f"Model Pusher Config: {model_pusher_config}")
             return model_pusher_config
         except Exception as e:
-            raise CarException(e, sys) from e
\ No newline at end of file
+            raise CarException(e, sys) from e
+
+    def get_download_cache_dir(self) -> str:
+        """
+        Retrieves the directory of downloaded S3 objects shared by all training runs.
+
+        Returns:
+            str: Path of the download cache under the artifact directory.
+        """
+        try:
+            download_cache_dir = os.path.join(self.pipeline_config.artifact_dir, DOWNLOAD_CACHE_DIR_NAME)
+            logging.info(f"Download cache directory: {download_cache_dir}")
+            return download_cache_dir
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_transformation_chunk_size(self):
+        """
+        Retrieves the rows per chunk of the out-of-core data transformation.
+
+        Returns:
+            int: Rows per chunk, None when the data is transformed in memory.
+        """
+        try:
+            chunk_size = self.config_data[DATA_TRANSFORMATION_CONFIG_KEY].get(DATA_TRANSFORMATION_CHUNK_SIZE_KEY)
+            return None if not chunk_size else int(chunk_size)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_drift_sample_size(self):
+        """
+        Retrieves the rows sampled from each dataset for drift detection.
+
+        Returns:
+            int: Rows per dataset, None when every row is profiled.
+        """
+        try:
+            sample_size = self.config_data[DATA_VALIDATION_CONFIG_KEY].get(DATA_VALIDATION_DRIFT_SAMPLE_SIZE_KEY)
+            return None if not sample_size else int(sample_size)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_reference_profile_file_path(self):
+        """
+        Retrieves the data profile exported with the serving model, the baseline
+        the ingested data is checked for drift against.
+
+        Returns:
+            str: Path of the profile next to the newest exported model, None if there is none yet.
+        """
+        try:
+            model_export_dir = os.path.join(ROOT_DIR, self.config_data[MODEL_PUSHER_CONFIG_KEY][
+                MODEL_PUSHER_MODEL_EXPORT_DIR_KEY])
+            model_path = ModelRegistry(model_dir=model_export_dir).get_latest_model_path()
+            if model_path is None:
+                return None
+            reference_profile_file_path = os.path.join(os.path.dirname(model_path),
+                                                       DATA_VALIDATION_REFERENCE_PROFILE_FILE_NAME)
+            if not os.path.exists(reference_profile_file_path):
+                return None
+            logging.info(f"Reference profile: {reference_profile_file_path}")
+            return reference_profile_file_path
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_dataset_dir(self):
+        """
+        Retrieves the persistent dataset incremental ingestion appends new listings to.
+
+        Returns:
+            str: Path of the dataset under the artifact directory, None when ingestion re-splits every download.
+        """
+        try:
+            dataset_dir_name = self.config_data[DATA_INGESTION_CONFIG_KEY].get(DATA_INGESTION_DATASET_DIR_KEY)
+            if not dataset_dir_name:
+                return None
+            dataset_dir = os.path.join(self.pipeline_config.artifact_dir, dataset_dir_name)
+            logging.info(f"Incremental dataset directory: {dataset_dir}")
+            return dataset_dir
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_stage_metrics_file_path(self) -> str:
+        """
+        Retrieves the file the stage timings, memory and throughput of this run are written to.
+
+        Returns:
+            str: Path of the run's metrics file under the artifact directory.
+        """
+        try:
+            stage_metrics_file_path = os.path.join(self.pipeline_config.artifact_dir, STAGE_METRICS_DIR_NAME,
+                                                   f"{self.timestamp}.jsonl")
+            logging.info(f"Stage metrics file: {stage_metrics_file_path}")
+            return stage_metrics_file_path
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_experiment_store(self) -> ExperimentStore:
+        """
+        Retrieves the store the experiments of all runs are recorded in.
+
+        Returns:
+            ExperimentStore: Store under the artifact directory's experiment folder.
+        """
+        try:
+            experiment_dir = os.path.join(self.pipeline_config.artifact_dir, EXPERIMENT_DIR_NAME)
+            return ExperimentStore(db_file_path=os.path.join(experiment_dir, EXPERIMENT_DB_FILE_NAME))
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_stage_cache(self) -> StageCache:
+        """
+        Retrieves the cache of stage artifacts shared by all training runs.
+
+        Returns:
+            StageCache: Content-addressed cache stored under the artifact directory.
+        """
+        try:
+            stage_cache_dir = os.path.join(self.pipeline_config.artifact_dir, STAGE_CACHE_DIR_NAME)
+            logging.info(f"Stage cache directory: {stage_cache_dir}")
+            return StageCache(cache_dir=stage_cache_dir)
+        except Exception as e:
+            raise CarException(e, sys) from e
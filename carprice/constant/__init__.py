@@ -17,6 +17,8 @@ ROOT_DIRECTORY = os.getcwd()  # Current working directory
 CONFIG_DIRECTORY = "config"
 CONFIG_FILE_NAME = "config.yaml"
 CONFIG_FILE_PATH = os.path.join(ROOT_DIRECTORY, CONFIG_DIRECTORY, CONFIG_FILE_NAME)
+SCHEMA_FILE_NAME = "schema.yaml"
+SCHEMA_FILE_PATH = os.path.join(ROOT_DIRECTORY, CONFIG_DIRECTORY, SCHEMA_FILE_NAME)
 
 CURRENT_TIMESTAMP = generate_timestamp()
 
@@ -37,6 +39,11 @@ DATA_INGESTION_RAW_DATA_DIR_KEY = "raw_data_dir"
 DATA_INGESTION_INGESTED_DIR_KEY = "ingested_dir"
 DATA_INGESTION_TRAIN_DIR_KEY = "ingested_train_dir"
 DATA_INGESTION_TEST_DIR_KEY = "ingested_test_dir"
+DATA_INGESTION_DATASET_DIR_KEY = "dataset_dir"
+PARQUET_FILE_EXTENSION = ".parquet"
+CSV_FILE_EXTENSION = ".csv"
+INGESTED_FILE_EXTENSION = PARQUET_FILE_EXTENSION  # set to CSV_FILE_EXTENSION for CSV train/test files
+DATA_INGESTION_QUARANTINE_DIR_NAME = "quarantine"
 
 
 # Data Validation Configuration Keys
@@ -46,6 +53,9 @@ DATA_VALIDATION_SCHEMA_DIR_KEY = "schema_dir"
 DATA_VALIDATION_ARTIFACT_DIR = "data_validation"
 DATA_VALIDATION_REPORT_FILE_NAME_KEY = "report_file_name"
 DATA_VALIDATION_REPORT_PAGE_FILE_NAME_KEY = "report_page_file_name"
+DATA_VALIDATION_REFERENCE_PROFILE_FILE_NAME = "reference_profile.json"
+DATA_VALIDATION_DRIFT_SAMPLE_SIZE_KEY = "drift_sample_size"
+DRIFT_SAMPLE_RANDOM_STATE = 42
 
 
 # Data Transformation Configuration Keys
@@ -56,6 +66,9 @@ DATA_TRANSFORMATION_TRAIN_DIR_KEY = "transformed_train_dir"
 DATA_TRANSFORMATION_TEST_DIR_KEY = "transformed_test_dir"
 DATA_TRANSFORMATION_PREPROCESSING_DIR_KEY = "preprocessing_dir"
 DATA_TRANSFORMATION_PREPROCESSED_FILE_NAME_KEY = "preprocessed_object_file_name"
+DATA_TRANSFORMATION_CHUNK_SIZE_KEY = "chunk_size"
+TRANSFORMED_ARRAY_FILE_EXTENSION = ".npy"
+TARGET_ARRAY_FILE_SUFFIX = "_target.npy"
 
 
 # Dataset Schema Keys
@@ -65,6 +78,12 @@ CATEGORICAL_COLUMNS_KEY = "categorical_columns"
 ONEHOT_COLUMNS_KEY = "onehot_columns"
 BINARY_COLUMNS_KEY = "binary_columns"
 TARGET_COLUMN_KEY = "target_column"
+SCHEMA_CONSTRAINTS_KEY = "constraints"
+SCHEMA_NULLABLE_COLUMNS_KEY = "nullable_columns"
+SCHEMA_MIN_KEY = "min"
+SCHEMA_MAX_KEY = "max"
+SCHEMA_ALLOWED_KEY = "allowed"
+SCHEMA_KEY_COLUMNS_KEY = "key_columns"
 
 
 # Model Training Configuration Keys
@@ -81,10 +100,12 @@ MODEL_TRAINER_MODEL_CONFIG_FILE_NAME_KEY = "model_config_file_name"
 MODEL_EVALUATION_CONFIG_KEY = "model_evaluation_config"
 MODEL_EVALUATION_FILE_NAME_KEY = "model_evaluation_file_name"
 MODEL_EVALUATION_ARTIFACT_DIR = "model_evaluation"
+MODEL_EVALUATION_SCORE_CACHE_DIR_NAME = "score_cache"
 
 
 # Model Pusher Configuration Keys
 MODEL_PUSHER_CONFIG_KEY = "model_pusher_config"
+MODEL_PUSHER_ARTIFACT_DIR = "model_pusher"
 MODEL_PUSHER_MODEL_EXPORT_DIR_KEY = "model_export_dir"
 
 
@@ -94,4 +115,29 @@ HISTORY_KEY = "history"
 MODEL_PATH_KEY = "model_path"
 
 EXPERIMENT_DIR_NAME = "experiment"
-EXPERIMENT_FILE_NAME = "experiment.csv"
\ No newline at end of file
+EXPERIMENT_FILE_NAME = "experiment.csv"
+EXPERIMENT_DB_FILE_NAME = "experiment.db"
+
+
+# Local cache of downloaded S3 objects, keyed by ETag
+DOWNLOAD_CACHE_DIR_NAME = "download_cache"
+
+
+# Stage Cache
+STAGE_CACHE_DIR_NAME = "stage_cache"
+
+
+# Per-run stage metrics, one <timestamp>.jsonl file per run
+STAGE_METRICS_DIR_NAME = "stage_metrics"
+
+
+# Training DAG
+DAG_STATE_DIR_NAME = "dag_state"
+DATA_DRIFT_STAGE_NAME = "data_drift"
+MODEL_SEARCH_STAGE_NAME = "model_search"
+
+
+# Logging
+LOG_DIRECTORY_NAME = "logs"
+LOG_FILE_MAX_BYTES = 50 * 2 ** 20
+LOG_FILE_BACKUP_COUNT = 5
@@ -0,0 +1,254 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import pandas as pd
+from carprice.constant import CURRENT_TIMESTAMP, LOG_DIRECTORY_NAME, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUP_COUNT
+
+# inherited by job processes and pool workers, so their records carry the run they belong to
+LOG_RUN_ID_ENV = "CARPRICE_RUN_ID"
+LOG_LEVEL_ENV = "CARPRICE_LOG_LEVEL"
+# per module levels, e.g. "model_trainer=WARNING,sklearn=ERROR"
+LOG_MODULE_LEVELS_ENV = "CARPRICE_LOG_MODULE_LEVELS"
+
+
+
+def get_log_file_path() -> str:
+    """
+    Returns the log file of this process. Every process writes and rotates
+    its own file: gunicorn workers started in the same second and forked
+    DAG workers would otherwise rename a shared file under each other.
+    """
+    return os.path.join(LOG_DIRECTORY_NAME, f"log_{CURRENT_TIMESTAMP}_{os.getpid()}.log")
+
+
+# attributes every LogRecord has; anything else was passed through `extra` and is written as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_local = threading.local()
+_run_id = os.environ.get(LOG_RUN_ID_ENV)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON line, with the run and stage it was logged
+    in and any `extra` fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        log_record = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            # records of the bare logging.info calls come from the root logger, their module is the component
+            "component": record.module if record.name == "root" else record.name,
+            "file_name": record.filename,
+            "line_number": record.lineno,
+            "function_name": record.funcName,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                log_record[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log_record["exception"] = record.exc_text
+        return json.dumps(log_record, default=str)
+
+
+class LogContextFilter(logging.Filter):
+    """
+    Drops records below the level of their module and adds the run id and
+    the current stage to the others.
+
+    It runs before a record is queued, in the thread that logs it, so the
+    stage is the one that thread is in.
+    """
+
+    def __init__(self, level: int = logging.INFO, module_levels: dict = None) -> None:
+        super().__init__()
+        self.level = level
+        self.module_levels = dict(module_levels or {})
+        self._level_cache = {}
+
+    def get_level(self, record: logging.LogRecord) -> int:
+        key = (record.name, record.module)
+        level = self._level_cache.get(key)
+        if level is None:
+            # the module of a root logger record, else the closest configured parent of its logger name
+            if record.name == "root":
+                level = self.module_levels.get(record.module, self.level)
+            else:
+                level = self.level
+                name = record.name
+                while name:
+                    if name in self.module_levels:
+                        level = self.module_levels[name]
+                        break
+                    name = name.rpartition(".")[0]
+            self._level_cache[key] = level
+        return level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.get_level(record):
+            return False
+        context = getattr(_local, "context", None)
+        record.run_id = getattr(record, "run_id", None) or _run_id
+        if context:
+            stage, stage_start_time = context[-1]
+            record.stage = getattr(record, "stage", None) or stage
+            record.stage_seconds = round(time.perf_counter() - stage_start_time, 3)
+        return True
+
+
+class _QueueHandler(QueueHandler):
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # merge the message and render the traceback here, the listener thread only serializes
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = JsonFormatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(levels: str) -> dict:
+    """
+    Parses per module levels written as `module=LEVEL,module=LEVEL`.
+    """
+    module_levels = {}
+    for item in (levels or "").split(","):
+        if "=" in item:
+            module, level = item.split("=", 1)
+            module_levels[module.strip()] = logging.getLevelName(level.strip().upper())
+    return module_levels
+
+
+_log_queue = queue.SimpleQueue()
+_queue_handler = _QueueHandler(_log_queue)
+_context_filter = LogContextFilter(level=logging.getLevelName(os.environ.get(LOG_LEVEL_ENV, "INFO").upper()),
+                                   module_levels=parse_levels(os.environ.get(LOG_MODULE_LEVELS_ENV)))
+_queue_handler.addFilter(_context_filter)
+_file_handler = None
+_listener = None
+
+
+def set_log_levels(level=None, module_levels: dict = None) -> None:
+    """
+    Sets the default level and the per module levels, e.g.
+    `{"model_trainer": "WARNING", "sklearn": "ERROR"}`. Modules are matched
+    on the file name of records logged through `logging.info` and friends,
+    and on the logger name and its parents otherwise.
+    """
+    if level is not None:
+        _context_filter.level = logging.getLevelName(str(level).upper()) if isinstance(level, str) else level
+    if module_levels is not None:
+        _context_filter.module_levels = {module: logging.getLevelName(str(value).upper()) if isinstance(value, str)
+                                         else value for module, value in module_levels.items()}
+    _context_filter._level_cache = {}
+    logging.getLogger().setLevel(min([_context_filter.level] + list(_context_filter.module_levels.values())))
+
+
+def set_run_id(run_id: str) -> None:
+    """
+    Tags the records of this process and of the processes it starts with `run_id`.
+    """
+    global _run_id
+    _run_id = run_id
+    os.environ[LOG_RUN_ID_ENV] = run_id
+
+
+@contextmanager
+def log_context(stage: str):
+    """
+    Tags the records logged by this thread inside the block with `stage` and
+    the seconds elapsed since the block started.
+    """
+    if not hasattr(_local, "context"):
+        _local.context = []
+    _local.context.append((stage, time.perf_counter()))
+    try:
+        yield
+    finally:
+        _local.context.pop()
+
+
+def _open_file_handler() -> None:
+    global _file_handler
+    _file_handler = RotatingFileHandler(get_log_file_path(), maxBytes=LOG_FILE_MAX_BYTES,
+                                        backupCount=LOG_FILE_BACKUP_COUNT, encoding="utf-8", delay=True)
+    _file_handler.setFormatter(JsonFormatter())
+
+
+def _start_listener() -> None:
+    global _listener
+    _listener = QueueListener(_log_queue, _file_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener_in_child() -> None:
+    global _log_queue
+    # the listener thread does not survive a fork, and records queued by the parent are the parent's to write
+    _log_queue = queue.SimpleQueue()
+    _queue_handler.queue = _log_queue
+    # the child gets its own file, the parent's stream is only closed in this process
+    _file_handler.close()
+    _open_file_handler()
+    _start_listener()
+    # pool workers leave through os._exit, which skips atexit but runs multiprocessing finalizers
+    from multiprocessing.util import Finalize
+    Finalize(None, _stop_listener, exitpriority=0)
+
+
+def _stop_listener() -> None:
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def setup_logging() -> None:
+    """
+    Routes the records of the root logger through a queue to a size-rotated
+    JSON lines file of this process, so logging calls return without waiting
+    on disk writes.
+    """
+    if _file_handler is not None:
+        return
+    os.makedirs(LOG_DIRECTORY_NAME, exist_ok=True)
+    _open_file_handler()
+    root_logger = logging.getLogger()
+    root_logger.addHandler(_queue_handler)
+    set_log_levels()
+    _start_listener()
+    atexit.register(_stop_listener)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_listener_in_child)
+
+
+def get_log_dataframe(file_path: str) -> pd.DataFrame:
+    """
+    Loads a log file, JSON lines or the older `^;` separated text format,
+    into a DataFrame with one row per record.
+    """
+    from carprice.util.log_viewer import parse_log_line
+
+    with open(file_path, "r", encoding="utf-8", errors="replace") as log_file:
+        records = [parse_log_line(line.rstrip("\n")) for line in log_file if line.strip()]
+    log_df = pd.DataFrame.from_records(records)
+    if "timestamp" in log_df and "message" in log_df:
+        log_df["log_message"] = log_df["timestamp"].astype(str) + ":" + log_df["message"].astype(str)
+    return log_df
+
+
+setup_logging()
@@ -0,0 +1,123 @@
+import io
+import json
+import sys
+from itertools import islice
+import pandas as pd
+from carprice.exception import CarException
+from carprice.logger import logging
+from carprice.constant import *
+from carprice.util.util import read_yaml_file
+
+PREDICTED_PRICE_COLUMN = "predicted_price"
+DEFAULT_CHUNK_SIZE = 10000
+
+
+class BatchPredictor:
+    """
+    Scores large batches of car listings chunk by chunk.
+
+    Input rows are validated against `schema.yaml`, cast to the schema dtypes
+    with one `astype` per chunk and passed to the model's vectorized
+    `predict`. Every method yields results lazily so memory stays bounded by
+    `chunk_size` regardless of the input size.
+    """
+
+    def __init__(self, model_registry, schema_file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        """
+        Args:
+            model_registry: Object exposing `get_model()`, e.g. `ModelRegistry`.
+            schema_file_path (str): Path to the dataset schema file.
+            chunk_size (int): Number of rows scored per model call.
+        """
+        try:
+            self.model_registry = model_registry
+            self.chunk_size = chunk_size
+            schema = read_yaml_file(file_path=schema_file_path)
+            target_column = schema[TARGET_COLUMN_KEY]
+            self.input_dtypes = {column: dtype for column, dtype in schema[DATASET_SCHEMA_COLUMNS_KEY].items()
+                                 if column != target_column}
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def validate_chunk(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Checks that every schema column is present and casts the chunk to the
+        schema dtypes. Extra columns are dropped.
+        """
+        missing_columns = [column for column in self.input_dtypes if column not in chunk.columns]
+        if len(missing_columns) > 0:
+            raise ValueError(f"Missing columns: {missing_columns}")
+        if chunk[list(self.input_dtypes)].isnull().values.any():
+            raise ValueError("Input contains empty values")
+        return chunk[list(self.input_dtypes)].astype(self.input_dtypes)
+
+    def iter_record_chunks(self, records):
+        """
+        Splits an iterable of dicts (e.g. a parsed JSON array) into DataFrame chunks.
+        """
+        records = iter(records)
+        while True:
+            batch = list(islice(records, self.chunk_size))
+            if len(batch) == 0:
+                return
+            yield pd.DataFrame.from_records(batch)
+
+    def iter_ndjson_chunks(self, lines):
+        """
+        Splits an iterable of newline-delimited JSON lines into DataFrame chunks.
+        """
+        records = (json.loads(line) for line in lines if line.strip())
+        yield from self.iter_record_chunks(records)
+
+    def iter_csv_chunks(self, file_obj):
+        """
+        Reads a CSV file object in chunks of `chunk_size` rows.
+        """
+        yield from pd.read_csv(file_obj, chunksize=self.chunk_size)
+
+    def predict_chunks(self, chunks):
+        """
+        Validates and scores each chunk, yielding the validated input with a
+        `predicted_price` column appended.
+        """
+        try:
+            model = self.model_registry.get_model()
+            if model is None:
+                raise Exception("No trained model available for prediction")
+            scored_rows = 0
+            for chunk in chunks:
+                input_df = self.validate_chunk(chunk)
+                input_df[PREDICTED_PRICE_COLUMN] = model.predict(input_df).round(2)
+                scored_rows += len(input_df)
+                yield input_df
+            logging.info(f"Batch prediction completed for [{scored_rows}] rows")
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def predict(self, X: pd.DataFrame) -> pd.DataFrame:
+        """
+        Scores a DataFrame in chunks and returns a single result DataFrame.
+        """
+        chunks = (X.iloc[start:start + self.chunk_size] for start in range(0, len(X), self.chunk_size))
+        results = list(self.predict_chunks(chunks))
+        if len(results) == 0:
+            return pd.DataFrame(columns=list(self.input_dtypes) + [PREDICTED_PRICE_COLUMN])
+        return pd.concat(results, ignore_index=True)
+
+
+def to_ndjson(result_chunks):
+    """
+    Serializes scored chunks as newline-delimited JSON text blocks.
+    """
+    for chunk in result_chunks:
+        yield chunk.to_json(orient="records", lines=True).rstrip("\n") + "\n"
+
+
+def to_csv(result_chunks):
+    """
+    Serializes scored chunks as CSV text blocks, writing the header once.
+    """
+    for chunk_number, chunk in enumerate(result_chunks):
+        buffer = io.StringIO()
+        chunk.to_csv(buffer, index=False, header=chunk_number == 0)
+        yield buffer.getvalue()
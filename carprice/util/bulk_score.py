@@ -0,0 +1,169 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from carprice.exception import CarException
+from carprice.logger import logging
+from carprice.constant import PARQUET_FILE_EXTENSION, CSV_FILE_EXTENSION
+from carprice.util.util import load_object, iter_dataframe_chunks
+from carprice.util.model_registry import ModelRegistry
+from carprice.util.batch_predictor import BatchPredictor, PREDICTED_PRICE_COLUMN, DEFAULT_CHUNK_SIZE
+
+DEFAULT_SCHEMA_FILE_PATH = os.path.join("config", "schema.yaml")
+DEFAULT_MODEL_DIR = "saved_models"
+
+# per-process state, populated once by _init_worker
+_worker_model = None
+_worker_predictor = None
+
+
+def _init_worker(model_file_path: str, schema_file_path: str) -> None:
+    """
+    Loads the model once per worker process. Tree models are pinned to a
+    single thread so that throughput scales with the number of processes.
+    """
+    global _worker_model, _worker_predictor
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    _worker_model = load_object(file_path=model_file_path)
+    trained_model = getattr(_worker_model, "trained_model_object", None)
+    if trained_model is not None and "n_jobs" in trained_model.get_params():
+        trained_model.set_params(n_jobs=1)
+    # only validate_chunk is used, the model itself is held by the worker
+    _worker_predictor = BatchPredictor(model_registry=None, schema_file_path=schema_file_path)
+
+
+def _score_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    input_df = _worker_predictor.validate_chunk(chunk)
+    input_df[PREDICTED_PRICE_COLUMN] = _worker_model.predict(input_df).round(2)
+    return input_df
+
+
+class ScoreWriter:
+    """
+    Writes scored chunks in order to a single CSV/Parquet file, or one part
+    file per chunk when `shard` is set.
+    """
+
+    def __init__(self, output_path: str, shard: bool = False) -> None:
+        self.output_path = output_path
+        self.shard = shard
+        self.is_parquet = output_path.endswith(PARQUET_FILE_EXTENSION) or (
+            shard and not output_path.endswith(CSV_FILE_EXTENSION))
+        self._parquet_writer = None
+        self._chunk_number = 0
+        if shard:
+            os.makedirs(output_path, exist_ok=True)
+        elif os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self.shard:
+            part_extension = PARQUET_FILE_EXTENSION if self.is_parquet else CSV_FILE_EXTENSION
+            part_file_path = os.path.join(self.output_path, f"part-{self._chunk_number:05d}{part_extension}")
+            if self.is_parquet:
+                chunk.to_parquet(part_file_path, index=False)
+            else:
+                chunk.to_csv(part_file_path, index=False)
+        elif self.is_parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.output_path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            chunk.to_csv(self.output_path, index=False, mode="w" if self._chunk_number == 0 else "a",
+                         header=self._chunk_number == 0)
+        self._chunk_number += 1
+
+    def close(self) -> None:
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def score_file(model_file_path: str, input_file_path: str, output_path: str,
+               schema_file_path: str = DEFAULT_SCHEMA_FILE_PATH, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               workers: int = None, shard: bool = False) -> int:
+    """
+    Scores `input_file_path` with the model at `model_file_path` on a process
+    pool and writes the results to `output_path`.
+
+    Args:
+        model_file_path (str): Path to a saved `CarPriceModel` pickle.
+        input_file_path (str): CSV or Parquet file to score.
+        output_path (str): Output CSV/Parquet file, or directory when `shard` is set.
+        schema_file_path (str): Path to the dataset schema file.
+        chunk_size (int): Rows per chunk handed to a worker.
+        workers (int): Number of worker processes, defaults to the CPU count.
+        shard (bool): Write one part file per chunk instead of a single file.
+
+    Returns:
+        int: Number of rows scored.
+    """
+    try:
+        workers = workers or os.cpu_count() or 1
+        # a small window of in-flight chunks keeps every worker busy while bounding memory
+        max_pending = workers * 2
+        writer = ScoreWriter(output_path=output_path, shard=shard)
+        scored_rows = 0
+        start_time = time.perf_counter()
+        logging.info(f"Scoring [{input_file_path}] with model [{model_file_path}] on [{workers}] workers")
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_file_path, schema_file_path)) as executor:
+            pending = deque()
+            try:
+                for chunk in iter_dataframe_chunks(input_file_path, chunk_size):
+                    pending.append(executor.submit(_score_chunk, chunk))
+                    if len(pending) >= max_pending:
+                        result = pending.popleft().result()
+                        writer.write(result)
+                        scored_rows += len(result)
+                while pending:
+                    result = pending.popleft().result()
+                    writer.write(result)
+                    scored_rows += len(result)
+            finally:
+                writer.close()
+
+        elapsed = time.perf_counter() - start_time
+        rows_per_second = scored_rows / elapsed if elapsed > 0 else 0.0
+        logging.info(f"Scored [{scored_rows}] rows in [{elapsed:.2f}]s ({rows_per_second:.0f} rows/sec)")
+        print(f"Scored {scored_rows} rows in {elapsed:.2f}s ({rows_per_second:.0f} rows/sec) -> {output_path}")
+        return scored_rows
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def main(argv=None) -> None:
+    """
+    Entry point of the `carprice-score` console script.
+    """
+    parser = argparse.ArgumentParser(prog="carprice-score",
+                                     description="Score a CSV/Parquet file of cars with a saved model.")
+    parser.add_argument("input", help="CSV or Parquet file to score")
+    parser.add_argument("output", help="Output .csv/.parquet file, or directory with --shard")
+    parser.add_argument("--model", default=DEFAULT_MODEL_DIR,
+                        help="model.pkl file or saved models directory (newest model is used)")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_FILE_PATH, help="Dataset schema file")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--shard", action="store_true", help="Write one part file per chunk")
+    args = parser.parse_args(argv)
+
+    model_file_path = args.model
+    if os.path.isdir(model_file_path):
+        model_file_path = ModelRegistry(model_dir=model_file_path).get_latest_model_path()
+        if model_file_path is None:
+            parser.error(f"No saved model found in [{args.model}]")
+
+    score_file(model_file_path=model_file_path, input_file_path=args.input, output_path=args.output,
+               schema_file_path=args.schema, chunk_size=args.chunk_size, workers=args.workers,
+               shard=args.shard)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from carprice.exception import CarException
+from carprice.logger import logging
+from carprice.util.util import save_object, load_object
+
+NODE_STATE_FILE_EXTENSION = ".pkl"
+
+
+class DagNode:
+    """
+    One step of a pipeline DAG.
+
+    `func` is called as `func(context, **inputs)` where `inputs` maps each
+    declared input name to the output of the node producing it, and its
+    return value becomes the node's output. Dependencies are derived from
+    these names, so a node runs once every output it consumes is available.
+    `func` must be a module-level function, since it runs in a worker process.
+    """
+
+    def __init__(self, name: str, func, inputs: list = None, output: str = None, max_retries: int = None) -> None:
+        """
+        Args:
+            name (str): Unique node name.
+            func: Module-level function running the node.
+            inputs (list): Names of the outputs this node consumes, e.g. `data_ingestion_artifact`.
+            output (str): Name of the output this node produces, defaults to the node name.
+            max_retries (int): Retries of this node, defaults to the executor's setting.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs or [])
+        self.output = name if output is None else output
+        self.max_retries = max_retries
+
+    def __repr__(self):
+        return f"DagNode(name={self.name!r}, inputs={self.inputs!r}, output={self.output!r})"
+
+
+def _run_node(func, context, inputs: dict):
+    return func(context, **inputs)
+
+
+class DagExecutor:
+    """
+    Runs a DAG of `DagNode`s, starting every node whose inputs are ready on a
+    process pool so that independent nodes run concurrently.
+
+    A failed node is retried up to `max_retries` times; nodes depending on a
+    node that still fails are skipped, while unrelated nodes run to completion.
+    With `state_dir` set, every node output is saved there, and running the
+    same DAG again with the same `state_dir` reuses them, so only the failed
+    and skipped nodes run again.
+    """
+
+    def __init__(self, nodes: list, max_workers: int = None, max_retries: int = 1, state_dir: str = None,
+                 initializer=None, initargs: tuple = ()) -> None:
+        """
+        Args:
+            nodes (list): `DagNode`s of the DAG, in any order.
+            max_workers (int): Worker processes, defaults to one per node, at most one per core.
+            max_retries (int): Default retries of a failed node.
+            state_dir (str): Directory the node outputs are saved in.
+            initializer: Called in every worker process when it starts.
+            initargs (tuple): Arguments of `initializer`.
+
+        Raises:
+            CarException: When a name is duplicated, an input has no producer or the graph has a cycle.
+        """
+        try:
+            self.nodes = {}
+            producers = {}
+            for node in nodes:
+                if node.name in self.nodes:
+                    raise ValueError(f"Duplicate node name: [{node.name}]")
+                if node.output in producers:
+                    raise ValueError(f"Output [{node.output}] is produced by both [{producers[node.output]}] "
+                                     f"and [{node.name}]")
+                self.nodes[node.name] = node
+                producers[node.output] = node.name
+
+            self.dependencies = {}
+            for node in nodes:
+                missing_inputs = [name for name in node.inputs if name not in producers]
+                if missing_inputs:
+                    raise ValueError(f"Inputs {missing_inputs} of node [{node.name}] are not produced by any node")
+                self.dependencies[node.name] = {producers[name] for name in node.inputs}
+
+            self.producers = producers
+            self.order = self.get_topological_order()
+            self.max_workers = max_workers
+            self.max_retries = max_retries
+            self.state_dir = state_dir
+            self.initializer = initializer
+            self.initargs = initargs
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_topological_order(self) -> list:
+        """
+        Returns the node names so that every node comes after its dependencies.
+        """
+        remaining = {name: set(dependencies) for name, dependencies in self.dependencies.items()}
+        order = []
+        while remaining:
+            ready = sorted(name for name, dependencies in remaining.items() if not dependencies)
+            if not ready:
+                raise ValueError(f"The DAG has a cycle between nodes: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+                for dependencies in remaining.values():
+                    dependencies.discard(name)
+            order.extend(ready)
+        return order
+
+    def _get_state_file_path(self, name: str) -> str:
+        return os.path.join(self.state_dir, f"{name}{NODE_STATE_FILE_EXTENSION}")
+
+    def load_completed_outputs(self) -> dict:
+        """
+        Returns the outputs saved in `state_dir` by a previous run, by node name.
+        """
+        try:
+            completed = {}
+            if self.state_dir is None:
+                return completed
+            for name in self.order:
+                state_file_path = self._get_state_file_path(name)
+                if os.path.exists(state_file_path):
+                    completed[name] = load_object(file_path=state_file_path)
+            return completed
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # workers are started on demand, so this only caps how many nodes run at once
+        max_workers = self.max_workers or min(len(self.nodes), os.cpu_count() or 1)
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=self.initializer, initargs=self.initargs)
+
+    def run(self, context=None) -> dict:
+        """
+        Runs every node not completed yet.
+
+        Args:
+            context: Object passed as first argument to every node function, must be picklable.
+
+        Returns:
+            dict: Output of every node, by output name.
+
+        Raises:
+            CarException: Listing the nodes that failed after all retries and the nodes skipped because of them.
+        """
+        try:
+            completed = self.load_completed_outputs()
+            if completed:
+                logging.info(f"Reusing outputs of completed nodes: {sorted(completed)}")
+            attempts = {name: 0 for name in self.order}
+            failed = {}
+            skipped = set()
+            running = {}
+            pool = self._new_pool()
+            try:
+                while True:
+                    for name in self.order:
+                        if name in completed or name in failed or name in skipped or name in running.values():
+                            continue
+                        dependencies = self.dependencies[name]
+                        if dependencies & (set(failed) | skipped):
+                            logging.info(f"Skipping node [{name}], a dependency failed")
+                            skipped.add(name)
+                            continue
+                        if not dependencies.issubset(completed):
+                            continue
+                        node = self.nodes[name]
+                        inputs = {input_name: completed[self.producers[input_name]] for input_name in node.inputs}
+                        attempts[name] += 1
+                        logging.info(f"Starting node [{name}], attempt [{attempts[name]}]")
+                        future = pool.submit(_run_node, node.func, context, inputs)
+                        future.start_time = time.monotonic()
+                        running[future] = name
+
+                    if not running:
+                        break
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    is_pool_broken = False
+                    for future in done:
+                        name = running.pop(future)
+                        node = self.nodes[name]
+                        try:
+                            completed[name] = future.result()
+                        except Exception as e:
+                            is_pool_broken = is_pool_broken or isinstance(e, BrokenProcessPool)
+                            max_retries = self.max_retries if node.max_retries is None else node.max_retries
+                            if attempts[name] <= max_retries:
+                                logging.info(f"Node [{name}] failed, retrying: {e}")
+                            else:
+                                logging.info(f"Node [{name}] failed after [{attempts[name]}] attempts: {e}")
+                                failed[name] = e
+                            continue
+                        logging.info(f"Node [{name}] completed in [{time.monotonic() - future.start_time:.1f}] seconds")
+                        if self.state_dir is not None:
+                            save_object(file_path=self._get_state_file_path(name), obj=completed[name])
+
+                    if is_pool_broken:
+                        # a worker died, the pool fails every pending future; resubmit them on a new pool
+                        for future, name in list(running.items()):
+                            attempts[name] -= 1
+                            running.pop(future)
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        pool = self._new_pool()
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+            if failed:
+                errors = "; ".join(f"[{name}]: {error}" for name, error in failed.items())
+                raise RuntimeError(f"Nodes failed: {errors}. Skipped nodes: {sorted(skipped)}")
+            return {self.nodes[name].output: output for name, output in completed.items()}
+        except Exception as e:
+            raise CarException(e, sys) from e
@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from carprice.exception import CarException
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 2000
+MAX_CACHED_DIRECTORIES = 256
+
+
+class DirectoryIndex:
+    """
+    Sorted listings of directories, cached until the directory changes.
+
+    Adding, removing or renaming an entry updates the mtime of its directory,
+    so a listing is only read again when the mtime moved; every other request
+    costs a single `stat`.
+    """
+
+    def __init__(self, max_cached_directories: int = MAX_CACHED_DIRECTORIES) -> None:
+        """
+        Args:
+            max_cached_directories (int): Directory listings kept in memory.
+        """
+        self.max_cached_directories = max_cached_directories
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_entries(self, directory_path: str) -> list:
+        """
+        Returns the `(name, is_dir)` entries of a directory, directories first, then by name.
+        """
+        try:
+            mtime = os.stat(directory_path).st_mtime_ns
+            key = os.path.realpath(directory_path)
+            with self._lock:
+                cached = self._listings.get(key)
+                if cached is not None and cached[0] == mtime:
+                    self._listings.move_to_end(key)
+                    return cached[1]
+            with os.scandir(directory_path) as scanned:
+                entries = sorted(((entry.name, entry.is_dir()) for entry in scanned),
+                                 key=lambda entry: (not entry[1], entry[0]))
+            with self._lock:
+                self._listings[key] = (mtime, entries)
+                self._listings.move_to_end(key)
+                while len(self._listings) > self.max_cached_directories:
+                    self._listings.popitem(last=False)
+            return entries
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_page(self, directory_path: str, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE,
+                 name_filter=None) -> dict:
+        """
+        Reads one page of a directory listing.
+
+        Args:
+            directory_path (str): Directory to list.
+            page (int): 1-based page number.
+            page_size (int): Entries per page.
+            name_filter: Optional callable keeping the entry names it returns True for.
+
+        Returns:
+            dict: `entries` of the page and the paging fields of the listing.
+        """
+        try:
+            entries = self.get_entries(directory_path)
+            if name_filter is not None:
+                entries = [entry for entry in entries if name_filter(entry[0])]
+            page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+            n_pages = max(1, -(-len(entries) // page_size))
+            page = max(1, min(int(page), n_pages))
+            start = (page - 1) * page_size
+            return {"entries": entries[start:start + page_size], "page": page, "n_pages": n_pages,
+                    "page_size": page_size, "n_entries": len(entries)}
+        except Exception as e:
+            raise CarException(e, sys) from e
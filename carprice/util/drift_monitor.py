@@ -0,0 +1,296 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from carprice.exception import CarException
+from carprice.logger import logging
+from carprice.constant import DATA_VALIDATION_REFERENCE_PROFILE_FILE_NAME
+from carprice.util.drift_profile import DataProfile, compare_profiles
+
+DEFAULT_FLUSH_INTERVAL = 60.0
+# categorical columns with more reference categories than this are counted with a count-min sketch
+SKETCH_MIN_CATEGORIES = 50
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4
+MONITOR_STATE_FILE_PATTERN = "drift_monitor_*.json"
+
+
+class CountMinSketch:
+    """
+    Fixed size frequency sketch. Estimates never undercount and overcount by
+    at most `e / width` of the total with probability `1 - exp(-depth)`.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH, table: list = None) -> None:
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else [[0] * width for _ in range(depth)]
+
+    def _indices(self, value: str):
+        data = value.encode("utf-8")
+        # crc32 with a per-row seed is stable across processes, unlike hash()
+        return [zlib.crc32(data, seed) % self.width for seed in range(self.depth)]
+
+    def add(self, value: str, count: int = 1) -> None:
+        for row, index in zip(self.table, self._indices(value)):
+            row[index] += count
+
+    def estimate(self, value: str) -> int:
+        return min(row[index] for row, index in zip(self.table, self._indices(value)))
+
+    def merge(self, other) -> None:
+        for row, other_row in zip(self.table, other.table):
+            for index, count in enumerate(other_row):
+                row[index] += count
+
+
+class DriftMonitor:
+    """
+    In-process drift monitor of the records sent for prediction.
+
+    Every numerical field is counted into the bins of the reference profile
+    exported with the serving model and keeps running moments; categorical
+    fields are counted per reference category, high-cardinality ones such as
+    `car_name` in a count-min sketch. Memory therefore only depends on the
+    reference profile, and recording a record is a handful of bisects and
+    dict updates. Counters are reset when a new model is served, flushed to
+    `state_dir` by a background thread, and the drift report merges the
+    flushed state of every worker process.
+    """
+
+    def __init__(self, model_registry, state_dir: str, columns: list = None,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL) -> None:
+        """
+        Args:
+            model_registry (ModelRegistry): Registry of the serving model, the reference profile is read next to it.
+            state_dir (str): Directory the monitor state of each process is flushed to.
+            columns (list): Input fields to monitor, None for every column of the reference profile.
+            flush_interval (float): Seconds between two flushes.
+        """
+        try:
+            self.model_registry = model_registry
+            self.state_dir = state_dir
+            self.columns = columns
+            self.flush_interval = flush_interval
+            self.state_file_path = os.path.join(state_dir, MONITOR_STATE_FILE_PATTERN.replace("*", str(os.getpid())))
+            self._lock = threading.Lock()
+            self._model_path = None
+            self._reference_profile_file_path = None
+            self._reference = None
+            self._state = None
+            self._flush_thread = None
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def _new_state(self, reference: DataProfile) -> dict:
+        # flat lists of (column, ...) trackers keep the per-record work to list and dict updates
+        numerical = [(column, reference_column["bin_edges"], [0] * (len(reference_column["counts"]) + 1), [0, 0.0, 0.0])
+                     for column, reference_column in reference.numerical.items()]
+        categorical = []
+        for column, reference_column in reference.categorical.items():
+            categories = reference_column["categories"]
+            if len(categories) > SKETCH_MIN_CATEGORIES:
+                categorical.append((column, None, CountMinSketch(), [0, 0]))
+            else:
+                categorical.append((column, dict.fromkeys(categories, 0), None, [0, 0]))
+        return {"n_rows": 0, "numerical": numerical, "categorical": categorical}
+
+    def _sync_reference(self) -> bool:
+        """
+        Loads the reference profile of the serving model and resets the
+        counters when the model changed. Returns False if there is none.
+        """
+        model_path = self.model_registry.get_model_path()
+        if model_path == self._model_path:
+            return self._reference is not None
+        reference_profile_file_path = None if model_path is None else os.path.join(
+            os.path.dirname(model_path), DATA_VALIDATION_REFERENCE_PROFILE_FILE_NAME)
+        reference = None
+        if reference_profile_file_path is not None and os.path.exists(reference_profile_file_path):
+            reference = DataProfile.load(reference_profile_file_path)
+            if self.columns is not None:
+                # the target column is profiled at training time but never sent for prediction
+                reference = DataProfile(
+                    n_rows=reference.n_rows,
+                    numerical={column: value for column, value in reference.numerical.items() if column in self.columns},
+                    categorical={column: value for column, value in reference.categorical.items()
+                                 if column in self.columns})
+            logging.info(f"Drift monitor compares traffic with: [{reference_profile_file_path}]")
+        with self._lock:
+            self._model_path = model_path
+            self._reference_profile_file_path = reference_profile_file_path
+            self._reference = reference
+            self._state = None if reference is None else self._new_state(reference)
+        return reference is not None
+
+    def record(self, record: dict) -> None:
+        """
+        Adds one prediction input record. Never raises, monitoring must not
+        fail a prediction.
+        """
+        try:
+            if not self._sync_reference():
+                return
+            with self._lock:
+                state = self._state
+                state["n_rows"] += 1
+                # counts end with the missing bucket, moments are [count, sum, sum of squares]
+                for column, bin_edges, counts, moments in state["numerical"]:
+                    value = record.get(column)
+                    if value is None:
+                        counts[-1] += 1
+                        continue
+                    value = float(value)
+                    counts[bisect_right(bin_edges, value)] += 1
+                    moments[0] += 1
+                    moments[1] += value
+                    moments[2] += value * value
+                # extra is [other, missing] for exact counts and [count, missing] for sketches
+                for column, category_counts, sketch, extra in state["categorical"]:
+                    value = record.get(column)
+                    if value is None:
+                        extra[1] += 1
+                    elif sketch is not None:
+                        sketch.add(str(value))
+                        extra[0] += 1
+                    else:
+                        value = str(value)
+                        if value in category_counts:
+                            category_counts[value] += 1
+                        else:
+                            extra[0] += 1
+            self._start_flush_thread()
+        except Exception as e:
+            logging.exception(f"Drift monitor failed to record: {e}")
+
+    def _start_flush_thread(self) -> None:
+        if self._flush_thread is None:
+            self._flush_thread = threading.Thread(target=self._flush_loop, name="drift-monitor-flush", daemon=True)
+            self._flush_thread.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.exception(f"Drift monitor flush failed: {e}")
+
+    def _serialize_state(self) -> dict:
+        with self._lock:
+            if self._state is None:
+                return None
+            categorical = {}
+            for column, category_counts, sketch, extra in self._state["categorical"]:
+                if sketch is not None:
+                    categorical[column] = {"sketch": [list(row) for row in sketch.table], "count": extra[0],
+                                           "missing": extra[1]}
+                else:
+                    categorical[column] = {"counts": dict(category_counts), "other": extra[0], "missing": extra[1]}
+            return {
+                "pid": os.getpid(),
+                "updated_at": time.time(),
+                "reference_profile_file_path": self._reference_profile_file_path,
+                "n_rows": self._state["n_rows"],
+                "numerical": {column: {"counts": counts[:-1], "missing": counts[-1], "moments": list(moments)}
+                              for column, _, counts, moments in self._state["numerical"]},
+                "categorical": categorical,
+            }
+
+    def flush(self) -> None:
+        """
+        Writes the counters of this process to its state file.
+        """
+        try:
+            state = self._serialize_state()
+            if state is None:
+                return
+            os.makedirs(self.state_dir, exist_ok=True)
+            partial_file_path = f"{self.state_file_path}.partial"
+            with open(partial_file_path, "w") as state_file:
+                json.dump(state, state_file)
+            os.replace(partial_file_path, self.state_file_path)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def _load_states(self) -> list:
+        states = [self._serialize_state()]
+        for state_file_path in glob.glob(os.path.join(self.state_dir, MONITOR_STATE_FILE_PATTERN)):
+            if state_file_path == self.state_file_path:
+                continue
+            with open(state_file_path, "r") as state_file:
+                state = json.load(state_file)
+            if state["reference_profile_file_path"] == self._reference_profile_file_path:
+                states.append(state)
+        return [state for state in states if state is not None]
+
+    def get_current_profile(self) -> DataProfile:
+        """
+        Merges the counters of every worker process into a profile laid out
+        like the reference profile. Returns None without a reference profile.
+        """
+        try:
+            if not self._sync_reference():
+                return None
+            reference = self._reference
+            states = self._load_states()
+
+            numerical = {}
+            for column, reference_column in reference.numerical.items():
+                column_states = [state["numerical"][column] for state in states]
+                counts = [sum(bucket_counts) for bucket_counts in
+                          zip(*[column_state["counts"] for column_state in column_states])]
+                count, total, total_squares = [sum(moment) for moment in
+                                               zip(*[column_state["moments"] for column_state in column_states])]
+                mean = total / count if count else None
+                numerical[column] = {
+                    "bin_edges": reference_column["bin_edges"],
+                    "counts": counts,
+                    "missing": sum(column_state["missing"] for column_state in column_states),
+                    "mean": mean,
+                    "std": max(0.0, total_squares / count - mean * mean) ** 0.5 if count else None,
+                }
+
+            categorical = {}
+            for column, reference_column in reference.categorical.items():
+                categories = reference_column["categories"]
+                column_states = [state["categorical"][column] for state in states]
+                if len(categories) > SKETCH_MIN_CATEGORIES:
+                    sketch = CountMinSketch()
+                    for column_state in column_states:
+                        sketch.merge(CountMinSketch(table=column_state["sketch"]))
+                    counts = [sketch.estimate(category) for category in categories]
+                    other = max(0, sum(column_state["count"] for column_state in column_states) - sum(counts))
+                else:
+                    counts = [sum(column_state["counts"][category] for column_state in column_states)
+                              for category in categories]
+                    other = sum(column_state["other"] for column_state in column_states)
+                categorical[column] = {
+                    "categories": categories,
+                    "counts": counts + [other],
+                    "missing": sum(column_state["missing"] for column_state in column_states),
+                }
+            return DataProfile(n_rows=sum(state["n_rows"] for state in states), numerical=numerical,
+                               categorical=categorical)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_drift_report(self) -> dict:
+        """
+        Compares the prediction traffic seen so far with the reference
+        profile of the serving model.
+        """
+        try:
+            current = self.get_current_profile()
+            if current is None:
+                return {"data_drift": None, "message": "No reference profile available for the serving model."}
+            reference = self._reference
+            report = compare_profiles(reference, current)
+            report["reference_profile_file_path"] = self._reference_profile_file_path
+            return report
+        except Exception as e:
+            raise CarException(e, sys) from e
@@ -0,0 +1,227 @@
+import html
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2_contingency
+from carprice.exception import CarException
+
+DEFAULT_BIN_COUNT = 10
+DEFAULT_MAX_CATEGORIES = 200
+DEFAULT_P_VALUE_THRESHOLD = 0.05
+DEFAULT_DRIFT_SHARE = 0.5
+# avoids log(0) when a bin is empty in one of the profiles
+PSI_EPSILON = 1e-4
+
+
+class DataProfile:
+    """
+    Summary of a dataset used for drift detection.
+
+    Numerical columns are kept as counts over quantile bins and categorical
+    columns as category counts, so two datasets can be compared without
+    reading the raw rows again. A reference profile is computed once and saved
+    as JSON; current data is profiled against the reference's bins and
+    categories.
+    """
+
+    def __init__(self, n_rows: int, numerical: dict, categorical: dict) -> None:
+        """
+        Args:
+            n_rows (int): Number of rows profiled.
+            numerical (dict): Column name to `bin_edges`, `counts`, `missing`, `mean` and `std`.
+            categorical (dict): Column name to `categories`, `counts` and `missing`.
+        """
+        self.n_rows = n_rows
+        self.numerical = numerical
+        self.categorical = categorical
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, numerical_columns: list, categorical_columns: list,
+                       reference=None, n_bins: int = DEFAULT_BIN_COUNT,
+                       max_categories: int = DEFAULT_MAX_CATEGORIES):
+        """
+        Profiles `df` in a single pass over each column.
+
+        Args:
+            df (pd.DataFrame): Data to profile.
+            numerical_columns (list): Columns summarized as histograms.
+            categorical_columns (list): Columns summarized as category counts.
+            reference (DataProfile): Profile whose bin edges and categories are reused, None to derive them from `df`.
+            n_bins (int): Number of quantile bins when no reference is given.
+            max_categories (int): Most frequent categories kept when no reference is given, the rest share one extra bucket.
+
+        Returns:
+            DataProfile: Profile of `df`.
+        """
+        try:
+            numerical = {}
+            for column in numerical_columns:
+                values = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=np.float64)
+                is_missing = np.isnan(values)
+                present = values[~is_missing]
+                if reference is not None:
+                    bin_edges = np.asarray(reference.numerical[column]["bin_edges"], dtype=np.float64)
+                elif len(present) > 0:
+                    # interior edges only, the outer bins are open ended
+                    bin_edges = np.unique(np.quantile(present, np.linspace(0, 1, n_bins + 1)[1:-1]))
+                else:
+                    bin_edges = np.empty(0)
+                counts = np.bincount(np.searchsorted(bin_edges, present, side="right"),
+                                     minlength=len(bin_edges) + 1)
+                numerical[column] = {
+                    "bin_edges": bin_edges.tolist(),
+                    "counts": counts.tolist(),
+                    "missing": int(is_missing.sum()),
+                    "mean": float(present.mean()) if len(present) else None,
+                    "std": float(present.std()) if len(present) else None,
+                }
+
+            categorical = {}
+            for column in categorical_columns:
+                value_counts = df[column].astype("string").value_counts(dropna=True)
+                if reference is not None:
+                    categories = reference.categorical[column]["categories"]
+                else:
+                    categories = [str(category) for category in value_counts.index[:max_categories]]
+                counts = value_counts.reindex(categories, fill_value=0).to_numpy()
+                other_count = int(value_counts.sum() - counts.sum())
+                categorical[column] = {
+                    "categories": categories,
+                    "counts": counts.tolist() + [other_count],
+                    "missing": int(df[column].isna().sum()),
+                }
+            return cls(n_rows=len(df), numerical=numerical, categorical=categorical)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def to_dict(self) -> dict:
+        return {"n_rows": self.n_rows, "numerical": self.numerical, "categorical": self.categorical}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(n_rows=data["n_rows"], numerical=data["numerical"], categorical=data["categorical"])
+
+    def save(self, file_path: str) -> None:
+        """
+        Writes the profile to `file_path` as JSON.
+        """
+        try:
+            dir_path = os.path.dirname(file_path)
+            if dir_path:
+                os.makedirs(dir_path, exist_ok=True)
+            with open(file_path, "w") as profile_file:
+                json.dump(self.to_dict(), profile_file)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    @classmethod
+    def load(cls, file_path: str):
+        """
+        Reads a profile written by `save`.
+        """
+        try:
+            with open(file_path, "r") as profile_file:
+                return cls.from_dict(json.load(profile_file))
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+
+def get_column_drift(reference_counts, current_counts, p_value_threshold: float = DEFAULT_P_VALUE_THRESHOLD) -> dict:
+    """
+    Compares two count vectors over the same buckets with a chi-squared test
+    and the population stability index.
+
+    Returns:
+        dict: `p_value`, `psi` and `drift_detected` of the column.
+    """
+    reference_counts = np.asarray(reference_counts, dtype=np.float64)
+    current_counts = np.asarray(current_counts, dtype=np.float64)
+    if reference_counts.sum() == 0 or current_counts.sum() == 0:
+        return {"p_value": None, "psi": None, "drift_detected": False}
+    reference_share = np.maximum(reference_counts / reference_counts.sum(), PSI_EPSILON)
+    current_share = np.maximum(current_counts / current_counts.sum(), PSI_EPSILON)
+    psi = float(np.sum((current_share - reference_share) * np.log(current_share / reference_share)))
+
+    observed = np.vstack([reference_counts, current_counts])
+    observed = observed[:, observed.sum(axis=0) > 0]
+    p_value = 1.0 if observed.shape[1] < 2 else float(chi2_contingency(observed)[1])
+    return {"p_value": p_value, "psi": psi, "drift_detected": p_value < p_value_threshold}
+
+
+def compare_profiles(reference: DataProfile, current: DataProfile,
+                     p_value_threshold: float = DEFAULT_P_VALUE_THRESHOLD,
+                     drift_share: float = DEFAULT_DRIFT_SHARE) -> dict:
+    """
+    Builds the data drift report of `current` against `reference`. The
+    dataset is flagged as drifted once at least `drift_share` of its columns
+    drifted.
+
+    Returns:
+        dict: JSON serializable drift report.
+    """
+    try:
+        columns = {}
+        for column, reference_column in reference.numerical.items():
+            current_column = current.numerical[column]
+            columns[column] = {
+                "column_type": "num",
+                **get_column_drift(reference_column["counts"] + [reference_column["missing"]],
+                                   current_column["counts"] + [current_column["missing"]], p_value_threshold),
+                "reference_mean": reference_column["mean"],
+                "current_mean": current_column["mean"],
+            }
+        for column, reference_column in reference.categorical.items():
+            current_column = current.categorical[column]
+            columns[column] = {
+                "column_type": "cat",
+                **get_column_drift(reference_column["counts"] + [reference_column["missing"]],
+                                   current_column["counts"] + [current_column["missing"]], p_value_threshold),
+            }
+
+        n_drifted_columns = sum(column["drift_detected"] for column in columns.values())
+        share_drifted_columns = n_drifted_columns / len(columns) if columns else 0.0
+        return {
+            "data_drift": {
+                "reference_rows": reference.n_rows,
+                "current_rows": current.n_rows,
+                "n_columns": len(columns),
+                "n_drifted_columns": n_drifted_columns,
+                "share_drifted_columns": share_drifted_columns,
+                "dataset_drift": bool(columns) and share_drifted_columns >= drift_share,
+                "p_value_threshold": p_value_threshold,
+                "columns": columns,
+            }
+        }
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def render_drift_report_html(report: dict) -> str:
+    """
+    Renders a drift report built by `compare_profiles` as a standalone HTML page.
+    """
+    data_drift = report["data_drift"]
+
+    def format_number(value):
+        return "-" if value is None else f"{value:.4g}"
+
+    rows = []
+    for name, column in data_drift["columns"].items():
+        row_class = ' class="drift"' if column["drift_detected"] else ""
+        rows.append(f"<tr{row_class}><td>{html.escape(name)}</td><td>{column['column_type']}</td>"
+                    f"<td>{format_number(column['p_value'])}</td><td>{format_number(column['psi'])}</td>"
+                    f"<td>{'Detected' if column['drift_detected'] else 'Not detected'}</td></tr>")
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Data Drift Report</title>"
+        "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}"
+        "td,th{border:1px solid #ccc;padding:4px 10px;text-align:left}tr.drift{background:#fdd}</style>"
+        "</head><body><h1>Data Drift Report</h1>"
+        f"<p>Reference rows: {data_drift['reference_rows']}, current rows: {data_drift['current_rows']}</p>"
+        f"<p>Drift detected in {data_drift['n_drifted_columns']} of {data_drift['n_columns']} columns "
+        f"(p-value threshold {data_drift['p_value_threshold']}). "
+        f"Dataset drift: <b>{'Yes' if data_drift['dataset_drift'] else 'No'}</b></p>"
+        "<table><tr><th>Column</th><th>Type</th><th>p-value</th><th>PSI</th><th>Drift</th></tr>"
+        f"{''.join(rows)}</table></body></html>"
+    )
@@ -0,0 +1,311 @@
+import csv
+import os
+import re
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from carprice.exception import CarException
+from carprice.logger import logging
+
+# experiment states
+EXPERIMENT_RUNNING = "running"
+EXPERIMENT_COMPLETED = "completed"
+EXPERIMENT_FAILED = "failed"
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 500
+# columns the history can be sorted by, each backed by an index
+SORTABLE_COLUMNS = ("start_time", "stop_time", "execution_time", "running_status", "accuracy")
+EXPERIMENT_COLUMNS = ("experiment_id", "artifact_time_stamp", "running_status", "start_time", "stop_time",
+                      "execution_time", "message", "accuracy", "is_model_accepted")
+_TIME_DELTA_PATTERN = re.compile(r"^(?:(\d+) days?, )?(\d+):(\d{2}):(\d{2}(?:\.\d+)?)$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    experiment_id TEXT PRIMARY KEY,
+    artifact_time_stamp TEXT UNIQUE,
+    running_status TEXT NOT NULL,
+    start_time TEXT,
+    stop_time TEXT,
+    execution_time REAL,
+    message TEXT,
+    accuracy REAL,
+    is_model_accepted INTEGER
+);
+CREATE TABLE IF NOT EXISTS experiment_metrics (
+    experiment_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (experiment_id, name)
+);
+CREATE TABLE IF NOT EXISTS experiment_store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS experiments_start_time ON experiments (start_time);
+CREATE INDEX IF NOT EXISTS experiments_stop_time ON experiments (stop_time);
+CREATE INDEX IF NOT EXISTS experiments_execution_time ON experiments (execution_time);
+CREATE INDEX IF NOT EXISTS experiments_accuracy ON experiments (accuracy);
+CREATE INDEX IF NOT EXISTS experiments_running_status ON experiments (running_status, start_time);
+"""
+
+
+def _now() -> str:
+    # same format as the start and stop times of experiment.csv, so both sort together
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _parse_seconds(value):
+    """
+    Parses an execution time written as seconds or as a `timedelta` string, e.g. `0:01:23.5`.
+    """
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = _TIME_DELTA_PATTERN.match(str(value).strip())
+    if match is None:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _parse_bool(value):
+    if value in (None, ""):
+        return None
+    return 1 if str(value).strip().lower() in ("true", "1") else 0
+
+
+def _parse_float(value):
+    try:
+        return None if value in (None, "") else float(value)
+    except ValueError:
+        return None
+
+
+def _parse_time(value):
+    # drops the microseconds and the ISO `T` of experiment.csv times
+    return str(value).replace("T", " ")[:19] if value not in (None, "") else None
+
+
+class ExperimentStore:
+    """
+    Training experiments and their metrics in SQLite.
+
+    Every history page is one indexed query, so its cost depends on the page
+    size and not on how many runs there were. Rows of the older
+    `experiment.csv` are merged in with `import_csv`.
+    """
+
+    def __init__(self, db_file_path: str) -> None:
+        """
+        Args:
+            db_file_path (str): Path of the SQLite database, created if missing.
+        """
+        try:
+            self.db_file_path = db_file_path
+            os.makedirs(os.path.dirname(db_file_path) or ".", exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.executescript(_SCHEMA)
+            finally:
+                conn.close()
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _upsert(self, conn: sqlite3.Connection, experiment: dict) -> None:
+        # fields left as None keep their stored value, so a partial update never erases a metric
+        columns = [column for column in EXPERIMENT_COLUMNS if column in experiment]
+        updates = ", ".join(f"{column} = COALESCE(excluded.{column}, experiments.{column})"
+                            for column in columns if column not in ("experiment_id", "artifact_time_stamp"))
+        conn.execute(f"INSERT INTO experiments ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                     f"ON CONFLICT (artifact_time_stamp) DO UPDATE SET {updates}",
+                     [experiment[column] for column in columns])
+
+    def start_experiment(self, artifact_time_stamp: str, message: str = None) -> None:
+        """
+        Records a run as started; the run's artifact timestamp is its experiment id.
+        """
+        try:
+            conn = self._connect()
+            try:
+                self._upsert(conn, {"experiment_id": artifact_time_stamp, "artifact_time_stamp": artifact_time_stamp,
+                                    "running_status": EXPERIMENT_RUNNING, "start_time": _now(), "message": message})
+            finally:
+                conn.close()
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def finish_experiment(self, artifact_time_stamp: str, running_status: str, message: str = None,
+                          accuracy: float = None, is_model_accepted: bool = None, metrics: dict = None) -> None:
+        """
+        Records the outcome of a run and its metrics, e.g. `{"test_rmse": 1.2}`.
+        """
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT experiment_id, start_time FROM experiments WHERE artifact_time_stamp = ?",
+                                   (artifact_time_stamp,)).fetchone()
+                stop_time = _now()
+                execution_time = None
+                if row is not None and row["start_time"]:
+                    execution_time = (datetime.strptime(stop_time, "%Y-%m-%d %H:%M:%S") -
+                                      datetime.strptime(row["start_time"], "%Y-%m-%d %H:%M:%S")).total_seconds()
+                experiment_id = artifact_time_stamp if row is None else row["experiment_id"]
+                self._upsert(conn, {"experiment_id": experiment_id, "artifact_time_stamp": artifact_time_stamp,
+                                    "running_status": running_status, "stop_time": stop_time,
+                                    "execution_time": execution_time, "message": message,
+                                    "accuracy": _parse_float(accuracy),
+                                    "is_model_accepted": None if is_model_accepted is None else int(is_model_accepted)})
+                conn.executemany("INSERT OR REPLACE INTO experiment_metrics (experiment_id, name, value) "
+                                 "VALUES (?, ?, ?)",
+                                 [(experiment_id, name, _parse_float(value)) for name, value in (metrics or {}).items()])
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def import_csv(self, csv_file_path: str) -> int:
+        """
+        Merges the rows of an `experiment.csv` into the store. The file is only
+        read again once it has changed since the last import.
+
+        Returns:
+            int: Number of rows read, 0 when the file is missing or unchanged.
+        """
+        try:
+            if not os.path.exists(csv_file_path):
+                return 0
+            stat = os.stat(csv_file_path)
+            signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+            meta_key = f"csv_import:{os.path.abspath(csv_file_path)}"
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT value FROM experiment_store_meta WHERE key = ?", (meta_key,)).fetchone()
+                if row is not None and row["value"] == signature:
+                    return 0
+                n_rows = 0
+                conn.execute("BEGIN IMMEDIATE")
+                with open(csv_file_path, "r", newline="") as csv_file:
+                    for record in csv.DictReader(csv_file):
+                        artifact_time_stamp = record.get("artifact_time_stamp") or record.get("experiment_id")
+                        # experiment.csv flags a run in progress with running_status True
+                        is_running = _parse_bool(record.get("running_status"))
+                        self._upsert(conn, {
+                            "experiment_id": record.get("experiment_id") or artifact_time_stamp,
+                            "artifact_time_stamp": artifact_time_stamp,
+                            "running_status": EXPERIMENT_RUNNING if is_running else EXPERIMENT_COMPLETED,
+                            "start_time": _parse_time(record.get("start_time")),
+                            "stop_time": _parse_time(record.get("stop_time")),
+                            "execution_time": _parse_seconds(record.get("execution_time")),
+                            "message": record.get("message") or None,
+                            "accuracy": _parse_float(record.get("accuracy")),
+                            "is_model_accepted": _parse_bool(record.get("is_model_accepted")),
+                        })
+                        n_rows += 1
+                conn.execute("INSERT OR REPLACE INTO experiment_store_meta (key, value) VALUES (?, ?)",
+                             (meta_key, signature))
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+            logging.info(f"Imported [{n_rows}] experiments from [{csv_file_path}]")
+            return n_rows
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def list_experiments(self, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE, sort_by: str = "start_time",
+                         descending: bool = True, status: str = None) -> dict:
+        """
+        Reads one page of the experiment history.
+
+        Args:
+            page (int): 1-based page number.
+            page_size (int): Experiments per page.
+            sort_by (str): One of `SORTABLE_COLUMNS`.
+            descending (bool): Sort order, newest first by default.
+            status (str): Only experiments in this state, e.g. `failed`.
+
+        Returns:
+            dict: `records` (each with its `metrics`) and the paging fields of the view.
+        """
+        try:
+            if sort_by not in SORTABLE_COLUMNS:
+                raise ValueError(f"Can not sort experiments by [{sort_by}], use one of {list(SORTABLE_COLUMNS)}")
+            page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+            page = max(1, int(page))
+            where, params = ("WHERE running_status = ?", [status]) if status else ("", [])
+            order = "DESC" if descending else "ASC"
+            conn = self._connect()
+            try:
+                n_experiments = conn.execute(f"SELECT COUNT(*) FROM experiments {where}", params).fetchone()[0]
+                rows = conn.execute(f"SELECT * FROM experiments {where} ORDER BY {sort_by} {order}, "
+                                    f"artifact_time_stamp {order} LIMIT ? OFFSET ?",
+                                    params + [page_size, (page - 1) * page_size]).fetchall()
+                records = self._with_metrics(conn, [dict(row) for row in rows])
+            finally:
+                conn.close()
+            return {"records": records, "page": page, "page_size": page_size, "n_experiments": n_experiments,
+                    "n_pages": max(1, -(-n_experiments // page_size)), "sort_by": sort_by,
+                    "order": order.lower(), "status": status}
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_experiment(self, experiment_id: str):
+        """
+        Returns one experiment with its metrics, None if it does not exist.
+        """
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT * FROM experiments WHERE experiment_id = ?", (experiment_id,)).fetchone()
+                return None if row is None else self._with_metrics(conn, [dict(row)])[0]
+            finally:
+                conn.close()
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    @staticmethod
+    def _with_metrics(conn: sqlite3.Connection, records: list) -> list:
+        by_id = {record["experiment_id"]: record for record in records}
+        for record in records:
+            record["metrics"] = {}
+            if record["is_model_accepted"] is not None:
+                record["is_model_accepted"] = bool(record["is_model_accepted"])
+        if by_id:
+            rows = conn.execute(f"SELECT experiment_id, name, value FROM experiment_metrics "
+                                f"WHERE experiment_id IN ({', '.join('?' * len(by_id))})", list(by_id)).fetchall()
+            for row in rows:
+                by_id[row["experiment_id"]]["metrics"][row["name"]] = row["value"]
+        return records
+
+
+@contextmanager
+def track_experiment(experiment_store: ExperimentStore, artifact_time_stamp: str):
+    """
+    Records the run of the block as an experiment. The block may set
+    `accuracy`, `is_model_accepted` and `metrics` on the yielded dict; they
+    are stored with the outcome.
+    """
+    outcome = {}
+    experiment_store.start_experiment(artifact_time_stamp)
+    try:
+        yield outcome
+    except BaseException as e:
+        experiment_store.finish_experiment(artifact_time_stamp, EXPERIMENT_FAILED, message=str(e)[:1000])
+        raise
+    experiment_store.finish_experiment(artifact_time_stamp, EXPERIMENT_COMPLETED,
+                                       message=outcome.get("message", "Training completed"),
+                                       accuracy=outcome.get("accuracy"),
+                                       is_model_accepted=outcome.get("is_model_accepted"),
+                                       metrics=outcome.get("metrics"))
@@ -0,0 +1,181 @@
+import sys
+import numpy as np
+import pandas as pd
+from category_encoders.binary import BinaryEncoder
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.pipeline import Pipeline
+from carprice.util.outlier_capper import OutlierCapper
+from carprice.exception import CarException
+from carprice.logger import logging
+
+UNKNOWN_CATEGORY_ORDINAL = -1
+
+
+class FeaturePlan:
+    """
+    Flat NumPy version of the fitted preprocessing `ColumnTransformer`.
+
+    One-hot and binary encodings become dict lookups into precomputed code
+    rows, outlier capping becomes lower/upper limit vectors and scaling
+    becomes a mean/scale vector, so transforming a handful
+    of records costs microseconds instead of a pandas round trip through
+    every sklearn transformer. Outputs match `ColumnTransformer.transform`.
+    """
+
+    def __init__(self, n_features: int, onehot_lookups: list, binary_lookups: list,
+                 numerical_columns: list, numerical_slice: slice, mean: np.ndarray, scale: np.ndarray,
+                 lower_limits: np.ndarray = None, upper_limits: np.ndarray = None) -> None:
+        """
+        Args:
+            n_features (int): Width of the transformed feature matrix.
+            onehot_lookups (list): `(column, {category: feature index}, raise_on_unknown)` tuples.
+            binary_lookups (list): `(column, feature slice, {category: code row}, unknown code row)` tuples.
+            numerical_columns (list): Scaled numerical columns, in output order.
+            numerical_slice (slice): Output features holding the scaled numerical columns.
+            mean (np.ndarray): Values subtracted from the numerical columns.
+            scale (np.ndarray): Values the centered numerical columns are divided by.
+            lower_limits (np.ndarray): Lower capping limits of the numerical columns, None for no capping.
+            upper_limits (np.ndarray): Upper capping limits of the numerical columns, None for no capping.
+        """
+        self.n_features = n_features
+        self.onehot_lookups = onehot_lookups
+        self.binary_lookups = binary_lookups
+        self.numerical_columns = numerical_columns
+        self.numerical_slice = numerical_slice
+        self.mean = mean
+        self.scale = scale
+        self.lower_limits = lower_limits
+        self.upper_limits = upper_limits
+
+    @classmethod
+    def compile(cls, preprocessor) -> "FeaturePlan":
+        """
+        Builds a plan from a fitted `ColumnTransformer` made of `OneHotEncoder`,
+        `BinaryEncoder` and `StandardScaler` steps, the scaler optionally
+        preceded by an `OutlierCapper` in a `Pipeline`.
+        """
+        try:
+            if getattr(preprocessor, "sparse_output_", False):
+                # sparse inputs are scored differently by XGBoost, a dense plan would change predictions
+                raise NotImplementedError("Preprocessors with sparse output can not be compiled")
+            onehot_lookups = []
+            binary_lookups = []
+            numerical_columns = None
+            numerical_slice = None
+            mean = scale = None
+            lower_limits = upper_limits = None
+            offset = 0
+
+            for name, transformer, columns in preprocessor.transformers_:
+                if transformer == "drop" or len(columns) == 0:
+                    continue
+                if isinstance(transformer, Pipeline):
+                    steps = [step for _, step in transformer.steps]
+                    if len(steps) == 2 and isinstance(steps[0], OutlierCapper):
+                        lower_limits, upper_limits = steps[0].lower_limits_, steps[0].upper_limits_
+                        transformer = steps[1]
+                    elif len(steps) == 1:
+                        transformer = steps[0]
+                    if not isinstance(transformer, StandardScaler):
+                        raise NotImplementedError(f"Pipeline [{name}] can not be compiled")
+                if isinstance(transformer, OneHotEncoder):
+                    if transformer.drop is not None:
+                        raise NotImplementedError("OneHotEncoder with drop is not supported")
+                    raise_on_unknown = transformer.handle_unknown == "error"
+                    for column, categories in zip(columns, transformer.categories_):
+                        lookup = {category: offset + index for index, category in enumerate(categories)}
+                        onehot_lookups.append((column, lookup, raise_on_unknown))
+                        offset += len(categories)
+                elif isinstance(transformer, BinaryEncoder):
+                    ordinal_mappings = {mapping["col"]: mapping["mapping"]
+                                        for mapping in transformer.ordinal_encoder.mapping}
+                    for code_mapping in transformer.mapping:
+                        column = code_mapping["col"]
+                        code_table = code_mapping["mapping"]
+                        width = code_table.shape[1]
+                        lookup = {category: code_table.loc[ordinal].to_numpy(dtype=np.float32)
+                                  for category, ordinal in ordinal_mappings[column].items()
+                                  if not pd.isna(category)}
+                        unknown_code = None
+                        if transformer.handle_unknown == "value":
+                            unknown_code = code_table.loc[UNKNOWN_CATEGORY_ORDINAL].to_numpy(dtype=np.float32)
+                        binary_lookups.append((column, slice(offset, offset + width), lookup, unknown_code))
+                        offset += width
+                elif isinstance(transformer, StandardScaler):
+                    if numerical_columns is not None:
+                        raise NotImplementedError("Only one StandardScaler step is supported")
+                    numerical_columns = list(columns)
+                    numerical_slice = slice(offset, offset + len(columns))
+                    mean = transformer.mean_ if transformer.with_mean else np.zeros(len(columns))
+                    scale = transformer.scale_ if transformer.with_std else np.ones(len(columns))
+                    offset += len(columns)
+                else:
+                    raise NotImplementedError(f"Transformer [{name}] of type {type(transformer).__name__} "
+                                              f"can not be compiled")
+
+            return cls(n_features=offset, onehot_lookups=onehot_lookups, binary_lookups=binary_lookups,
+                       numerical_columns=numerical_columns or [], numerical_slice=numerical_slice or slice(0, 0),
+                       mean=np.asarray(mean if mean is not None else [], dtype=np.float64),
+                       scale=np.asarray(scale if scale is not None else [], dtype=np.float64),
+                       lower_limits=lower_limits, upper_limits=upper_limits)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def transform_records(self, records: list) -> np.ndarray:
+        """
+        Transforms a list of input dicts into a float32 feature matrix.
+        """
+        features = np.zeros((len(records), self.n_features), dtype=np.float32)
+        for row_index, record in enumerate(records):
+            row = features[row_index]
+            for column, lookup, raise_on_unknown in self.onehot_lookups:
+                feature_index = lookup.get(record[column])
+                if feature_index is not None:
+                    row[feature_index] = 1.0
+                elif raise_on_unknown:
+                    raise ValueError(f"Found unknown category [{record[column]}] in column [{column}]")
+            for column, feature_slice, lookup, unknown_code in self.binary_lookups:
+                code = lookup.get(record[column], unknown_code)
+                if code is None:
+                    raise ValueError(f"Found unknown category [{record[column]}] in column [{column}]")
+                row[feature_slice] = code
+
+        if len(self.numerical_columns) > 0:
+            numerical_values = np.array([[record[column] for column in self.numerical_columns]
+                                         for record in records], dtype=np.float64)
+            if self.lower_limits is not None:
+                numerical_values = np.clip(numerical_values, self.lower_limits, self.upper_limits)
+            features[:, self.numerical_slice] = (numerical_values - self.mean) / self.scale
+        return features
+
+    def sample_records(self, max_records: int = 50) -> list:
+        """
+        Builds records covering the known categories, used to check the plan
+        against the original preprocessor.
+        """
+        vocabularies = {column: list(lookup) for column, lookup, _ in self.onehot_lookups}
+        vocabularies.update({column: list(lookup) for column, _, lookup, _ in self.binary_lookups})
+        n_records = min(max_records, max([len(vocabulary) for vocabulary in vocabularies.values()] + [1]))
+        records = []
+        for row_index in range(n_records):
+            record = {column: vocabulary[row_index % len(vocabulary)]
+                      for column, vocabulary in vocabularies.items() if len(vocabulary) > 0}
+            for column_index, column in enumerate(self.numerical_columns):
+                record[column] = self.mean[column_index] + (row_index - n_records / 2) * self.scale[column_index] / n_records
+            records.append(record)
+        return records
+
+    def verify(self, preprocessor) -> bool:
+        """
+        Returns True if the plan reproduces `preprocessor.transform` on sample records.
+        """
+        try:
+            records = self.sample_records()
+            expected = preprocessor.transform(pd.DataFrame.from_records(records))
+            if hasattr(expected, "toarray"):
+                expected = expected.toarray()
+            is_equal = np.allclose(self.transform_records(records), np.asarray(expected, dtype=np.float32))
+            logging.info(f"Feature plan matches preprocessing object: {is_equal}")
+            return is_equal
+        except Exception as e:
+            raise CarException(e, sys) from e
@@ -0,0 +1,483 @@
+import argparse
+import functools
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from carprice.exception import CarException
+from carprice.logger import logging, set_run_id
+from carprice.util.stage_profiler import profile_span, set_metrics_file
+from carprice.constant import DATA_INGESTION_ARTIFACT_DIR, DATA_VALIDATION_ARTIFACT_DIR, \
+    DATA_TRANSFORMATION_ARTIFACT_DIR, MODEL_TRAINER_ARTIFACT_DIR, MODEL_EVALUATION_ARTIFACT_DIR, \
+    MODEL_PUSHER_ARTIFACT_DIR, DATA_DRIFT_STAGE_NAME
+
+# job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+ACTIVE_JOB_STATES = (JOB_QUEUED, JOB_RUNNING)
+
+# stage events
+STAGE_STARTED = "started"
+STAGE_COMPLETED = "completed"
+STAGE_FAILED = "failed"
+
+# a job claimed this long ago that still has no process id was claimed by a worker that died before starting it
+JOB_START_GRACE_SECONDS = 120
+
+TRAINING_JOB = "training"
+TRAINING_DAG_JOB = "training_dag"
+JOB_DB_FILE_NAME = "jobs.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    stages_completed INTEGER NOT NULL DEFAULT 0,
+    pid INTEGER,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    event TEXT NOT NULL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS job_events_job_id ON job_events (job_id);
+"""
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a job process when its job is cancelled. It derives from
+    BaseException so the `except Exception` blocks of the components do not
+    swallow it.
+    """
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobRunner:
+    """
+    Persistent training job queue backed by SQLite.
+
+    Any number of web workers can submit and inspect jobs; the database is
+    the only shared state. At most one job runs at a time, each in its own
+    subprocess (and process group) so training never shares a process with
+    request serving. When a job process finishes it starts the next queued
+    job itself, so no long-lived scheduler is needed.
+    """
+
+    def __init__(self, job_dir: str, working_dir: str = None) -> None:
+        """
+        Args:
+            job_dir (str): Directory holding the job database and the job process logs.
+            working_dir (str): Working directory of the job processes, defaults to the current one.
+        """
+        try:
+            self.job_dir = job_dir
+            self.working_dir = os.getcwd() if working_dir is None else working_dir
+            self.db_file_path = os.path.join(job_dir, JOB_DB_FILE_NAME)
+            os.makedirs(job_dir, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.executescript(_SCHEMA)
+            finally:
+                conn.close()
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _transaction(self, conn: sqlite3.Connection):
+        # IMMEDIATE takes the write lock up front, so check-then-update sequences can not interleave
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def _reap_dead_jobs(self, conn: sqlite3.Connection) -> None:
+        """
+        Marks running jobs whose process has died without reporting back as
+        failed, or as cancelled when it was killed before handling the cancellation.
+        Jobs still without a process id after `JOB_START_GRACE_SECONDS` were
+        never started and are marked failed too.
+        """
+        rows = conn.execute("SELECT id, pid, cancel_requested, started_at FROM jobs WHERE status = ?",
+                            (JOB_RUNNING,)).fetchall()
+        for row in rows:
+            if row["pid"] is None:
+                started_at = datetime.fromisoformat(row["started_at"]) if row["started_at"] else None
+                if started_at is None or (datetime.now() - started_at).total_seconds() > JOB_START_GRACE_SECONDS:
+                    status = JOB_CANCELLED if row["cancel_requested"] else JOB_FAILED
+                    logging.info(f"Job [{row['id']}] was claimed but never started, marking it {status}")
+                    conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                                 (status, "Job process was never started", _now(), row["id"]))
+            elif not _is_process_alive(row["pid"]):
+                status = JOB_CANCELLED if row["cancel_requested"] else JOB_FAILED
+                logging.info(f"Job [{row['id']}] process [{row['pid']}] is gone, marking it {status}")
+                conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                             (status, "Job process exited unexpectedly", _now(), row["id"]))
+
+    def submit(self, job_type: str = TRAINING_JOB, params: dict = None, unique: bool = True) -> dict:
+        """
+        Queues a job and starts it if nothing else is running.
+
+        Args:
+            job_type (str): Name of a registered job target.
+            params (dict): JSON-serializable keyword arguments of the job target.
+            unique (bool): Return the already queued or running job of this type instead of queueing another.
+
+        Returns:
+            dict: The job, with `is_new` telling whether it was queued by this call.
+        """
+        try:
+            conn = self._connect()
+            try:
+                self._transaction(conn)
+                self._reap_dead_jobs(conn)
+                existing = None
+                if unique:
+                    existing = conn.execute(
+                        f"SELECT id FROM jobs WHERE job_type = ? AND status IN ({','.join('?' * len(ACTIVE_JOB_STATES))}) "
+                        "ORDER BY id LIMIT 1", (job_type, *ACTIVE_JOB_STATES)).fetchone()
+                if existing is None:
+                    job_id = conn.execute("INSERT INTO jobs (job_type, params, status, created_at) VALUES (?, ?, ?, ?)",
+                                          (job_type, json.dumps(params or {}), JOB_QUEUED, _now())).lastrowid
+                    logging.info(f"Queued [{job_type}] job [{job_id}]")
+                else:
+                    job_id = existing["id"]
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+            self.dispatch()
+            job = self.get_job(job_id, with_events=False)
+            job["is_new"] = existing is None
+            return job
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def dispatch(self):
+        """
+        Starts the oldest queued job in a new subprocess unless a job is
+        already running.
+
+        Returns:
+            int: Id of the started job, None if nothing was started.
+        """
+        try:
+            conn = self._connect()
+            try:
+                self._transaction(conn)
+                self._reap_dead_jobs(conn)
+                if conn.execute("SELECT 1 FROM jobs WHERE status = ?", (JOB_RUNNING,)).fetchone() is not None:
+                    conn.execute("COMMIT")
+                    return None
+                row = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (JOB_QUEUED,)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                job_id = row["id"]
+                conn.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (JOB_RUNNING, _now(), job_id))
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+
+            log_file_path = os.path.join(self.job_dir, f"job_{job_id}.log")
+            try:
+                with open(log_file_path, "ab") as log_file:
+                    process = subprocess.Popen(
+                        [sys.executable, "-m", "carprice.util.job_runner", "--job-dir", self.job_dir, "--job-id", str(job_id)],
+                        cwd=self.working_dir, stdout=log_file, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                        start_new_session=True)
+            except Exception as e:
+                self._finish(job_id, JOB_FAILED, error=f"Job process could not be started: {e}")
+                raise
+            self._update(job_id, pid=process.pid)
+            # reap the child when it exits so it does not linger as a zombie of the web worker
+            threading.Thread(target=process.wait, daemon=True).start()
+            logging.info(f"Started job [{job_id}] in process [{process.pid}], output: [{log_file_path}]")
+            return job_id
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def cancel(self, job_id: int) -> dict:
+        """
+        Cancels a queued job, or terminates the process group of a running one.
+        """
+        try:
+            conn = self._connect()
+            try:
+                self._transaction(conn)
+                row = conn.execute("SELECT status, pid FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row["status"] == JOB_QUEUED:
+                    conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?",
+                                 (JOB_CANCELLED, _now(), job_id))
+                elif row["status"] == JOB_RUNNING:
+                    conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+
+            if row["status"] == JOB_RUNNING and row["pid"] is not None:
+                logging.info(f"Cancelling job [{job_id}], terminating process group [{row['pid']}]")
+                try:
+                    os.killpg(row["pid"], signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            return self.get_job(job_id)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_job(self, job_id: int, with_events: bool = True):
+        """
+        Returns the job as a dict with its stage events, None if it does not exist.
+        """
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    return None
+                if row["status"] == JOB_RUNNING and (row["pid"] is None or not _is_process_alive(row["pid"])):
+                    self._transaction(conn)
+                    self._reap_dead_jobs(conn)
+                    conn.execute("COMMIT")
+                    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                job = dict(row)
+                job["params"] = json.loads(job["params"])
+                job["cancel_requested"] = bool(job["cancel_requested"])
+                job["total_stages"] = len(JOB_STAGES.get(job["job_type"], ()))
+                job["progress"] = job["stages_completed"] / job["total_stages"] if job["total_stages"] else None
+                if with_events:
+                    job["events"] = [dict(event) for event in conn.execute(
+                        "SELECT created_at, stage, event, message FROM job_events WHERE job_id = ? ORDER BY id",
+                        (job_id,))]
+                return job
+            finally:
+                conn.close()
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def list_jobs(self, limit: int = 50) -> list:
+        """
+        Returns the most recent jobs, newest first, without their events.
+        """
+        try:
+            conn = self._connect()
+            try:
+                job_ids = [row["id"] for row in conn.execute("SELECT id FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+            finally:
+                conn.close()
+            return [self.get_job(job_id, with_events=False) for job_id in job_ids]
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def _update(self, job_id: int, **fields) -> None:
+        conn = self._connect()
+        try:
+            assignments = ", ".join(f"{name} = ?" for name in fields)
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: int, status: str, error: str = None) -> None:
+        self._update(job_id, status=status, error=error, finished_at=_now())
+
+    def add_event(self, job_id: int, stage: str, event: str, message: str = None) -> None:
+        """
+        Records a stage event of a running job and advances its progress.
+
+        Raises:
+            JobCancelled: When cancellation of the job was requested.
+        """
+        conn = self._connect()
+        try:
+            self._transaction(conn)
+            conn.execute("INSERT INTO job_events (job_id, created_at, stage, event, message) VALUES (?, ?, ?, ?, ?)",
+                         (job_id, _now(), stage, event, message))
+            if event == STAGE_COMPLETED:
+                conn.execute("UPDATE jobs SET stage = ?, stages_completed = stages_completed + 1 WHERE id = ?",
+                             (stage, job_id))
+            else:
+                conn.execute("UPDATE jobs SET stage = ? WHERE id = ?", (stage, job_id))
+            cancel_requested = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        if cancel_requested and event == STAGE_STARTED:
+            raise JobCancelled(f"Job [{job_id}] was cancelled")
+
+    def run_job(self, job_id: int) -> None:
+        """
+        Body of a job process: runs the job target, records the outcome and
+        starts the next queued job.
+        """
+        global _active_job
+        job = self.get_job(job_id, with_events=False)
+        self._update(job_id, pid=os.getpid())
+
+        def on_sigterm(signum, frame):
+            raise JobCancelled(f"Job [{job_id}] was cancelled")
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+        _active_job = (self, job_id)
+        try:
+            logging.info(f"Running [{job['job_type']}] job [{job_id}] with params: {job['params']}")
+            JOB_TARGETS[job["job_type"]](**job["params"])
+            self._finish(job_id, JOB_SUCCEEDED)
+            logging.info(f"Job [{job_id}] succeeded")
+        except JobCancelled as e:
+            self._finish(job_id, JOB_CANCELLED, error=str(e))
+            logging.info(f"Job [{job_id}] cancelled")
+        except BaseException as e:
+            self._finish(job_id, JOB_FAILED, error=str(e))
+            logging.exception(e)
+        finally:
+            _active_job = None
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            self.dispatch()
+
+
+# runner and id of the job executing in this process, set only inside job processes
+_active_job = None
+
+
+def get_active_job():
+    """
+    Returns the `(runner, job_id)` of the job running in this process, None outside of job processes.
+    """
+    return _active_job
+
+
+def set_active_job(active_job) -> None:
+    """
+    Attaches this process to a job, so worker processes of a job report its progress.
+    """
+    global _active_job
+    _active_job = active_job
+
+
+def report_progress(stage: str, event: str, message: str = None) -> None:
+    """
+    Records a stage event for the job running in this process; a no-op
+    outside of job processes.
+
+    Raises:
+        JobCancelled: On a `started` event of a job whose cancellation was requested.
+    """
+    if _active_job is None:
+        return
+    runner, job_id = _active_job
+    try:
+        runner.add_event(job_id, stage, event, message)
+    except sqlite3.Error as e:
+        logging.info(f"Could not record progress of job [{job_id}]: {e}")
+
+
+def track_stage(stage: str):
+    """
+    Decorator reporting start, completion and failure of a pipeline stage to
+    the job running in this process, and profiling the stage.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            report_progress(stage, STAGE_STARTED)
+            start_time = time.monotonic()
+            try:
+                with profile_span(stage):
+                    result = func(*args, **kwargs)
+            except Exception as e:
+                report_progress(stage, STAGE_FAILED, str(e))
+                raise
+            report_progress(stage, STAGE_COMPLETED, f"took {time.monotonic() - start_time:.1f}s")
+            return result
+        return wrapper
+    return decorator
+
+
+def run_training(time_stamp: str = None) -> None:
+    from carprice.config.configuration import ConfigurationManager
+    from carprice.constant import generate_timestamp, EXPERIMENT_DIR_NAME, EXPERIMENT_FILE_NAME
+    from carprice.pipeline.pipeline import TrainingPipeline
+    from carprice.util.experiment_store import track_experiment
+
+    time_stamp = generate_timestamp() if time_stamp is None else time_stamp
+    set_run_id(time_stamp)
+    config = ConfigurationManager(timestamp=time_stamp)
+    set_metrics_file(config.get_stage_metrics_file_path())
+    experiment_store = config.get_experiment_store()
+    with track_experiment(experiment_store, time_stamp):
+        pipeline = TrainingPipeline(config=config)
+        pipeline.run_pipeline()
+    # the pipeline still appends its accuracy to experiment.csv, merge it into the store
+    experiment_store.import_csv(os.path.join(config.pipeline_config.artifact_dir, EXPERIMENT_DIR_NAME,
+                                             EXPERIMENT_FILE_NAME))
+
+
+def run_training_dag(time_stamp: str = None) -> None:
+    from carprice.util.training_dag import run_training_dag as run_dag
+
+    run_dag(time_stamp=time_stamp)
+
+
+JOB_TARGETS = {
+    TRAINING_JOB: run_training,
+    TRAINING_DAG_JOB: run_training_dag,
+}
+
+JOB_STAGES = {
+    TRAINING_JOB: (DATA_INGESTION_ARTIFACT_DIR, DATA_VALIDATION_ARTIFACT_DIR, DATA_TRANSFORMATION_ARTIFACT_DIR,
+                   MODEL_TRAINER_ARTIFACT_DIR, MODEL_EVALUATION_ARTIFACT_DIR, MODEL_PUSHER_ARTIFACT_DIR),
+    TRAINING_DAG_JOB: (DATA_INGESTION_ARTIFACT_DIR, DATA_VALIDATION_ARTIFACT_DIR, DATA_DRIFT_STAGE_NAME,
+                       DATA_TRANSFORMATION_ARTIFACT_DIR, MODEL_TRAINER_ARTIFACT_DIR, MODEL_EVALUATION_ARTIFACT_DIR,
+                       MODEL_PUSHER_ARTIFACT_DIR),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runs one queued carprice job.")
+    parser.add_argument("--job-dir", required=True, help="Directory holding the job database.")
+    parser.add_argument("--job-id", required=True, type=int, help="Id of the job to run.")
+    args = parser.parse_args()
+    JobRunner(job_dir=args.job_dir).run_job(args.job_id)
+
+
+if __name__ == "__main__":
+    # run through the package module, so track_stage in the components sees the active job
+    from carprice.util.job_runner import main as run_main
+    run_main()
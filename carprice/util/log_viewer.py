@@ -0,0 +1,240 @@
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from carprice.exception import CarException
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# lines read per seek when walking backwards through a filtered log
+SCAN_BLOCK_LINES = 2000
+INDEX_CHUNK_SIZE = 16 * 2 ** 20
+MAX_CACHED_INDEXES = 8
+# field separator of the plain text log format: [asctime]^;levelname^;lineno^;filename^;funcName()^;message
+PLAIN_LOG_SEPARATOR = "^;"
+PLAIN_LOG_FIELDS = ["timestamp", "level", "line_number", "file_name", "function_name", "message"]
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+_LEVEL_PATTERN = re.compile(r"\b(" + "|".join(LOG_LEVELS) + r")\b")
+
+
+def parse_log_line(line: str) -> dict:
+    """
+    Splits a log line into its fields. JSON lines and the `^;` separated
+    text format are parsed; any other line, such as a traceback line, is
+    kept as a message with the level found in it, if any.
+    """
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+            if isinstance(record, dict):
+                return record
+        except ValueError:
+            pass
+    if PLAIN_LOG_SEPARATOR in line:
+        values = line.split(PLAIN_LOG_SEPARATOR, len(PLAIN_LOG_FIELDS) - 1)
+        if len(values) == len(PLAIN_LOG_FIELDS):
+            record = dict(zip(PLAIN_LOG_FIELDS, values))
+            record["timestamp"] = record["timestamp"].strip("[]")
+            return record
+    match = _LEVEL_PATTERN.search(line[:200])
+    return {"level": match.group(1) if match else None, "message": line}
+
+
+def get_record_component(record: dict) -> str:
+    """
+    Returns the component a log record comes from: its logger or module name,
+    else the source file without extension. The root logger is no component,
+    its records are attributed to their module.
+    """
+    for key in ("component", "logger", "module"):
+        if record.get(key) and record[key] != "root":
+            return str(record[key])
+    file_name = record.get("file_name") or record.get("filename")
+    return os.path.splitext(file_name)[0] if file_name else None
+
+
+class LogIndex:
+    """
+    Byte offsets of the lines of a log file, so any range of lines is read
+    with a single seek.
+
+    The index covers complete lines only and is extended incrementally as
+    the file grows; a file that shrank or was replaced (log rotation) is
+    indexed again from the start.
+    """
+
+    def __init__(self, log_file_path: str) -> None:
+        self.log_file_path = log_file_path
+        # start offset of every line, followed by the end offset of the last complete line
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """
+        Indexes the lines appended since the last refresh.
+        """
+        with self._lock:
+            stat = os.stat(self.log_file_path)
+            indexed_size = int(self.offsets[-1])
+            if stat.st_ino != self._inode or stat.st_size < indexed_size:
+                self.offsets = np.zeros(1, dtype=np.int64)
+                self._inode = stat.st_ino
+                indexed_size = 0
+            if stat.st_size == indexed_size:
+                return
+            new_offsets = []
+            with open(self.log_file_path, "rb") as log_file:
+                log_file.seek(indexed_size)
+                position = indexed_size
+                while True:
+                    chunk = log_file.read(INDEX_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10)
+                    new_offsets.append(newlines.astype(np.int64) + position + 1)
+                    position += len(chunk)
+            if new_offsets:
+                self.offsets = np.concatenate([self.offsets] + new_offsets)
+
+    @property
+    def n_lines(self) -> int:
+        return len(self.offsets) - 1
+
+    def read_lines(self, start: int, stop: int) -> list:
+        """
+        Returns the lines `start` to `stop` (exclusive) without their line breaks.
+        """
+        start = max(0, min(start, self.n_lines))
+        stop = max(start, min(stop, self.n_lines))
+        if start == stop:
+            return []
+        with open(self.log_file_path, "rb") as log_file:
+            log_file.seek(int(self.offsets[start]))
+            data = log_file.read(int(self.offsets[stop] - self.offsets[start]))
+        return data.decode("utf-8", errors="replace").splitlines()
+
+
+class LogViewer:
+    """
+    Pages through the log files of `log_dir` without reading them whole.
+
+    Unfiltered pages are read straight from the line index. Filtered pages
+    walk backwards from a cursor in blocks of lines until the page is full,
+    so their cost depends on how many lines are skipped, not on the file size.
+    """
+
+    def __init__(self, log_dir: str, max_cached_indexes: int = MAX_CACHED_INDEXES) -> None:
+        """
+        Args:
+            log_dir (str): Directory the viewable log files are in.
+            max_cached_indexes (int): Log file indexes kept in memory.
+        """
+        try:
+            self.log_dir = os.path.realpath(log_dir)
+            self.max_cached_indexes = max_cached_indexes
+            self._indexes = OrderedDict()
+            self._lock = threading.Lock()
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_index(self, log_file_path: str) -> LogIndex:
+        """
+        Returns the refreshed line index of a log file inside `log_dir`.
+        """
+        try:
+            real_path = os.path.realpath(log_file_path)
+            if os.path.commonpath([real_path, self.log_dir]) != self.log_dir or not os.path.isfile(real_path):
+                raise FileNotFoundError(f"No log file [{log_file_path}] in [{self.log_dir}]")
+            with self._lock:
+                log_index = self._indexes.pop(real_path, None) or LogIndex(real_path)
+                self._indexes[real_path] = log_index
+                while len(self._indexes) > self.max_cached_indexes:
+                    self._indexes.popitem(last=False)
+            log_index.refresh()
+            return log_index
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    @staticmethod
+    def _matches(record: dict, level: str = None, component: str = None) -> bool:
+        if level is not None and str(record.get("level", "")).upper() != level:
+            return False
+        if component is not None and component not in str(get_record_component(record) or ""):
+            return False
+        return True
+
+    def get_page(self, log_file_path: str, page: int = None, page_size: int = DEFAULT_PAGE_SIZE,
+                 level: str = None, component: str = None, before: int = None) -> dict:
+        """
+        Reads one page of parsed log records, oldest first within the page.
+
+        Args:
+            log_file_path (str): Log file inside `log_dir`.
+            page (int): 1-based page of an unfiltered view, defaults to the last page.
+            page_size (int): Records per page.
+            level (str): Only records of this level, e.g. `ERROR`.
+            component (str): Only records whose logger, module or file name contains this.
+            before (int): Line number cursor of a filtered view; records before this line, defaults to the end.
+
+        Returns:
+            dict: `records` (each with its `line` number) and the paging fields of the view.
+        """
+        try:
+            page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+            level = level.upper() if level else None
+            log_index = self.get_index(log_file_path)
+            n_lines = log_index.n_lines
+
+            if level is None and not component:
+                n_pages = max(1, -(-n_lines // page_size))
+                page = n_pages if page is None else max(1, min(int(page), n_pages))
+                start = (page - 1) * page_size
+                lines = log_index.read_lines(start, start + page_size)
+                records = [{"line": start + offset + 1, **parse_log_line(line)} for offset, line in enumerate(lines)]
+                return {"records": records, "page": page, "n_pages": n_pages, "page_size": page_size,
+                        "n_lines": n_lines}
+
+            stop = n_lines if before is None else max(0, min(int(before), n_lines))
+            records = []
+            while stop > 0 and len(records) < page_size:
+                start = max(0, stop - SCAN_BLOCK_LINES)
+                lines = log_index.read_lines(start, stop)
+                block = [{"line": start + offset + 1, **parse_log_line(line)} for offset, line in enumerate(lines)]
+                matching = [record for record in block if self._matches(record, level, component)]
+                needed = page_size - len(records)
+                if len(matching) > needed:
+                    matching = matching[-needed:]
+                    stop = matching[0]["line"] - 1
+                else:
+                    stop = start
+                records = matching + records
+            return {"records": records, "page_size": page_size, "n_lines": n_lines, "level": level,
+                    "component": component, "before": stop if stop > 0 else None}
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def tail(self, log_file_path: str, after_line: int = None, max_lines: int = MAX_PAGE_SIZE) -> dict:
+        """
+        Returns the records appended after line `after_line`, for following a
+        log as it is written; without `after_line` the last `max_lines` records.
+
+        Returns:
+            dict: `records` and `last_line`, the cursor of the next call.
+        """
+        try:
+            log_index = self.get_index(log_file_path)
+            n_lines = log_index.n_lines
+            if after_line is None:
+                start = max(0, n_lines - max_lines)
+            else:
+                # a rotated log restarts from line 0, so a cursor past its end starts over
+                start = int(after_line) if int(after_line) <= n_lines else 0
+            lines = log_index.read_lines(start, start + max_lines)
+            records = [{"line": start + offset + 1, **parse_log_line(line)} for offset, line in enumerate(lines)]
+            return {"records": records, "last_line": start + len(lines)}
+        except Exception as e:
+            raise CarException(e, sys) from e
@@ -0,0 +1,73 @@
+import numpy as np
+
+# keys of the metrics dict, matching the ModelTrainerArtifact fields
+TRAIN_RMSE_KEY = "train_rmse"
+TEST_RMSE_KEY = "test_rmse"
+TRAIN_ACCURACY_KEY = "train_accuracy"
+TEST_ACCURACY_KEY = "test_accuracy"
+MODEL_ACCURACY_KEY = "model_accuracy"
+# a model whose train and test R2 differ by this much or more is considered overfit
+MAX_TRAIN_TEST_ACCURACY_GAP = 0.05
+
+
+def r2_score(y_true, y_pred) -> float:
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    total_sum_of_squares = np.sum((y_true - y_true.mean()) ** 2)
+    if total_sum_of_squares == 0:
+        return 0.0
+    return float(1.0 - np.sum((y_true - y_pred) ** 2) / total_sum_of_squares)
+
+
+def rmse(y_true, y_pred) -> float:
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    return float(np.sqrt(np.mean((y_true - y_pred) ** 2)))
+
+
+def get_regression_metrics(y_train, train_prediction, y_test, test_prediction) -> dict:
+    """
+    Computes the train/test RMSE and R2 of a model from its predictions.
+    The model accuracy is the harmonic mean of the train and test R2, so a
+    model that overfits the train split scores low.
+
+    Returns:
+        dict: `train_rmse`, `test_rmse`, `train_accuracy`, `test_accuracy` and `model_accuracy`.
+    """
+    train_accuracy = r2_score(y_train, train_prediction)
+    test_accuracy = r2_score(y_test, test_prediction)
+    accuracy_sum = train_accuracy + test_accuracy
+    model_accuracy = 2 * train_accuracy * test_accuracy / accuracy_sum if accuracy_sum > 0 else 0.0
+    return {
+        TRAIN_RMSE_KEY: rmse(y_train, train_prediction),
+        TEST_RMSE_KEY: rmse(y_test, test_prediction),
+        TRAIN_ACCURACY_KEY: train_accuracy,
+        TEST_ACCURACY_KEY: test_accuracy,
+        MODEL_ACCURACY_KEY: model_accuracy,
+    }
+
+
+def is_model_acceptable(metrics: dict, base_accuracy: float) -> bool:
+    """
+    The acceptance gate of `evaluate_regression_model`: the model accuracy
+    reaches `base_accuracy` and the train/test accuracy gap shows no overfitting.
+    """
+    accuracy_gap = abs(metrics[TEST_ACCURACY_KEY] - metrics[TRAIN_ACCURACY_KEY])
+    return metrics[MODEL_ACCURACY_KEY] >= base_accuracy and accuracy_gap < MAX_TRAIN_TEST_ACCURACY_GAP
+
+
+def select_model(metrics_list: list, base_accuracy: float):
+    """
+    Picks a model the way `evaluate_regression_model` does: walking the
+    models in order, each one passing the gate raises the bar to its own
+    accuracy, and the last one to pass wins.
+
+    Returns:
+        int: Index of the selected model, None when no model passes the gate.
+    """
+    selected_index = None
+    for index, metrics in enumerate(metrics_list):
+        if is_model_acceptable(metrics, base_accuracy):
+            base_accuracy = metrics[MODEL_ACCURACY_KEY]
+            selected_index = index
+    return selected_index
@@ -0,0 +1,163 @@
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+import pandas as pd
+from carprice.exception import CarException
+from carprice.logger import logging
+from carprice.util.util import load_object
+
+LoadedModel = namedtuple("LoadedModel", ["model_path", "model"])
+
+
+def predict_model_records(model, records):
+    """
+    Scores plain record dicts with a model, through its compiled feature plan
+    when it has one, else through a DataFrame.
+    """
+    try:
+        if hasattr(model, "predict_records"):
+            return model.predict_records(records)
+        return model.predict(pd.DataFrame.from_records(records))
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of the newest exported model.
+
+    The model is loaded once and kept in memory. At most once every
+    `poll_interval` seconds the export directory mtime is checked; when
+    `ModelPusher` adds a new timestamped folder the newest model is loaded
+    in the background of the current request and swapped in with a single
+    reference assignment, so requests already holding the previous model
+    finish with it undisturbed.
+    """
+
+    def __init__(self, model_dir: str, poll_interval: float = 5.0) -> None:
+        """
+        Args:
+            model_dir (str): Directory containing timestamped model folders.
+            poll_interval (float): Minimum seconds between export directory checks.
+        """
+        try:
+            self.model_dir = model_dir
+            self.poll_interval = poll_interval
+            self._current = None
+            self._dir_mtime = None
+            self._last_check = 0.0
+            self._reload_lock = threading.Lock()
+            # get_model calls answered with the model already in memory / that loaded a model or failed to
+            self.cache_hits = 0
+            self.cache_misses = 0
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_latest_model_path(self):
+        """
+        Returns the model file inside the newest timestamped folder, or None
+        if no complete export is available yet.
+        """
+        try:
+            if not os.path.isdir(self.model_dir):
+                return None
+            folder_names = [name for name in os.listdir(self.model_dir) if name.isdigit()]
+            if len(folder_names) == 0:
+                return None
+            latest_model_dir = os.path.join(self.model_dir, max(folder_names, key=int))
+            file_names = [name for name in os.listdir(latest_model_dir) if name.endswith(".pkl")]
+            if len(file_names) == 0:
+                return None
+            return os.path.join(latest_model_dir, file_names[0])
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def _is_stale(self) -> bool:
+        now = time.monotonic()
+        if self._current is not None and now - self._last_check < self.poll_interval:
+            return False
+        self._last_check = now
+        try:
+            dir_mtime = os.stat(self.model_dir).st_mtime_ns
+        except FileNotFoundError:
+            return self._current is None
+        return self._current is None or dir_mtime != self._dir_mtime
+
+    def refresh(self) -> bool:
+        """
+        Loads the newest model if it differs from the cached one. Only one
+        thread reloads at a time; the others keep serving the cached model.
+        Returns True if a model was loaded.
+        """
+        return self._refresh()[0]
+
+    def _refresh(self) -> tuple:
+        # (is_loaded, is_failed)
+        try:
+            blocking = self._current is None
+            if not self._reload_lock.acquire(blocking=blocking):
+                return False, False
+            try:
+                dir_mtime = os.stat(self.model_dir).st_mtime_ns if os.path.isdir(self.model_dir) else None
+                model_path = self.get_latest_model_path()
+                if model_path is None:
+                    return False, False
+                is_loaded = False
+                current = self._current
+                if current is None or current.model_path != model_path:
+                    logging.info(f"Loading model: [{model_path}]")
+                    self._current = LoadedModel(model_path=model_path, model=load_object(file_path=model_path))
+                    logging.info(f"Model [{model_path}] is now serving predictions")
+                    is_loaded = True
+                self._dir_mtime = dir_mtime
+                return is_loaded, False
+            finally:
+                self._reload_lock.release()
+        except Exception as e:
+            if self._current is None:
+                raise CarException(e, sys) from e
+            logging.exception(f"Model reload failed, keeping [{self._current.model_path}]: {e}")
+            return False, True
+
+    def get_model(self):
+        """
+        Returns the cached model, loading or hot-swapping it first if a newer
+        export is present. Returns None if no model has been exported yet.
+        """
+        is_loaded, is_failed = self._refresh() if self._is_stale() else (False, False)
+        current = self._current
+        if current is None:
+            return None
+        if is_loaded or is_failed:
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+        return current.model
+
+    def get_model_path(self):
+        """
+        Returns the file path of the model currently cached, without checking
+        for a newer export.
+        """
+        current = self._current
+        return None if current is None else current.model_path
+
+    def predict(self, X):
+        try:
+            model = self.get_model()
+            if model is None:
+                raise Exception(f"No model found in [{self.model_dir}]")
+            return model.predict(X)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def predict_records(self, records):
+        try:
+            model = self.get_model()
+            if model is None:
+                raise Exception(f"No model found in [{self.model_dir}]")
+            return predict_model_records(model, records)
+        except Exception as e:
+            raise CarException(e, sys) from e
@@ -0,0 +1,51 @@
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+
+CONTINUOUS_COLUMN_MIN_UNIQUE = 25
+IQR_WHISKER = 1.5
+
+
+class OutlierCapper(BaseEstimator, TransformerMixin):
+    """
+    Caps continuous columns to the IQR fences learnt on the training data.
+
+    All quartiles are computed with one vectorized quantile call in `fit` and
+    applied with a single `np.clip`, so the same limits are reused for test
+    data and at inference time. Columns with fewer than `min_unique` distinct
+    values are left untouched.
+    """
+
+    def __init__(self, min_unique: int = CONTINUOUS_COLUMN_MIN_UNIQUE, whisker: float = IQR_WHISKER):
+        self.min_unique = min_unique
+        self.whisker = whisker
+
+    def fit(self, X, y=None):
+        values = np.asarray(X, dtype=np.float64)
+        sorted_values = np.sort(values, axis=0)
+        n_unique = 1 + (np.diff(sorted_values, axis=0) != 0).sum(axis=0)
+        percentile25, percentile75 = np.nanquantile(values, [0.25, 0.75], axis=0)
+        return self.set_limits_from_quantiles(percentile25, percentile75, n_unique, X)
+
+    def set_limits_from_quantiles(self, percentile25, percentile75, n_unique, X=None):
+        """
+        Sets the capping limits from precomputed quartiles and distinct counts,
+        e.g. from streaming sketches.
+        """
+        percentile25 = np.asarray(percentile25, dtype=np.float64)
+        percentile75 = np.asarray(percentile75, dtype=np.float64)
+        is_continuous = np.asarray(n_unique) >= self.min_unique
+        iqr = percentile75 - percentile25
+        self.lower_limits_ = np.where(is_continuous, percentile25 - self.whisker * iqr, -np.inf)
+        self.upper_limits_ = np.where(is_continuous, percentile75 + self.whisker * iqr, np.inf)
+        self.n_features_in_ = len(self.lower_limits_)
+        if hasattr(X, "columns"):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        return self
+
+    def transform(self, X):
+        return np.clip(np.asarray(X, dtype=np.float64), self.lower_limits_, self.upper_limits_)
+
+    def get_feature_names_out(self, input_features=None):
+        if input_features is None:
+            input_features = getattr(self, "feature_names_in_", None)
+        return np.asarray(input_features, dtype=object)
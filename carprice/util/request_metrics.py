@@ -0,0 +1,290 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from carprice.exception import CarException
+from carprice.logger import logging
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_STATE_FILE_PATTERN = "request_metrics_*.json"
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+REQUEST_DURATION = "carprice_http_request_duration_seconds"
+REQUESTS_IN_FLIGHT = "carprice_http_requests_in_flight"
+PREDICT_PHASE_DURATION = "carprice_predict_phase_duration_seconds"
+MODEL_CACHE_HITS = "carprice_model_cache_hits_total"
+MODEL_CACHE_MISSES = "carprice_model_cache_misses_total"
+
+METRICS = {
+    REQUEST_DURATION: (HISTOGRAM, "Request latency by route, method and status."),
+    REQUESTS_IN_FLIGHT: (GAUGE, "Requests being served."),
+    PREDICT_PHASE_DURATION: (HISTOGRAM, "Latency of the phases of a price prediction."),
+    MODEL_CACHE_HITS: (COUNTER, "Model lookups served from the in-memory model cache."),
+    MODEL_CACHE_MISSES: (COUNTER, "Model lookups that had to load a model from disk."),
+}
+
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels) + "}"
+
+
+def _get_key(name: str, labels) -> tuple:
+    return name, tuple(tuple(label) for label in labels)
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class RequestMetrics:
+    """
+    Request latency histograms, counters and gauges of the web app, exposed
+    in the Prometheus text format.
+
+    Every worker process keeps its own counters in memory; recording is a
+    bisect and a few list updates under a lock. A background thread flushes
+    them to `state_dir`, and `render` adds up the flushed state of every
+    worker, so `/metrics` reports the whole server whichever worker answers.
+    Counters and histograms of workers that exited are kept so that totals
+    never go backwards; gauges only count workers that are still alive.
+    """
+
+    def __init__(self, state_dir: str, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 buckets: tuple = DEFAULT_LATENCY_BUCKETS) -> None:
+        """
+        Args:
+            state_dir (str): Directory the metrics of each worker process are flushed to.
+            flush_interval (float): Seconds between two flushes.
+            buckets (tuple): Upper bounds of the latency histogram buckets, in seconds.
+        """
+        try:
+            self.state_dir = state_dir
+            self.flush_interval = flush_interval
+            self.buckets = tuple(sorted(buckets))
+            self._lock = threading.Lock()
+            self._histograms = {}
+            self._counters = {}
+            self._gauges = {}
+            self._counter_sources = []
+            self._pid = None
+            self._flush_thread = None
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    @property
+    def state_file_path(self) -> str:
+        return os.path.join(self.state_dir, METRICS_STATE_FILE_PATTERN.replace("*", str(os.getpid())))
+
+    def _check_fork(self) -> None:
+        # a worker forked from a process that already recorded starts from empty counters
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._histograms = {}
+            self._counters = {}
+            self._gauges = {}
+            self._flush_thread = None
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """
+        Adds an observation to a histogram.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        bucket_index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._check_fork()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # one count per bucket plus +Inf, then the sum
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[bucket_index] += 1
+            histogram[-1] += seconds
+        self._start_flush_thread()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._start_flush_thread()
+
+    def add_gauge(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """
+        Observes the duration of the block in the histogram `name`.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def add_counter_source(self, name: str, get_value) -> None:
+        """
+        Reports a counter kept elsewhere, e.g. by the model registry; `get_value`
+        returns its current value in this process.
+        """
+        self._counter_sources.append((name, get_value))
+
+    def init_app(self, app) -> None:
+        """
+        Times every request of a Flask app and tracks the requests in flight.
+        """
+        from flask import g, request
+
+        @app.before_request
+        def start_request_timer():
+            g.request_start_time = time.perf_counter()
+            self.add_gauge(REQUESTS_IN_FLIGHT, 1)
+
+        @app.after_request
+        def record_response_status(response):
+            g.response_status = response.status_code
+            return response
+
+        @app.teardown_request
+        def stop_request_timer(exception=None):
+            start_time = g.pop("request_start_time", None)
+            if start_time is None:
+                return
+            self.add_gauge(REQUESTS_IN_FLIGHT, -1)
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            status = g.pop("response_status", 500 if exception is not None else 200)
+            self.observe(REQUEST_DURATION, time.perf_counter() - start_time,
+                         route=route, method=request.method, status=str(status))
+
+    def _start_flush_thread(self) -> None:
+        if self._flush_thread is None:
+            self._flush_thread = threading.Thread(target=self._flush_loop, name="request-metrics-flush", daemon=True)
+            self._flush_thread.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.exception(f"Request metrics flush failed: {e}")
+
+    def _serialize_state(self) -> dict:
+        source_counters = [[name, [], get_value()] for name, get_value in self._counter_sources]
+        with self._lock:
+            self._check_fork()
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            return {
+                "pid": os.getpid(),
+                "updated_at": time.time(),
+                "buckets": list(self.buckets),
+                "histograms": [[name, list(labels), list(histogram)]
+                               for (name, labels), histogram in self._histograms.items()],
+                "counters": counters + source_counters,
+                "gauges": [[name, list(labels), value] for (name, labels), value in self._gauges.items()],
+            }
+
+    def flush(self) -> None:
+        """
+        Writes the metrics of this process to its state file.
+        """
+        try:
+            state = self._serialize_state()
+            os.makedirs(self.state_dir, exist_ok=True)
+            state_file_path = self.state_file_path
+            partial_file_path = f"{state_file_path}.partial"
+            with open(partial_file_path, "w") as state_file:
+                json.dump(state, state_file)
+            os.replace(partial_file_path, state_file_path)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def _load_states(self) -> list:
+        states = [self._serialize_state()]
+        own_state_file_path = self.state_file_path
+        for state_file_path in glob.glob(os.path.join(self.state_dir, METRICS_STATE_FILE_PATTERN)):
+            if state_file_path == own_state_file_path:
+                continue
+            try:
+                with open(state_file_path, "r") as state_file:
+                    states.append(json.load(state_file))
+            except (OSError, ValueError) as e:
+                logging.info(f"Skipping unreadable metrics state [{state_file_path}]: {e}")
+        return states
+
+    def render(self) -> str:
+        """
+        Returns the metrics of every worker process in the Prometheus text format.
+        """
+        try:
+            histograms = {}
+            counters = {}
+            gauges = {}
+            for state in self._load_states():
+                if state["buckets"] == list(self.buckets):
+                    for name, labels, histogram in state["histograms"]:
+                        merged = histograms.setdefault(_get_key(name, labels), [0] * len(histogram))
+                        for index, value in enumerate(histogram):
+                            merged[index] += value
+                for name, labels, value in state["counters"]:
+                    key = _get_key(name, labels)
+                    counters[key] = counters.get(key, 0) + value
+                if state["pid"] == os.getpid() or _is_process_alive(state["pid"]):
+                    for name, labels, value in state["gauges"]:
+                        key = _get_key(name, labels)
+                        gauges[key] = gauges.get(key, 0) + value
+
+            lines = []
+            for name, (metric_type, help_text) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                if metric_type == HISTOGRAM:
+                    for (metric_name, labels), histogram in sorted(histograms.items()):
+                        if metric_name != name:
+                            continue
+                        cumulative_count = 0
+                        for upper_bound, count in zip(self.buckets + ("+Inf",), histogram[:-1]):
+                            cumulative_count += count
+                            bucket_labels = labels + (("le", upper_bound if upper_bound == "+Inf" else
+                                                       _format_value(upper_bound)),)
+                            lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative_count}")
+                        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram[-1])}")
+                        lines.append(f"{name}_count{_format_labels(labels)} {cumulative_count}")
+                else:
+                    values = counters if metric_type == COUNTER else gauges
+                    samples = sorted((labels, value) for (metric_name, labels), value in values.items()
+                                     if metric_name == name)
+                    if metric_type == GAUGE and not samples:
+                        samples = [((), 0)]
+                    for labels, value in samples:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            return "\n".join(lines) + "\n"
+        except Exception as e:
+            raise CarException(e, sys) from e
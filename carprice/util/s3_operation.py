@@ -1,8 +1,40 @@
-import boto3
+import hashlib
+import json
+import os
+import shutil
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.config import Config
 from carprice.exception import CarException
 from carprice.logger import logging
 
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_WORKERS = 8
+STREAM_BLOCK_SIZE = 1024 * 1024
+PARTIAL_FILE_SUFFIX = ".partial"
+PROGRESS_FILE_SUFFIX = ".progress"
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Returns the process-wide S3 client. boto3 clients are thread-safe, so a
+    single client and its connection pool are shared by every download.
+    The endpoint can be pointed at a local S3 stand-in such as MinIO with
+    the `AWS_ENDPOINT_URL_S3` environment variable.
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client('s3', config=Config(max_pool_connections=DEFAULT_MAX_WORKERS * 2,
+                                                              retries={'max_attempts': 5, 'mode': 'adaptive'}))
+    return _s3_client
+
 
 def download_file_from_s3(bucket_name: str, object_key: str, local_file_path: str) -> None:
     """
@@ -17,8 +49,8 @@ def download_file_from_s3(bucket_name: str, object_key: str, local_file_path: st
         CarException: If an error occurs during the download process.
     """
     try:
-        # Initialize the S3 client
-        s3_client = boto3.client('s3')
+        # Reuse the pooled S3 client
+        s3_client = get_s3_client()
         
         # Log the start of the download process
         logging.info(f"Initiating download from S3 bucket: {bucket_name}, Object Key: {object_key}")
@@ -32,4 +64,130 @@ def download_file_from_s3(bucket_name: str, object_key: str, local_file_path: st
     except Exception as e:
         # Raise a custom exception with detailed error information
         logging.error(f"Error occurred while downloading file from S3: {e}")
-        raise CarException(e, sys) from e
\ No newline at end of file
+        raise CarException(e, sys) from e
+
+
+def get_s3_object_etag(bucket_name: str, object_key: str) -> str:
+    """
+    Fetches the ETag of an S3 object without downloading it.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket.
+        object_key (str): Key (path) of the object in the S3 bucket.
+
+    Returns:
+        str: ETag of the object, which changes whenever its content changes.
+
+    Raises:
+        CarException: If the object metadata can not be fetched.
+    """
+    try:
+        s3_client = get_s3_client()
+        response = s3_client.head_object(Bucket=bucket_name, Key=object_key)
+        return response['ETag']
+    except Exception as e:
+        logging.error(f"Error occurred while fetching metadata of S3 object {object_key}: {e}")
+        raise CarException(e, sys) from e
+
+
+def _download_part(s3_client, bucket_name: str, object_key: str, etag: str, partial_file_path: str,
+                   start: int, end: int) -> None:
+    # IfMatch fails the part instead of mixing two versions of the object
+    response = s3_client.get_object(Bucket=bucket_name, Key=object_key, Range=f"bytes={start}-{end}", IfMatch=etag)
+    with open(partial_file_path, "r+b") as partial_file:
+        partial_file.seek(start)
+        for block in response['Body'].iter_chunks(chunk_size=STREAM_BLOCK_SIZE):
+            partial_file.write(block)
+
+
+def _read_progress(progress_file_path: str, etag: str, size: int) -> set:
+    """
+    Returns the start offsets of the parts already downloaded, empty if the
+    progress belongs to another version of the object.
+    """
+    if not os.path.exists(progress_file_path):
+        return set()
+    with open(progress_file_path, "r") as progress_file:
+        header = json.loads(progress_file.readline() or "{}")
+        if header.get("etag") != etag or header.get("size") != size:
+            return set()
+        # one completed part offset per line; a torn last line is ignored
+        return {int(line) for line in progress_file.read().split("\n") if line.strip().isdigit()}
+
+
+def download_from_s3(bucket_name: str, object_name: str, filename: str, cache_dir: str = None,
+                     part_size: int = DEFAULT_PART_SIZE, max_workers: int = DEFAULT_MAX_WORKERS) -> str:
+    """
+    Downloads an S3 object with parallel ranged requests.
+
+    The object is fetched into `cache_dir` under a name derived from its
+    bucket, key and ETag, so an unchanged object is downloaded only once and
+    then copied from the cache. Without `cache_dir` it is downloaded straight
+    to `filename`. Every completed part is recorded next to the partial file
+    and an interrupted download resumes with the missing parts.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket.
+        object_name (str): Key (path) of the object in the S3 bucket.
+        filename (str): Local path where the file will be saved.
+        cache_dir (str): Directory of downloaded objects shared across runs, never the directory of `filename`.
+        part_size (int): Bytes per ranged request.
+        max_workers (int): Number of parts downloaded concurrently.
+
+    Returns:
+        str: `filename`
+
+    Raises:
+        CarException: If the object can not be downloaded.
+    """
+    try:
+        s3_client = get_s3_client()
+        response = s3_client.head_object(Bucket=bucket_name, Key=object_name)
+        etag, size = response['ETag'], response['ContentLength']
+
+        if cache_dir is None:
+            cached_file_path = os.path.abspath(filename)
+        else:
+            os.makedirs(cache_dir, exist_ok=True)
+            cache_key = hashlib.sha256(f"{bucket_name}/{object_name}/{etag}".encode("utf-8")).hexdigest()
+            cached_file_path = os.path.join(cache_dir, f"{cache_key}{os.path.splitext(object_name)[1]}")
+        os.makedirs(os.path.dirname(cached_file_path), exist_ok=True)
+
+        if cache_dir is not None and os.path.exists(cached_file_path):
+            logging.info(f"S3 object {bucket_name}/{object_name} [{etag}] is cached at [{cached_file_path}]")
+        else:
+            partial_file_path = cached_file_path + PARTIAL_FILE_SUFFIX
+            progress_file_path = cached_file_path + PROGRESS_FILE_SUFFIX
+            completed_parts = _read_progress(progress_file_path, etag, size) if os.path.exists(partial_file_path) else set()
+            if len(completed_parts) == 0:
+                with open(partial_file_path, "wb") as partial_file:
+                    partial_file.truncate(size)
+                with open(progress_file_path, "w") as progress_file:
+                    progress_file.write(json.dumps({"etag": etag, "size": size}) + "\n")
+
+            part_starts = [start for start in range(0, size, part_size) if start not in completed_parts]
+            logging.info(f"Downloading {bucket_name}/{object_name} [{size}] bytes: [{len(part_starts)}] parts "
+                         f"on [{max_workers}] threads, [{len(completed_parts)}] parts resumed")
+            progress_lock = threading.Lock()
+
+            def download_part(start: int) -> None:
+                _download_part(s3_client, bucket_name, object_name, etag, partial_file_path,
+                               start, min(start + part_size, size) - 1)
+                with progress_lock, open(progress_file_path, "a") as progress_file:
+                    progress_file.write(f"{start}\n")
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # list() re-raises the first failed part; completed parts stay recorded for the next attempt
+                list(executor.map(download_part, part_starts))
+
+            os.replace(partial_file_path, cached_file_path)
+            os.remove(progress_file_path)
+
+        if cached_file_path != os.path.abspath(filename):
+            os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+            shutil.copyfile(cached_file_path, filename)
+        logging.info(f"File successfully downloaded from S3 bucket: {bucket_name} to {filename}")
+        return filename
+    except Exception as e:
+        logging.error(f"Error occurred while downloading file from S3: {e}")
+        raise CarException(e, sys) from e
@@ -0,0 +1,187 @@
+import sys
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from carprice.exception import CarException
+from carprice.constant import *
+from carprice.util.util import read_yaml_file
+
+VALIDATION_ERRORS_COLUMN = "validation_errors"
+# one bit per check in the per-row error codes
+MAX_CHECKS = 64
+INTEGER_DTYPES = ("int", "int32", "int64")
+FLOAT_DTYPES = ("float", "float32", "float64")
+
+ValidationResult = namedtuple("ValidationResult", ["n_rows", "n_failed_rows", "failed_rows_bitmap", "error_codes",
+                                                   "error_counts"])
+
+
+def get_failed_mask(validation_result: ValidationResult) -> np.ndarray:
+    """
+    Unpacks the failing row bitmap of a `ValidationResult` into a boolean mask.
+    """
+    return np.unpackbits(validation_result.failed_rows_bitmap, count=validation_result.n_rows).astype(bool)
+
+
+class SchemaValidator:
+    """
+    Columnar validation engine compiled from `schema.yaml`.
+
+    Every check (presence, dtype, nulls, `min`/`max` range and `allowed`
+    categorical domain from the `constraints` section) is evaluated as a
+    NumPy mask over the whole column. Failing rows are returned as a packed
+    bitmap plus a per-row code with one bit per failed check, so a frame is
+    validated in one pass and bad rows can be quarantined instead of failing
+    the whole load.
+    """
+
+    def __init__(self, schema: dict, exclude_columns: list = None) -> None:
+        """
+        Args:
+            schema (dict): Content of `schema.yaml`.
+            exclude_columns (list): Schema columns not validated, e.g. the target column of prediction input.
+        """
+        try:
+            exclude_columns = exclude_columns or []
+            self.dtypes = {column: dtype for column, dtype in schema[DATASET_SCHEMA_COLUMNS_KEY].items()
+                           if column not in exclude_columns}
+            self.constraints = schema.get(SCHEMA_CONSTRAINTS_KEY) or {}
+            self.nullable_columns = set(schema.get(SCHEMA_NULLABLE_COLUMNS_KEY) or [])
+            self.check_names = []
+            for column, dtype in self.dtypes.items():
+                self.check_names += [f"{column}:missing_column", f"{column}:null", f"{column}:dtype"]
+                constraint = self.constraints.get(column) or {}
+                if SCHEMA_MIN_KEY in constraint or SCHEMA_MAX_KEY in constraint:
+                    self.check_names.append(f"{column}:range")
+                if SCHEMA_ALLOWED_KEY in constraint:
+                    self.check_names.append(f"{column}:domain")
+            if len(self.check_names) > MAX_CHECKS:
+                raise ValueError(f"Schema defines [{len(self.check_names)}] checks, at most [{MAX_CHECKS}] are supported")
+            self._check_bits = {name: np.uint64(1) << np.uint64(bit) for bit, name in enumerate(self.check_names)}
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    @classmethod
+    def from_schema_file(cls, schema_file_path: str, exclude_columns: list = None):
+        return cls(schema=read_yaml_file(file_path=schema_file_path), exclude_columns=exclude_columns)
+
+    def _get_column_masks(self, df: pd.DataFrame, column: str, dtype: str) -> dict:
+        n_rows = len(df)
+        if column not in df.columns:
+            return {"missing_column": np.ones(n_rows, dtype=bool)}
+        series = df[column]
+        is_null = series.isna().to_numpy()
+        masks = {"null": is_null if column not in self.nullable_columns else np.zeros(n_rows, dtype=bool)}
+        constraint = self.constraints.get(column) or {}
+
+        if dtype in INTEGER_DTYPES or dtype in FLOAT_DTYPES:
+            values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            is_bad_type = np.isnan(values) & ~is_null
+            if dtype in INTEGER_DTYPES:
+                with np.errstate(invalid="ignore"):
+                    is_bad_type |= np.isfinite(values) & (values != np.round(values))
+            masks["dtype"] = is_bad_type
+            if SCHEMA_MIN_KEY in constraint or SCHEMA_MAX_KEY in constraint:
+                # NaN compares False, nulls and bad types are reported by their own checks
+                out_of_range = np.zeros(n_rows, dtype=bool)
+                if SCHEMA_MIN_KEY in constraint:
+                    out_of_range |= values < constraint[SCHEMA_MIN_KEY]
+                if SCHEMA_MAX_KEY in constraint:
+                    out_of_range |= values > constraint[SCHEMA_MAX_KEY]
+                masks["range"] = out_of_range
+        else:
+            masks["dtype"] = np.zeros(n_rows, dtype=bool)
+            if SCHEMA_ALLOWED_KEY in constraint:
+                allowed = [str(value) for value in constraint[SCHEMA_ALLOWED_KEY]]
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    # check the few categories once and broadcast through the integer codes
+                    codes = series.cat.codes.to_numpy()
+                    is_allowed_category = series.cat.categories.astype(str).isin(allowed)
+                    masks["domain"] = (codes >= 0) & ~is_allowed_category[codes]
+                else:
+                    masks["domain"] = ~series.astype("string").isin(allowed).to_numpy(dtype=bool, na_value=False) & ~is_null
+        return masks
+
+    def validate(self, df: pd.DataFrame) -> ValidationResult:
+        """
+        Runs every check over `df`.
+
+        Args:
+            df (pd.DataFrame): Data to validate, extra columns are ignored.
+
+        Returns:
+            ValidationResult: Number of rows and failing rows, packed failing row bitmap, per-row
+            error codes and the number of failing rows per check.
+        """
+        try:
+            n_rows = len(df)
+            error_codes = np.zeros(n_rows, dtype=np.uint64)
+            error_counts = {}
+            for column, dtype in self.dtypes.items():
+                for check, mask in self._get_column_masks(df, column, dtype).items():
+                    n_failed = int(mask.sum())
+                    if n_failed == 0:
+                        continue
+                    check_name = f"{column}:{check}"
+                    error_counts[check_name] = n_failed
+                    error_codes[mask] |= self._check_bits[check_name]
+            is_failed = error_codes != 0
+            return ValidationResult(n_rows=n_rows, n_failed_rows=int(is_failed.sum()),
+                                    failed_rows_bitmap=np.packbits(is_failed), error_codes=error_codes,
+                                    error_counts=error_counts)
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def describe_error_codes(self, error_codes: np.ndarray) -> pd.Series:
+        """
+        Turns per-row error codes into `column:check` descriptions separated
+        by `;`. Each distinct code is decoded once.
+        """
+        descriptions = {}
+        for code in np.unique(error_codes):
+            descriptions[code] = ";".join(name for name, bit in self._check_bits.items() if code & bit)
+        return pd.Series(error_codes).map(descriptions)
+
+    def split(self, df: pd.DataFrame, validation_result: ValidationResult = None):
+        """
+        Separates the rows passing validation, cast to the schema dtypes, from
+        the failing rows, which get a `validation_errors` column.
+
+        Returns:
+            tuple: `(valid_df, quarantined_df)`
+        """
+        try:
+            validation_result = self.validate(df) if validation_result is None else validation_result
+            is_failed = get_failed_mask(validation_result)
+            quarantined_df = df[is_failed].copy()
+            quarantined_df[VALIDATION_ERRORS_COLUMN] = self.describe_error_codes(
+                validation_result.error_codes[is_failed]).to_numpy()
+            valid_df = self.cast(df[~is_failed])
+            return valid_df, quarantined_df
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def cast(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Casts the schema columns of `df` in one call. Expects rows that passed validation.
+        """
+        try:
+            numerical_columns = [column for column, dtype in self.dtypes.items()
+                                 if column in df.columns and (dtype in INTEGER_DTYPES or dtype in FLOAT_DTYPES)
+                                 and df[column].dtype == object]
+            if len(numerical_columns) > 0:
+                df = df.assign(**{column: pd.to_numeric(df[column]) for column in numerical_columns})
+            return df.astype({column: dtype for column, dtype in self.dtypes.items() if column in df.columns})
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def get_error_message(self, validation_result: ValidationResult) -> str:
+        """
+        Summarizes every failed check of a validation result, empty if all rows passed.
+        """
+        if validation_result.n_failed_rows == 0:
+            return ""
+        failed_checks = ", ".join(f"{check_name}: {n_failed}"
+                                  for check_name, n_failed in validation_result.error_counts.items())
+        return (f"[{validation_result.n_failed_rows}] of [{validation_result.n_rows}] rows failed validation "
+                f"({failed_checks})")
@@ -0,0 +1,229 @@
+import importlib
+import os
+import sys
+import time
+from collections import namedtuple
+import numpy as np
+import sklearn.model_selection
+from sklearn.base import clone
+from sklearn.model_selection import GridSearchCV, ParameterGrid, ParameterSampler
+from carprice.exception import CarException
+from carprice.logger import logging
+from carprice.util.stage_profiler import profile_span
+from carprice.util.util import read_yaml_file
+
+# model.yaml sections
+GRID_SEARCH_KEY = "grid_search"
+MODEL_SELECTION_KEY = "model_selection"
+MODULE_KEY = "module"
+MODULE_CLASS_KEY = "class"
+MODULE_PARAM_KEY = "params"
+SEARCH_PARAM_GRID_KEY = "search_param_grid"
+
+# model.yaml keys read alongside the existing grid_search class/module/params entries
+SEARCH_CLASS_KEY = "class"
+SEARCH_PARAM_KEY = "params"
+SEARCH_N_JOBS_KEY = "n_jobs"
+SEARCH_TIME_BUDGET_KEY = "time_budget_seconds"
+
+GRID_SEARCH_CLASS = "GridSearchCV"
+RANDOMIZED_SEARCH_CLASS = "RandomizedSearchCV"
+HALVING_SEARCH_CLASSES = ("HalvingGridSearchCV", "HalvingRandomSearchCV")
+
+SearchResult = namedtuple("SearchResult", ["best_model", "best_parameters", "best_score", "n_candidates"])
+
+
+def get_core_split(n_fits: int, n_jobs: int = -1):
+    """
+    Splits the available cores between the outer search and the threads of
+    each estimator, so that `outer * inner` never exceeds the core count.
+
+    Args:
+        n_fits (int): Number of fits the outer search can run in parallel.
+        n_jobs (int): Total cores to use, -1 for all cores.
+
+    Returns:
+        tuple: `(outer_jobs, inner_jobs)`
+    """
+    total_cores = (os.cpu_count() or 1) if n_jobs is None or n_jobs < 1 else n_jobs
+    outer_jobs = max(1, min(total_cores, n_fits))
+    inner_jobs = max(1, total_cores // outer_jobs)
+    return outer_jobs, inner_jobs
+
+
+def _set_estimator_threads(estimator, n_threads: int):
+    if SEARCH_N_JOBS_KEY in estimator.get_params():
+        estimator.set_params(**{SEARCH_N_JOBS_KEY: n_threads})
+    return estimator
+
+
+def _get_candidates(search_class_name: str, param_grid: dict, search_params: dict) -> list:
+    grid = ParameterGrid(param_grid)
+    if search_class_name == GRID_SEARCH_CLASS:
+        return list(grid)
+    n_iter = min(search_params.pop("n_iter", 10), len(grid))
+    return list(ParameterSampler(param_grid, n_iter=n_iter, random_state=search_params.pop("random_state", None)))
+
+
+def run_budgeted_search(estimator, param_grid: dict, search_config: dict, X, y,
+                        time_budget: float = None) -> SearchResult:
+    """
+    Runs the hyperparameter search described by the `grid_search` section of
+    `model.yaml` for one `module_N` entry.
+
+    `GridSearchCV` and `RandomizedSearchCV` (capped at `n_iter` trials) are
+    evaluated in waves of candidates that fill the outer cores; once
+    `time_budget` seconds have passed no further wave is started and the best
+    candidate so far is refit. `HalvingGridSearchCV`/`HalvingRandomSearchCV`
+    run as a single successive-halving search, which prunes on its own and
+    cannot be stopped in between, so `time_budget` does not apply to them;
+    bound them with their `max_resources`/`n_candidates` params instead.
+
+    Args:
+        estimator: Unfitted estimator built from the `module_N` params.
+        param_grid (dict): `search_param_grid` of the `module_N` entry.
+        search_config (dict): `grid_search` section of `model.yaml`.
+        X: Training features.
+        y: Training target.
+        time_budget (float): Wall-clock seconds allowed for the search, None for no limit.
+            Ignored, with a log message, by the halving search classes.
+
+    Returns:
+        SearchResult: Refitted best model, its parameters, CV score and number of candidates tried.
+    """
+    try:
+        search_class_name = search_config[SEARCH_CLASS_KEY]
+        search_params = dict(search_config.get(SEARCH_PARAM_KEY) or {})
+        n_jobs = search_config.get(SEARCH_N_JOBS_KEY, -1)
+        cv = search_params.pop("cv", 5)
+        search_params.pop("n_jobs", None)
+        cv_splits = cv if isinstance(cv, int) else cv.get_n_splits()
+
+        if search_class_name in HALVING_SEARCH_CLASSES:
+            from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+            search_class = getattr(sklearn.model_selection, search_class_name)
+            if time_budget is not None:
+                logging.info(f"Time budget of [{time_budget}]s is ignored by {search_class_name}, "
+                             f"limit it with its max_resources or n_candidates params")
+            outer_jobs, inner_jobs = get_core_split(n_fits=len(ParameterGrid(param_grid)) * cv_splits, n_jobs=n_jobs)
+            logging.info(f"Running {search_class_name} with [{outer_jobs}] search jobs x [{inner_jobs}] estimator threads")
+            search = search_class(_set_estimator_threads(clone(estimator), inner_jobs), param_grid,
+                                  cv=cv, n_jobs=outer_jobs, **search_params)
+            with profile_span(f"{search_class_name}[{type(estimator).__name__}]") as span:
+                span.add_rows(len(y))
+                search.fit(X, y)
+            return SearchResult(best_model=search.best_estimator_, best_parameters=search.best_params_,
+                                best_score=search.best_score_, n_candidates=len(search.cv_results_["params"]))
+
+        if search_class_name not in (GRID_SEARCH_CLASS, RANDOMIZED_SEARCH_CLASS):
+            raise ValueError(f"Unsupported search class: [{search_class_name}]")
+
+        candidates = _get_candidates(search_class_name, param_grid, search_params)
+        outer_jobs, inner_jobs = get_core_split(n_fits=len(candidates) * cv_splits, n_jobs=n_jobs)
+        wave_size = max(1, outer_jobs // cv_splits)
+        logging.info(f"Running {search_class_name} over [{len(candidates)}] candidates with [{outer_jobs}] "
+                     f"search jobs x [{inner_jobs}] estimator threads, time budget: [{time_budget}]s")
+
+        search_estimator = _set_estimator_threads(clone(estimator), inner_jobs)
+        search_params.pop("refit", None)
+        start_time = time.perf_counter()
+        best_score = -np.inf
+        best_parameters = None
+        n_evaluated = 0
+        for wave_start in range(0, len(candidates), wave_size):
+            if n_evaluated > 0 and time_budget is not None and time.perf_counter() - start_time >= time_budget:
+                logging.info(f"Time budget of [{time_budget}]s reached after [{n_evaluated}] candidates")
+                break
+            wave = candidates[wave_start:wave_start + wave_size]
+            search = GridSearchCV(search_estimator, [{key: [value] for key, value in candidate.items()}
+                                                     for candidate in wave],
+                                  cv=cv, n_jobs=outer_jobs, refit=False, **search_params)
+            with profile_span(f"{search_class_name}[{type(estimator).__name__}]") as span:
+                span.add_rows(len(y))
+                search.fit(X, y)
+            wave_best_index = int(np.nanargmax(search.cv_results_["mean_test_score"]))
+            if search.cv_results_["mean_test_score"][wave_best_index] > best_score:
+                best_score = float(search.cv_results_["mean_test_score"][wave_best_index])
+                best_parameters = search.cv_results_["params"][wave_best_index]
+            n_evaluated += len(wave)
+
+        _, refit_threads = get_core_split(n_fits=1, n_jobs=n_jobs)
+        best_model = _set_estimator_threads(clone(estimator).set_params(**best_parameters), refit_threads)
+        with profile_span(f"refit[{type(estimator).__name__}]") as span:
+            span.add_rows(len(y))
+            best_model.fit(X, y)
+        logging.info(f"Best parameters: {best_parameters}, score: [{best_score}], "
+                     f"search took [{time.perf_counter() - start_time:.1f}]s")
+        return SearchResult(best_model=best_model, best_parameters=best_parameters,
+                            best_score=best_score, n_candidates=n_evaluated)
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def get_time_budget(search_config: dict, module_config: dict):
+    """
+    Returns the wall-clock budget of a `module_N` entry, falling back to the
+    `grid_search` default. None means unlimited.
+    """
+    return module_config.get(SEARCH_TIME_BUDGET_KEY, search_config.get(SEARCH_TIME_BUDGET_KEY))
+
+
+def get_module_names(model_config: dict) -> list:
+    """
+    Returns the `module_N` entries of the `model_selection` section of `model.yaml`.
+    """
+    return list(model_config[MODEL_SELECTION_KEY].keys())
+
+
+def build_estimator(module_config: dict):
+    """
+    Instantiates the estimator of a `module_N` entry with its `params`.
+    """
+    try:
+        estimator_class = getattr(importlib.import_module(module_config[MODULE_KEY]), module_config[MODULE_CLASS_KEY])
+        return estimator_class(**(module_config.get(MODULE_PARAM_KEY) or {}))
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def search_module(model_config: dict, module_name: str, X, y, n_jobs: int = None) -> SearchResult:
+    """
+    Runs the budgeted search of one `module_N` entry of `model.yaml`.
+
+    Args:
+        model_config (dict): Content of `model.yaml`.
+        module_name (str): `module_N` entry to search.
+        X: Training features.
+        y: Training target.
+        n_jobs (int): Cores of this search, overriding the `grid_search` n_jobs, e.g. when searches run side by side.
+
+    Returns:
+        SearchResult: Refitted best model of the module.
+    """
+    try:
+        search_config = dict(model_config[GRID_SEARCH_KEY])
+        if n_jobs is not None:
+            search_config[SEARCH_N_JOBS_KEY] = n_jobs
+        module_config = model_config[MODEL_SELECTION_KEY][module_name]
+        estimator = build_estimator(module_config)
+        logging.info(f"Searching [{module_name}]: {type(estimator).__name__}")
+        with profile_span(module_name):
+            return run_budgeted_search(estimator, module_config[SEARCH_PARAM_GRID_KEY], search_config, X, y,
+                                       time_budget=get_time_budget(search_config, module_config))
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def search_models(model_config_file_path: str, X, y) -> list:
+    """
+    Runs the search of every `module_N` entry of `model.yaml`, one after the
+    other, each using all the cores set in `grid_search`.
+
+    Returns:
+        list: `SearchResult` of every module, in `model.yaml` order.
+    """
+    try:
+        model_config = read_yaml_file(file_path=model_config_file_path)
+        return [search_module(model_config, module_name, X, y) for module_name in get_module_names(model_config)]
+    except Exception as e:
+        raise CarException(e, sys) from e
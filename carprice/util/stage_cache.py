@@ -0,0 +1,121 @@
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sys
+from carprice.exception import CarException
+from carprice.logger import logging
+from carprice.util.util import save_object, load_object
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str, hasher=None):
+    """
+    Feeds the content of a file into `hasher` (a new sha256 if not given)
+    block by block and returns it. A directory, such as a partitioned
+    dataset, is hashed file by file in path order.
+    """
+    hasher = hashlib.sha256() if hasher is None else hasher
+    if os.path.isdir(file_path):
+        for dir_path, dir_names, file_names in os.walk(file_path):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                child_path = os.path.join(dir_path, file_name)
+                hasher.update(os.path.relpath(child_path, file_path).encode("utf-8"))
+                hash_file(child_path, hasher)
+        return hasher
+    with open(file_path, "rb") as file_obj:
+        for block in iter(lambda: file_obj.read(HASH_BLOCK_SIZE), b""):
+            hasher.update(block)
+    return hasher
+
+
+@functools.lru_cache(maxsize=None)
+def get_module_source_digest(module_name: str) -> str:
+    """
+    Returns the sha256 of the source file of a module, which stands for the
+    version of the code it holds. Computed once per process.
+    """
+    module = importlib.import_module(module_name)
+    source_file_path = inspect.getsourcefile(module) or module.__file__
+    return hash_file(source_file_path).hexdigest()
+
+
+class StageCache:
+    """
+    Content-addressed store of pipeline stage artifacts.
+
+    A stage key is the sha256 of the stage's code, its input files and the
+    settings that affect its output (never the timestamped output paths). On a hit the
+    artifact of the earlier run is returned as is, so the new run references
+    the files already produced instead of recomputing them.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        """
+        Args:
+            cache_dir (str): Directory holding one sub-directory of cached artifacts per stage.
+        """
+        self.cache_dir = cache_dir
+
+    def get_key(self, stage: str, code_modules: list, file_paths: list = None, settings: dict = None) -> str:
+        """
+        Computes the cache key of a stage.
+
+        Args:
+            stage (str): Stage name, part of the key.
+            code_modules (list): Names of the modules implementing the stage, so that a
+                change to their source invalidates the artifacts of the old code.
+            file_paths (list): Input files whose content the output depends on.
+            settings (dict): JSON serializable settings the output depends on.
+
+        Returns:
+            str: Hex digest identifying the stage inputs.
+        """
+        try:
+            hasher = hashlib.sha256(stage.encode("utf-8"))
+            for module_name in code_modules:
+                hasher.update(f"{module_name}:{get_module_source_digest(module_name)}".encode("utf-8"))
+            for file_path in file_paths or []:
+                hasher.update(os.path.basename(file_path).encode("utf-8"))
+                hash_file(file_path, hasher)
+            hasher.update(json.dumps(settings or {}, sort_keys=True, default=str).encode("utf-8"))
+            return hasher.hexdigest()
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def _get_entry_path(self, stage: str, key: str) -> str:
+        return os.path.join(self.cache_dir, stage, f"{key}.pkl")
+
+    def lookup(self, stage: str, key: str):
+        """
+        Returns the artifact stored under `key`, or None if there is none or
+        any file it references no longer exists.
+        """
+        try:
+            entry_path = self._get_entry_path(stage, key)
+            if not os.path.exists(entry_path):
+                return None
+            artifact = load_object(file_path=entry_path)
+            artifact_paths = [value for field, value in artifact._asdict().items()
+                              if field.endswith("_path") and isinstance(value, str)]
+            if not all(os.path.exists(path) for path in artifact_paths):
+                logging.info(f"Cached {stage} artifact [{key}] references missing files, recomputing")
+                return None
+            logging.info(f"Reusing cached {stage} artifact [{key}]: {artifact}")
+            return artifact
+        except Exception as e:
+            raise CarException(e, sys) from e
+
+    def store(self, stage: str, key: str, artifact) -> None:
+        """
+        Records `artifact` as the output of the stage inputs identified by `key`.
+        """
+        try:
+            save_object(file_path=self._get_entry_path(stage, key), obj=artifact)
+            logging.info(f"Cached {stage} artifact under key [{key}]")
+        except Exception as e:
+            raise CarException(e, sys) from e
@@ -0,0 +1,293 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+from carprice.exception import CarException
+from carprice.logger import logging, log_context
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# inherited by job processes and pool workers, so every stage of a run writes to the same file
+STAGE_METRICS_FILE_ENV = "CARPRICE_STAGE_METRICS_FILE"
+STAGE_METRICS_FILE_EXTENSION = ".jsonl"
+# seconds between two samples of the worker processes of an open span
+WORKER_SAMPLE_INTERVAL = 0.5
+PROC_DIR = "/proc"
+
+_local = threading.local()
+
+
+class Span:
+    """
+    Measurements of one profiled block, see `profile_span`.
+    """
+
+    def __init__(self, name: str, parent=None) -> None:
+        self.name = name
+        self.parent = parent
+        self.path = name if parent is None else f"{parent.path}/{name}"
+        self.rows = None
+        self.peak_rss = 0
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.start_wall_time = time.perf_counter()
+        self.start_cpu_time = _get_cpu_time()
+        self.worker_sampler = WorkerSampler()
+
+    def add_rows(self, n_rows: int) -> None:
+        self.rows = int(n_rows) if self.rows is None else self.rows + int(n_rows)
+
+
+def _get_cpu_time() -> float:
+    cpu_time = time.process_time()
+    if resource is not None:
+        # children reaped so far, e.g. finished joblib workers
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time += children_usage.ru_utime + children_usage.ru_stime
+    return cpu_time
+
+
+def _read_proc_workers() -> dict:
+    """
+    Live descendant processes of this one, e.g. joblib/loky workers, as
+    `{pid: (cpu_seconds, rss_bytes)}`. Empty where /proc is not available.
+    """
+    if not os.path.isdir(PROC_DIR):
+        return {}
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    processes = {}
+    for name in os.listdir(PROC_DIR):
+        if not name.isdigit():
+            continue
+        try:
+            with open(os.path.join(PROC_DIR, name, "stat")) as stat_file:
+                # the command name may hold spaces, the fields after it are fixed
+                fields = stat_file.read().rsplit(")", 1)[1].split()
+            with open(os.path.join(PROC_DIR, name, "statm")) as statm_file:
+                rss_pages = int(statm_file.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        processes[int(name)] = (int(fields[1]), (int(fields[11]) + int(fields[12])) / clock_ticks,
+                                rss_pages * page_size)
+    workers = {}
+    parents = {os.getpid()}
+    while parents:
+        children = {pid for pid, (ppid, _, _) in processes.items() if ppid in parents and pid not in workers}
+        for pid in children:
+            workers[pid] = processes[pid][1:]
+        parents = children
+    return workers
+
+
+class WorkerSampler:
+    """
+    CPU time and peak memory of the worker processes running while a span is
+    open. Pool workers such as loky's outlive the span, so they are never
+    reaped in it and `RUSAGE_CHILDREN` misses them; their usage is read from
+    /proc at the start and end of the span and every `WORKER_SAMPLE_INTERVAL`
+    seconds in between.
+    """
+
+    def __init__(self) -> None:
+        self.start_workers = _read_proc_workers()
+        self.last_workers = dict(self.start_workers)
+        self.peak_rss = sum(rss for _, rss in self.start_workers.values())
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(WORKER_SAMPLE_INTERVAL):
+            self.sample()
+
+    def sample(self) -> None:
+        workers = _read_proc_workers()
+        with self._lock:
+            self.last_workers.update(workers)
+            self.peak_rss = max(self.peak_rss, sum(rss for _, rss in workers.values()))
+
+    def stop(self) -> float:
+        """
+        Stops sampling and returns the CPU seconds the workers used while the span was open.
+        """
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        end_workers = _read_proc_workers()
+        reaped_workers = set()
+        cpu_seconds = 0.0
+        for pid, (cpu_time, _) in self.last_workers.items():
+            if pid in end_workers:
+                cpu_seconds += end_workers[pid][0] - self.start_workers.get(pid, (0.0, 0))[0]
+            elif pid in self.start_workers:
+                reaped_workers.add(pid)
+        # workers reaped during the span are in RUSAGE_CHILDREN with their whole lifetime, drop what preceded the span
+        cpu_seconds -= sum(self.start_workers[pid][0] for pid in reaped_workers)
+        return max(cpu_seconds, 0.0)
+
+
+def _read_peak_rss() -> int:
+    """
+    Peak resident set size of this process in bytes: the high-water mark
+    since the last `_reset_peak_rss`, or since the process started where it
+    can not be reset.
+    """
+    try:
+        with open("/proc/self/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _reset_peak_rss() -> None:
+    try:
+        # Linux only: resets VmHWM to the current RSS
+        with open("/proc/self/clear_refs", "w") as clear_refs_file:
+            clear_refs_file.write("5")
+    except OSError:
+        pass
+
+
+def _get_stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def set_metrics_file(file_path: str) -> None:
+    """
+    Sets the file the spans of this process and its child processes are appended to.
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    os.environ[STAGE_METRICS_FILE_ENV] = file_path
+
+
+def get_metrics_file():
+    return os.environ.get(STAGE_METRICS_FILE_ENV)
+
+
+def record_rows(n_rows: int) -> None:
+    """
+    Adds to the rows processed by the innermost open span; a no-op outside of spans.
+    """
+    stack = _get_stack()
+    if stack:
+        stack[-1].add_rows(n_rows)
+
+
+def _write_record(record: dict) -> None:
+    metrics_file_path = get_metrics_file()
+    if metrics_file_path is None:
+        return
+    line = (json.dumps(record) + "\n").encode("utf-8")
+    # a single O_APPEND write keeps lines from concurrent processes whole
+    fd = os.open(metrics_file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def profile_span(name: str):
+    """
+    Measures wall time, CPU time, peak RSS and rows processed of a block and
+    appends them to the run's metrics file. Spans nest: a span opened inside
+    another one is recorded as `outer/inner`, and the outer peak RSS covers
+    the inner one. CPU time includes the worker processes, such as the
+    GridSearchCV joblib workers; their summed peak RSS is recorded apart
+    from the one of this process.
+
+    Args:
+        name (str): Name of the span, e.g. a stage or `fit_transform`.
+
+    Yields:
+        Span: The open span, to add rows to.
+    """
+    stack = _get_stack()
+    parent = stack[-1] if stack else None
+    if parent is not None:
+        parent.peak_rss = max(parent.peak_rss, _read_peak_rss())
+    _reset_peak_rss()
+    span = Span(name=name, parent=parent)
+    stack.append(span)
+    status = "completed"
+    try:
+        with log_context(span.path):
+            yield span
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        stack.pop()
+        wall_seconds = time.perf_counter() - span.start_wall_time
+        worker_cpu_seconds = span.worker_sampler.stop()
+        cpu_seconds = _get_cpu_time() - span.start_cpu_time + worker_cpu_seconds
+        span.peak_rss = max(span.peak_rss, _read_peak_rss())
+        if parent is not None:
+            parent.peak_rss = max(parent.peak_rss, span.peak_rss)
+        record = {
+            "span": span.path,
+            "stage": span.path.split("/")[0],
+            "depth": span.path.count("/"),
+            "status": status,
+            "pid": os.getpid(),
+            "started_at": span.started_at,
+            "wall_seconds": round(wall_seconds, 3),
+            "cpu_seconds": round(cpu_seconds, 3),
+            "peak_rss_mb": round(span.peak_rss / 2 ** 20, 1),
+            "worker_cpu_seconds": round(worker_cpu_seconds, 3),
+            "worker_peak_rss_mb": round(span.worker_sampler.peak_rss / 2 ** 20, 1),
+            "rows": span.rows,
+            "rows_per_second": round(span.rows / wall_seconds, 1) if span.rows and wall_seconds > 0 else None,
+        }
+        logging.info(f"Profiled [{span.path}] in [{record['wall_seconds']}] seconds", extra={"span_metrics": record})
+        try:
+            _write_record(record)
+        except OSError as e:
+            logging.info(f"Could not write stage metrics: {e}")
+
+
+def read_stage_metrics(metrics_dir: str, limit: int = 10) -> pd.DataFrame:
+    """
+    Loads the span records of the most recent runs from `metrics_dir`.
+
+    Args:
+        metrics_dir (str): Directory of the per-run `<timestamp>.jsonl` metrics files.
+        limit (int): Number of runs to load, newest first.
+
+    Returns:
+        pd.DataFrame: One row per span with a `run` column, empty if there are no runs yet.
+    """
+    try:
+        if not os.path.isdir(metrics_dir):
+            return pd.DataFrame()
+        file_names = sorted((name for name in os.listdir(metrics_dir) if name.endswith(STAGE_METRICS_FILE_EXTENSION)),
+                            reverse=True)[:limit]
+        records = []
+        for file_name in file_names:
+            run = file_name[:-len(STAGE_METRICS_FILE_EXTENSION)]
+            with open(os.path.join(metrics_dir, file_name), "r") as metrics_file:
+                for line in metrics_file:
+                    if line.strip():
+                        records.append({"run": run, **json.loads(line)})
+        metrics_df = pd.DataFrame.from_records(records)
+        if "rows" in metrics_df:
+            metrics_df["rows"] = metrics_df["rows"].astype("Int64")
+        return metrics_df
+    except Exception as e:
+        raise CarException(e, sys) from e
@@ -0,0 +1,71 @@
+import numpy as np
+
+DEFAULT_SKETCH_SIZE = 1000
+COMPACTOR_DECAY = 2 / 3
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch for a numerical column read in chunks.
+
+    Values are kept in a stack of compactors; an item at level `h` stands for
+    `2 ** h` original values. When a level overflows it is sorted and every
+    other item (random offset) is promoted, so memory stays `O(k)` however
+    many rows are added, with a rank error of roughly `1.7 / k`.
+    """
+
+    def __init__(self, k: int = DEFAULT_SKETCH_SIZE, seed: int = None) -> None:
+        """
+        Args:
+            k (int): Capacity of the top compactor, trading memory for accuracy.
+            seed (int): Seed of the random compaction offsets.
+        """
+        self.k = k
+        self.count = 0
+        self.compactors = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(np.ceil(self.k * COMPACTOR_DECAY ** depth)))
+
+    def update(self, values) -> None:
+        """
+        Adds a batch of values, ignoring NaNs.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self._compress()
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.compactors):
+            items = self.compactors[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+                items = np.sort(items)
+                leftover = items[:len(items) % 2]
+                items = items[len(items) % 2:]
+                promoted = items[self._rng.integers(2)::2]
+                self.compactors[level] = leftover
+                self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], promoted])
+            level += 1
+
+    def quantile(self, q):
+        """
+        Returns the approximate value(s) at quantile(s) `q` in [0, 1].
+        """
+        items = np.concatenate(self.compactors)
+        if len(items) == 0:
+            raise ValueError("Can not compute quantiles of an empty sketch")
+        weights = np.concatenate([np.full(len(compactor), 2.0 ** level)
+                                  for level, compactor in enumerate(self.compactors)])
+        order = np.argsort(items, kind="stable")
+        items = items[order]
+        cumulative_weights = np.cumsum(weights[order])
+        ranks = np.asarray(q, dtype=np.float64) * cumulative_weights[-1]
+        indices = np.minimum(np.searchsorted(cumulative_weights, ranks, side="left"), len(items) - 1)
+        return items[indices]
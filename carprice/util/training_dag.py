@@ -0,0 +1,219 @@
+import functools
+import os
+import sys
+from carprice.exception import CarException
+from carprice.logger import logging, set_run_id
+from carprice.config.configuration import ConfigurationManager
+from carprice.constant import DATA_INGESTION_ARTIFACT_DIR, DATA_VALIDATION_ARTIFACT_DIR, \
+    DATA_TRANSFORMATION_ARTIFACT_DIR, MODEL_TRAINER_ARTIFACT_DIR, MODEL_EVALUATION_ARTIFACT_DIR, \
+    MODEL_PUSHER_ARTIFACT_DIR, DATA_DRIFT_STAGE_NAME, DATA_VALIDATION_REFERENCE_PROFILE_FILE_NAME, \
+    DAG_STATE_DIR_NAME, MODEL_SEARCH_STAGE_NAME, generate_timestamp
+from carprice.component.data_ingestion import DataIngestion
+from carprice.component.data_validation import DataValidation
+from carprice.component.data_transformation import DataTransformation
+from carprice.component.model_trainer import ModelTrainer
+from carprice.component.model_evaluation import ModelEvaluation
+from carprice.component.model_pusher import ModelPusher
+from carprice.util.dag_executor import DagNode, DagExecutor
+from carprice.util.job_runner import track_stage, get_active_job, set_active_job, report_progress, STAGE_COMPLETED
+from carprice.util.stage_profiler import set_metrics_file, profile_span, record_rows
+from carprice.util.search_scheduler import search_module, get_module_names
+from carprice.util.util import read_yaml_file, load_numpy_array, get_target_array_file_path
+from carprice.util.warm_start import WARM_START_ENABLED_KEY
+from carprice.util.experiment_store import track_experiment
+
+# node outputs, named after the artifacts the components exchange
+DATA_INGESTION_ARTIFACT = "data_ingestion_artifact"
+DATA_VALIDATION_ARTIFACT = "data_validation_artifact"
+REFERENCE_PROFILE_FILE_PATH = "reference_profile_file_path"
+DATA_TRANSFORMATION_ARTIFACT = "data_transformation_artifact"
+MODEL_TRAINER_CACHE_KEY = "model_trainer_cache_key"
+MODEL_TRAINER_ARTIFACT = "model_trainer_artifact"
+MODEL_EVALUATION_ARTIFACT = "model_evaluation_artifact"
+MODEL_PUSHER_ARTIFACT = "model_pusher_artifact"
+SEARCH_RESULT_PREFIX = "search_result_"
+
+
+def run_data_ingestion(config: ConfigurationManager):
+    data_ingestion = DataIngestion(data_ingestion_config=config.get_data_ingestion_config(),
+                                   stage_cache=config.get_stage_cache(),
+                                   download_cache_dir=config.get_download_cache_dir(),
+                                   dataset_dir=config.get_dataset_dir())
+    return data_ingestion.initiate_data_ingestion()
+
+
+def run_data_validation(config: ConfigurationManager, data_ingestion_artifact):
+    data_validation = DataValidation(data_validation_config=config.get_data_validation_config(),
+                                     data_ingestion_artifact=data_ingestion_artifact,
+                                     stage_cache=config.get_stage_cache())
+    # the drift report is its own node, running next to data transformation
+    return data_validation.initiate_data_validation(check_drift=False)
+
+
+@track_stage(DATA_DRIFT_STAGE_NAME)
+def run_data_drift_report(config: ConfigurationManager, data_ingestion_artifact, data_validation_artifact):
+    data_validation_config = config.get_data_validation_config()
+    # the profile exported with the serving model is the baseline, so only the new data is profiled
+    reference_profile_file_path = config.get_reference_profile_file_path()
+    data_validation = DataValidation(data_validation_config=data_validation_config,
+                                     data_ingestion_artifact=data_ingestion_artifact,
+                                     sample_size=config.get_drift_sample_size(),
+                                     reference_profile_file_path=reference_profile_file_path)
+    data_validation.is_data_drift_found()
+    if reference_profile_file_path is not None:
+        # exported again with the new model, the baseline stays fixed
+        return reference_profile_file_path
+    return os.path.join(os.path.dirname(data_validation_config.report_file_path),
+                        DATA_VALIDATION_REFERENCE_PROFILE_FILE_NAME)
+
+
+def run_data_transformation(config: ConfigurationManager, data_ingestion_artifact, data_validation_artifact):
+    data_transformation = DataTransformation(data_transformation_config=config.get_data_transformation_config(),
+                                             data_ingestion_artifact=data_ingestion_artifact,
+                                             data_validation_artifact=data_validation_artifact,
+                                             stage_cache=config.get_stage_cache(),
+                                             chunk_size=config.get_transformation_chunk_size())
+    return data_transformation.initiate_data_transformation()
+
+
+def get_model_trainer(config: ConfigurationManager, data_transformation_artifact, data_ingestion_artifact=None,
+                      data_validation_artifact=None) -> ModelTrainer:
+    return ModelTrainer(model_trainer_config=config.get_model_trainer_config(),
+                        data_transformation_artifact=data_transformation_artifact,
+                        stage_cache=config.get_stage_cache(),
+                        model_evaluation_file_path=config.get_model_evaluation_config().model_evaluation_file_path,
+                        data_ingestion_artifact=data_ingestion_artifact,
+                        data_validation_artifact=data_validation_artifact)
+
+
+def run_model_trainer_cache_key(config: ConfigurationManager, data_transformation_artifact):
+    # hashes the transformed arrays once for the searches and the model trainer
+    model_trainer = get_model_trainer(config, data_transformation_artifact)
+    return None if model_trainer.stage_cache is None else model_trainer.get_cache_key()
+
+
+def run_model_search(config: ConfigurationManager, data_transformation_artifact, model_trainer_cache_key,
+                     module_name: str = None, n_jobs: int = None):
+    model_trainer = get_model_trainer(config, data_transformation_artifact)
+    # a warm started or cached model trainer needs no search; it searches itself if the warm start fails
+    if model_trainer.warm_start_config.get(WARM_START_ENABLED_KEY) or \
+            model_trainer.lookup_cached_artifact(cache_key=model_trainer_cache_key) is not None:
+        logging.info(f"Skipping the search of [{module_name}]")
+        return None
+    transformed_train_file_path = data_transformation_artifact.transformed_train_file_path
+    x_train = load_numpy_array(file_path=transformed_train_file_path, mmap_mode='r')
+    y_train = load_numpy_array(file_path=get_target_array_file_path(transformed_train_file_path), mmap_mode='r')
+    model_config = read_yaml_file(file_path=config.get_model_trainer_config().model_config_file_path)
+    with profile_span(MODEL_SEARCH_STAGE_NAME):
+        record_rows(len(y_train))
+        return search_module(model_config, module_name, x_train, y_train, n_jobs=n_jobs)
+
+
+def run_model_trainer(config: ConfigurationManager, data_ingestion_artifact, data_validation_artifact,
+                      data_transformation_artifact, model_trainer_cache_key, **search_results):
+    # inputs keep the order of the node, which is model.yaml order; a result is None when its search was skipped
+    search_results = list(search_results.values())
+    model_trainer = get_model_trainer(config, data_transformation_artifact, data_ingestion_artifact,
+                                      data_validation_artifact)
+    if not search_results or any(search_result is None for search_result in search_results):
+        search_results = None
+    return model_trainer.initiate_model_trainer(search_results=search_results, cache_key=model_trainer_cache_key)
+
+
+def run_model_evaluation(config: ConfigurationManager, data_ingestion_artifact, data_validation_artifact,
+                         data_transformation_artifact, model_trainer_artifact):
+    model_evaluation = ModelEvaluation(model_evaluation_config=config.get_model_evaluation_config(),
+                                       data_ingestion_artifact=data_ingestion_artifact,
+                                       data_validation_artifact=data_validation_artifact,
+                                       model_trainer_artifact=model_trainer_artifact,
+                                       data_transformation_artifact=data_transformation_artifact)
+    return model_evaluation.initiate_model_evaluation()
+
+
+def run_model_pusher(config: ConfigurationManager, model_evaluation_artifact, reference_profile_file_path):
+    if not model_evaluation_artifact.is_model_accepted:
+        logging.info("Trained model is not accepted, nothing to push")
+        # the stage is done, the job reaches all of its stages
+        report_progress(MODEL_PUSHER_ARTIFACT_DIR, STAGE_COMPLETED, "skipped, trained model was not accepted")
+        return None
+    model_pusher = ModelPusher(model_pusher_config=config.get_model_pusher_config(),
+                               model_evaluation_artifact=model_evaluation_artifact,
+                               reference_profile_file_path=reference_profile_file_path)
+    return model_pusher.initiate_model_pusher()
+
+
+def get_training_dag(module_names: list) -> list:
+    """
+    Returns the training pipeline as DAG nodes. The drift report only needs
+    the validated data, so it runs next to data transformation, model
+    training and model evaluation; only model pushing waits for it. Every
+    model.yaml module_N search is its own node, so the searches run side by
+    side, each on its share of the cores, and model training picks the best.
+
+    Args:
+        module_names (list): `module_N` entries of model.yaml.
+    """
+    n_jobs = max(1, (os.cpu_count() or 1) // max(1, len(module_names)))
+    search_nodes = [DagNode(name=f"{MODEL_SEARCH_STAGE_NAME}_{module_name}",
+                            func=functools.partial(run_model_search, module_name=module_name, n_jobs=n_jobs),
+                            inputs=[DATA_TRANSFORMATION_ARTIFACT, MODEL_TRAINER_CACHE_KEY],
+                            output=f"{SEARCH_RESULT_PREFIX}{module_name}")
+                    for module_name in module_names]
+    return search_nodes + [
+        DagNode(name=MODEL_TRAINER_CACHE_KEY, func=run_model_trainer_cache_key, inputs=[DATA_TRANSFORMATION_ARTIFACT],
+                output=MODEL_TRAINER_CACHE_KEY),
+        DagNode(name=DATA_INGESTION_ARTIFACT_DIR, func=run_data_ingestion, output=DATA_INGESTION_ARTIFACT),
+        DagNode(name=DATA_VALIDATION_ARTIFACT_DIR, func=run_data_validation, inputs=[DATA_INGESTION_ARTIFACT],
+                output=DATA_VALIDATION_ARTIFACT),
+        DagNode(name=DATA_DRIFT_STAGE_NAME, func=run_data_drift_report,
+                inputs=[DATA_INGESTION_ARTIFACT, DATA_VALIDATION_ARTIFACT], output=REFERENCE_PROFILE_FILE_PATH),
+        DagNode(name=DATA_TRANSFORMATION_ARTIFACT_DIR, func=run_data_transformation,
+                inputs=[DATA_INGESTION_ARTIFACT, DATA_VALIDATION_ARTIFACT], output=DATA_TRANSFORMATION_ARTIFACT),
+        DagNode(name=MODEL_TRAINER_ARTIFACT_DIR, func=run_model_trainer,
+                inputs=[DATA_INGESTION_ARTIFACT, DATA_VALIDATION_ARTIFACT, DATA_TRANSFORMATION_ARTIFACT,
+                        MODEL_TRAINER_CACHE_KEY] + [node.output for node in search_nodes],
+                output=MODEL_TRAINER_ARTIFACT),
+        DagNode(name=MODEL_EVALUATION_ARTIFACT_DIR, func=run_model_evaluation,
+                inputs=[DATA_INGESTION_ARTIFACT, DATA_VALIDATION_ARTIFACT, DATA_TRANSFORMATION_ARTIFACT,
+                        MODEL_TRAINER_ARTIFACT],
+                output=MODEL_EVALUATION_ARTIFACT),
+        DagNode(name=MODEL_PUSHER_ARTIFACT_DIR, func=run_model_pusher,
+                inputs=[MODEL_EVALUATION_ARTIFACT, REFERENCE_PROFILE_FILE_PATH], output=MODEL_PUSHER_ARTIFACT),
+    ]
+
+
+def run_training_dag(time_stamp: str = None, max_workers: int = None, max_retries: int = 1) -> dict:
+    """
+    Runs the training pipeline DAG on a process pool.
+
+    Node outputs are saved per run, so running again with the same
+    `time_stamp` retries only the nodes that failed and the ones after them.
+
+    Args:
+        time_stamp (str): Run timestamp naming the artifact directories, defaults to now.
+        max_workers (int): Worker processes, defaults to one per node, at most one per core.
+        max_retries (int): Retries of a failed node within this run.
+
+    Returns:
+        dict: Output of every node, by output name.
+    """
+    try:
+        time_stamp = generate_timestamp() if time_stamp is None else time_stamp
+        set_run_id(time_stamp)
+        config = ConfigurationManager(timestamp=time_stamp)
+        set_metrics_file(config.get_stage_metrics_file_path())
+        state_dir = os.path.join(config.pipeline_config.artifact_dir, DAG_STATE_DIR_NAME, time_stamp)
+        logging.info(f"Running training DAG, node outputs saved in: [{state_dir}]")
+        model_config = read_yaml_file(file_path=config.get_model_trainer_config().model_config_file_path)
+        executor = DagExecutor(nodes=get_training_dag(get_module_names(model_config)), max_workers=max_workers, max_retries=max_retries,
+                               state_dir=state_dir, initializer=set_active_job, initargs=(get_active_job(),))
+        with track_experiment(config.get_experiment_store(), time_stamp) as experiment:
+            outputs = executor.run(context=config)
+            model_trainer_artifact = outputs[MODEL_TRAINER_ARTIFACT]
+            experiment["accuracy"] = model_trainer_artifact.model_accuracy
+            experiment["is_model_accepted"] = outputs[MODEL_EVALUATION_ARTIFACT].is_model_accepted
+            experiment["metrics"] = {name: getattr(model_trainer_artifact, name) for name in
+                                     ("train_rmse", "test_rmse", "train_accuracy", "test_accuracy", "model_accuracy")}
+        return outputs
+    except Exception as e:
+        raise CarException(e, sys) from e
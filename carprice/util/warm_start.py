@@ -0,0 +1,126 @@
+import copy
+import sys
+from sklearn.base import clone
+from carprice.exception import CarException
+from carprice.logger import logging
+from carprice.constant import BEST_MODEL_KEY, MODEL_PATH_KEY
+from carprice.util.util import read_yaml_file
+
+# model.yaml keys
+WARM_START_KEY = "warm_start"
+WARM_START_ENABLED_KEY = "enabled"
+WARM_START_N_ESTIMATORS_KEY = "n_estimators"
+DEFAULT_WARM_START_N_ESTIMATORS = 100
+
+
+def get_warm_start_config(model_config_file_path: str) -> dict:
+    """
+    Returns the `warm_start` section of `model.yaml`, empty if warm start is
+    not configured.
+    """
+    try:
+        return read_yaml_file(file_path=model_config_file_path).get(WARM_START_KEY) or {}
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def get_incumbent_model_path(model_evaluation_file_path: str):
+    """
+    Returns the path of the current best model recorded in
+    `model_evaluation.yaml`, or None if there is none yet.
+    """
+    try:
+        if model_evaluation_file_path is None:
+            return None
+        try:
+            model_eval_content = read_yaml_file(file_path=model_evaluation_file_path) or {}
+        except Exception:
+            return None
+        if BEST_MODEL_KEY not in model_eval_content:
+            return None
+        return model_eval_content[BEST_MODEL_KEY][MODEL_PATH_KEY]
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def warm_start_model(previous_model, X, y, n_estimators: int = DEFAULT_WARM_START_N_ESTIMATORS):
+    """
+    Continues training a fitted ensemble on new data instead of fitting it
+    from scratch.
+
+    XGBoost models keep boosting from the previous booster for `n_estimators`
+    more rounds; scikit-learn ensembles exposing `warm_start` (such as
+    `RandomForestRegressor`) grow `n_estimators` more trees while keeping the
+    existing ones. `previous_model` itself is left untouched.
+
+    Args:
+        previous_model: Fitted estimator of the incumbent model.
+        X: Training features, laid out like the ones `previous_model` was fit on.
+        y: Training target.
+        n_estimators (int): Boosting rounds or trees to add.
+
+    Returns:
+        Fitted estimator with the previous hyperparameters and extra estimators.
+
+    Raises:
+        CarException: NotImplementedError for estimators that can not be warm started.
+    """
+    try:
+        if hasattr(previous_model, "get_booster"):
+            model = clone(previous_model).set_params(n_estimators=n_estimators)
+            logging.info(f"Boosting [{n_estimators}] more rounds on top of {type(previous_model).__name__}")
+            model.fit(X, y, xgb_model=previous_model.get_booster())
+            return model
+        if "warm_start" in previous_model.get_params():
+            model = copy.deepcopy(previous_model)
+            total_estimators = model.get_params()["n_estimators"] + n_estimators
+            logging.info(f"Growing {type(previous_model).__name__} to [{total_estimators}] estimators")
+            model.set_params(warm_start=True, n_estimators=total_estimators)
+            model.fit(X, y)
+            return model.set_params(warm_start=False)
+        raise NotImplementedError(f"{type(previous_model).__name__} can not be warm started")
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def refit_with_previous_parameters(previous_model, X, y):
+    """
+    Fits a fresh copy of the incumbent estimator, reusing the hyperparameters
+    the grid search found earlier instead of searching again.
+    """
+    try:
+        logging.info(f"Refitting {type(previous_model).__name__} with parameters: {previous_model.get_params()}")
+        return clone(previous_model).fit(X, y)
+    except Exception as e:
+        raise CarException(e, sys) from e
+
+
+def continue_incumbent_model(incumbent_model, X, y, n_estimators: int = DEFAULT_WARM_START_N_ESTIMATORS):
+    """
+    Trains on from the incumbent model on new raw training data.
+
+    The incumbent's trees split on features transformed by its own
+    preprocessing object, so `X` is transformed with that object, not with
+    one refit on the new data, and the result must be exported with it too.
+    Estimators that can not be warm started are refit with the incumbent's
+    hyperparameters on the same features.
+
+    Args:
+        incumbent_model: Current best model, with `preprocessing_object` and `trained_model_object`.
+        X: Raw training features.
+        y: Training target.
+        n_estimators (int): Boosting rounds or trees to add when warm starting.
+
+    Returns:
+        Fitted estimator to be saved with `incumbent_model.preprocessing_object`.
+    """
+    try:
+        previous_model = incumbent_model.trained_model_object
+        x_train = incumbent_model.preprocessing_object.transform(X)
+        try:
+            return warm_start_model(previous_model, x_train, y, n_estimators=n_estimators)
+        except Exception as e:
+            logging.info(f"Warm start not possible: {e}")
+        return refit_with_previous_parameters(previous_model, x_train, y)
+    except Exception as e:
+        raise CarException(e, sys) from e
@@ -40,4 +40,9 @@ setup(
     description=DESCRIPTION,
     packages=find_packages(),  # Automatically finds all packages in the project
     install_requires=get_requirements(),  # Dynamically fetches dependencies
+    entry_points={
+        "console_scripts": [
+            "carprice-score=carprice.util.bulk_score:main",  # Offline bulk scoring
+        ],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,90 @@
+import os
+import pytest
+from carprice.util import s3_operation
+from carprice.util.s3_operation import download_from_s3, PARTIAL_FILE_SUFFIX, PROGRESS_FILE_SUFFIX
+
+moto = pytest.importorskip("moto")
+
+BUCKET_NAME = "used-car-data"
+OBJECT_NAME = "cardekho_dataset.csv"
+PART_SIZE = 1024
+CONTENT = bytes(range(256)) * 20
+
+
+@pytest.fixture
+def s3_bucket(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        monkeypatch.setattr(s3_operation, "_s3_client", None)
+        s3_client = s3_operation.get_s3_client()
+        s3_client.create_bucket(Bucket=BUCKET_NAME)
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=OBJECT_NAME, Body=CONTENT)
+        yield s3_client
+
+
+@pytest.fixture
+def downloaded_parts(monkeypatch):
+    """
+    Start offsets of the ranged requests, failing the one set in `fail_at` once.
+    """
+    download_part = s3_operation._download_part
+    parts = {"starts": [], "fail_at": None}
+
+    def recording_download_part(s3_client, bucket_name, object_key, etag, partial_file_path, start, end):
+        parts["starts"].append(start)
+        if start == parts["fail_at"]:
+            parts["fail_at"] = None
+            raise ConnectionError(f"connection reset at byte {start}")
+        download_part(s3_client, bucket_name, object_key, etag, partial_file_path, start, end)
+
+    monkeypatch.setattr(s3_operation, "_download_part", recording_download_part)
+    return parts
+
+
+def test_interrupted_download_resumes_with_missing_parts(s3_bucket, downloaded_parts, tmp_path):
+    file_path = str(tmp_path / "raw_data" / "used-car-data.csv")
+    cache_dir = str(tmp_path / "download_cache")
+    n_parts = -(-len(CONTENT) // PART_SIZE)
+    downloaded_parts["fail_at"] = 2 * PART_SIZE
+
+    with pytest.raises(Exception):
+        download_from_s3(BUCKET_NAME, OBJECT_NAME, file_path, cache_dir=cache_dir, part_size=PART_SIZE, max_workers=1)
+    assert not os.path.exists(file_path)
+    assert any(name.endswith(PARTIAL_FILE_SUFFIX) for name in os.listdir(cache_dir))
+    progress_file_name, = [name for name in os.listdir(cache_dir) if name.endswith(PROGRESS_FILE_SUFFIX)]
+    with open(os.path.join(cache_dir, progress_file_name)) as progress_file:
+        completed_parts = {int(line) for line in progress_file.read().split("\n")[1:] if line}
+    assert 0 in completed_parts and 2 * PART_SIZE not in completed_parts
+
+    downloaded_parts["starts"].clear()
+    download_from_s3(BUCKET_NAME, OBJECT_NAME, file_path, cache_dir=cache_dir, part_size=PART_SIZE, max_workers=1)
+
+    # only the failed part and the ones never completed are fetched again
+    assert sorted(downloaded_parts["starts"]) == sorted(set(range(0, n_parts * PART_SIZE, PART_SIZE)) - completed_parts)
+    with open(file_path, "rb") as downloaded_file:
+        assert downloaded_file.read() == CONTENT
+    assert os.listdir(cache_dir) == [name for name in os.listdir(cache_dir) if not name.endswith(
+        (PARTIAL_FILE_SUFFIX, PROGRESS_FILE_SUFFIX))]
+
+
+def test_unchanged_object_is_copied_from_cache(s3_bucket, downloaded_parts, tmp_path):
+    cache_dir = str(tmp_path / "download_cache")
+    first_file_path = str(tmp_path / "run_1" / "used-car-data.csv")
+    second_file_path = str(tmp_path / "run_2" / "used-car-data.csv")
+    download_from_s3(BUCKET_NAME, OBJECT_NAME, first_file_path, cache_dir=cache_dir, part_size=PART_SIZE)
+
+    downloaded_parts["starts"].clear()
+    download_from_s3(BUCKET_NAME, OBJECT_NAME, second_file_path, cache_dir=cache_dir, part_size=PART_SIZE)
+
+    assert downloaded_parts["starts"] == []
+    with open(second_file_path, "rb") as downloaded_file:
+        assert downloaded_file.read() == CONTENT
+
+    # a new version of the object has another ETag and is downloaded again
+    s3_bucket.put_object(Bucket=BUCKET_NAME, Key=OBJECT_NAME, Body=CONTENT[::-1])
+    download_from_s3(BUCKET_NAME, OBJECT_NAME, second_file_path, cache_dir=cache_dir, part_size=PART_SIZE)
+    assert len(downloaded_parts["starts"]) == -(-len(CONTENT) // PART_SIZE)
+    with open(second_file_path, "rb") as downloaded_file:
+        assert downloaded_file.read() == CONTENT[::-1]
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from carprice.util.warm_start import continue_incumbent_model
+
+COLUMNS = ["km_driven", "mileage", "max_power"]
+
+
+def make_listings(seed: int, shift: float = 0.0, n_rows: int = 400):
+    random_state = np.random.RandomState(seed)
+    data = pd.DataFrame(random_state.normal(loc=shift, scale=1.0, size=(n_rows, len(COLUMNS))), columns=COLUMNS)
+    target = 3 * data["km_driven"] - 2 * data["mileage"] + data["max_power"]
+    return data, target.to_numpy()
+
+
+def make_preprocessor():
+    return ColumnTransformer([("numeric", Pipeline([("scaler", StandardScaler())]), COLUMNS)])
+
+
+def fit_incumbent(data, target, model=None):
+    preprocessing_obj = make_preprocessor().fit(data)
+    model = RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0) if model is None else model
+    model.fit(preprocessing_obj.transform(data), target)
+    return SimpleNamespace(preprocessing_object=preprocessing_obj, trained_model_object=model)
+
+
+def test_warm_start_grows_incumbent_on_new_data():
+    data, target = make_listings(seed=0)
+    incumbent_model = fit_incumbent(data, target)
+    # the grown data set would refit the scaler differently, the incumbent's trees keep their own one
+    new_data, new_target = make_listings(seed=1, shift=0.5)
+    grown_data = pd.concat([data, new_data], ignore_index=True)
+    grown_target = np.concatenate([target, new_target])
+    incumbent_scaler_mean = incumbent_model.preprocessing_object.named_transformers_["numeric"]["scaler"].mean_.copy()
+
+    model = continue_incumbent_model(incumbent_model, grown_data, grown_target, n_estimators=10)
+
+    assert len(model.estimators_) == 30
+    assert model.estimators_[0] is not incumbent_model.trained_model_object.estimators_[0]
+    assert len(incumbent_model.trained_model_object.estimators_) == 20
+    np.testing.assert_array_equal(incumbent_model.preprocessing_object.named_transformers_["numeric"]["scaler"].mean_,
+                                  incumbent_scaler_mean)
+    # the first trees are the incumbent's, split on the incumbent's features
+    x_train = incumbent_model.preprocessing_object.transform(grown_data)
+    np.testing.assert_allclose(model.estimators_[0].predict(x_train),
+                               incumbent_model.trained_model_object.estimators_[0].predict(x_train))
+
+
+def test_shifted_data_stays_accurate_through_incumbent_preprocessing():
+    data, target = make_listings(seed=0)
+    incumbent_model = fit_incumbent(data, target)
+    shifted_data, shifted_target = make_listings(seed=1, shift=1.0)
+
+    model = continue_incumbent_model(incumbent_model, shifted_data, shifted_target, n_estimators=10)
+
+    new_data, _ = make_listings(seed=2, shift=1.0)
+    predictions = model.predict(incumbent_model.preprocessing_object.transform(new_data))
+    new_target = 3 * new_data["km_driven"] - 2 * new_data["mileage"] + new_data["max_power"]
+    assert np.corrcoef(predictions, new_target)[0, 1] > 0.9
+
+
+def test_estimator_without_warm_start_is_refit_on_incumbent_features():
+    data, target = make_listings(seed=0)
+    incumbent_model = fit_incumbent(data, target, model=Ridge(alpha=2.0))
+    new_data, new_target = make_listings(seed=1, shift=0.5)
+
+    model = continue_incumbent_model(incumbent_model, new_data, new_target)
+
+    assert model is not incumbent_model.trained_model_object
+    assert model.alpha == 2.0
+    expected_model = Ridge(alpha=2.0).fit(incumbent_model.preprocessing_object.transform(new_data), new_target)
+    np.testing.assert_allclose(model.coef_, expected_model.coef_)